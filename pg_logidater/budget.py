@@ -0,0 +1,325 @@
+import os
+import json
+import signal
+from logging import getLogger
+from threading import Thread, Event, Lock, Condition, current_thread, main_thread
+from contextlib import contextmanager
+from time import monotonic, sleep
+from pg_logidater.utils import SqlConn, sql_pool
+from pg_logidater.exceptions import SyncFailed
+from pg_logidater.timing import timings
+
+BUDGET_INTERVAL = 5
+MB = 1024 * 1024
+ADAPTIVE_BACKOFF = 0.5
+ADAPTIVE_RECOVERY = 0.1
+ADAPTIVE_MIN_FACTOR = 0.05
+ADAPTIVE_MAX_LATENCY = 50
+ADAPTIVE_MAX_LAG = 256
+GATE_POLL_INTERVAL = 1
+RTT_SAMPLES = 3
+BUDGET_LIMITS = ("read_rate", "write_rate", "read_workers", "write_workers", "adaptive")
+
+_logger = getLogger(__name__)
+
+
+def control_limits(path: str, limits) -> dict:
+    """
+    Known limits with valid values from control file, rates and workers
+    are non-negative integers, adaptive is boolean, rest is ignored
+    """
+    if not isinstance(limits, dict):
+        _logger.warning(f"Ignoring I/O control file {path}: expected JSON object")
+        return {}
+    valid = {}
+    for name, value in limits.items():
+        if name not in BUDGET_LIMITS:
+            _logger.warning(f"Ignoring unknown I/O limit {name} in {path}")
+        elif name == "adaptive" and not isinstance(value, bool):
+            _logger.warning(f"Ignoring I/O limit {name} in {path}: {value!r} is not true or false")
+        elif name != "adaptive" and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            _logger.warning(f"Ignoring I/O limit {name} in {path}: {value!r} is not a non-negative integer")
+        else:
+            valid[name] = value
+    return valid
+
+
+class RateLimiter():
+    """
+    Token bucket shared by all threads on one side of sync, zero rate is
+    unlimited, burst is one second of rate
+    """
+    def __init__(self, rate: int = 0):
+        self._lock = Lock()
+        self.rate = rate
+        self.bytes = 0
+        self.waited = 0.0
+        self._tokens = 0.0
+        self._updated = monotonic()
+
+    def set_rate(self, rate: int) -> None:
+        with self._lock:
+            self.rate = rate
+            self._tokens = min(self._tokens, rate)
+            self._updated = monotonic()
+
+    def consume(self, size: int, abort: Event = None) -> None:
+        with self._lock:
+            self.bytes += size
+            if not self.rate:
+                return
+            now = monotonic()
+            self._tokens = min(self._tokens + (now - self._updated) * self.rate, self.rate) - size
+            self._updated = now
+            if self._tokens >= 0:
+                return
+            wait = -self._tokens / self.rate
+            self.waited += wait
+        if abort is not None:
+            abort.wait(wait)
+        else:
+            sleep(wait)
+
+    def count(self, size: int) -> None:
+        with self._lock:
+            self.bytes += size
+
+
+class WorkerGate():
+    """
+    Number of concurrently running workers, limit can be changed while
+    workers run, zero is unlimited
+    """
+    def __init__(self, limit: int = 0):
+        self._cond = Condition()
+        self.limit = limit
+        self.active = 0
+
+    def set_limit(self, limit: int) -> None:
+        with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+    def acquire(self, abort: Event = None) -> bool:
+        with self._cond:
+            while self.limit and self.active >= self.limit:
+                if abort is not None and abort.is_set():
+                    return False
+                self._cond.wait(GATE_POLL_INTERVAL)
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+
+class IoBudget():
+    """
+    Read (replica) and write (target) side limits of sync pipeline in
+    MB/s and concurrent workers. Adaptive mode scales read rate down by
+    factor while replica is under pressure. External dump and restore
+    commands are limited by worker counts only, rates are not enforced
+    when sync runs only such commands.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.rates_enforced = True
+        self.read = RateLimiter()
+        self.write = RateLimiter()
+        self.read_workers = WorkerGate()
+        self.write_workers = WorkerGate()
+        self.limits = {"read_rate": 0, "write_rate": 0, "read_workers": 0, "write_workers": 0, "adaptive": False}
+        self.active = False
+        self.factor = 1.0
+        self.base_rate = 0
+        self.reload = Event()
+
+    def configure(self, control_file: str = None, **limits) -> None:
+        with self._lock:
+            self.limits.update({name: value for name, value in limits.items() if name in BUDGET_LIMITS})
+            self.active = self.active or control_file is not None or any(self.limits.values())
+        self.apply()
+
+    def apply(self) -> None:
+        with self._lock:
+            read_rate = self.limits["read_rate"] * MB
+            if self.factor < 1:
+                read_rate = int((read_rate or self.base_rate) * self.factor)
+            write_rate = self.limits["write_rate"] * MB
+            read_workers, write_workers = self.limits["read_workers"], self.limits["write_workers"]
+        self.read.set_rate(read_rate)
+        self.write.set_rate(write_rate)
+        self.read_workers.set_limit(read_workers)
+        self.write_workers.set_limit(write_workers)
+        if not self.rates_enforced and (read_rate or write_rate or self.limits["adaptive"]):
+            _logger.warning("MB/s limits and adaptive mode are not applied in this sync mode, only worker limits")
+        _logger.info(
+            f"I/O budget read: {read_rate / MB:.1f} MB/s, {read_workers} workers, "
+            f"write: {write_rate / MB:.1f} MB/s, {write_workers} workers (0 - unlimited)"
+        )
+
+    def backoff(self, observed_rate: float) -> None:
+        with self._lock:
+            if self.factor <= ADAPTIVE_MIN_FACTOR:
+                return
+            if self.factor == 1:
+                if not self.limits["read_rate"] and observed_rate <= 0:
+                    return
+                self.base_rate = observed_rate
+            self.factor = max(self.factor * ADAPTIVE_BACKOFF, ADAPTIVE_MIN_FACTOR)
+        self.apply()
+
+    def recover(self) -> None:
+        with self._lock:
+            if self.factor >= 1:
+                return
+            self.factor = min(self.factor + ADAPTIVE_RECOVERY, 1.0)
+        self.apply()
+
+    def consume_stream(self, size: int, abort: Event = None) -> None:
+        """
+        Bytes read and written by the same thread are charged once against
+        the tighter limit, waiting on both in series would add the delays
+        """
+        read_rate, write_rate = self.read.rate, self.write.rate
+        if read_rate and (not write_rate or read_rate <= write_rate):
+            self.read.consume(size, abort)
+            self.write.count(size)
+        else:
+            self.write.consume(size, abort)
+            self.read.count(size)
+
+    def workers(self, read: int, write: int) -> (int, int):
+        """
+        Worker counts for external commands, fixed at command start
+        """
+        read_limit, write_limit = self.limits["read_workers"], self.limits["write_workers"]
+        return min(read, read_limit) if read_limit else read, min(write, write_limit) if write_limit else write
+
+    @contextmanager
+    def worker_slot(self, abort: Event = None):
+        if not self.write_workers.acquire(abort):
+            raise SyncFailed("Sync aborted while waiting for write worker slot")
+        try:
+            if not self.read_workers.acquire(abort):
+                raise SyncFailed("Sync aborted while waiting for read worker slot")
+            try:
+                yield
+            finally:
+                self.read_workers.release()
+        finally:
+            self.write_workers.release()
+
+
+io_budget = IoBudget()
+
+
+class BudgetController(Thread):
+    """
+    Re-reads control file on SIGHUP or when it changes. In adaptive mode
+    backs off replica read rate while replica query latency or unreplayed
+    WAL is over limit and recovers it step by step afterwards. Latency is
+    counted over baseline round trip, so a distant replica is not taken
+    as one under pressure.
+    """
+    def __init__(self, budget: IoBudget, replica_host: str, psql_user: str, control_file: str = None,
+                 max_latency: float = ADAPTIVE_MAX_LATENCY, max_lag: int = ADAPTIVE_MAX_LAG * MB,
+                 interval: float = BUDGET_INTERVAL):
+        super().__init__(name="io-budget", daemon=True)
+        self.budget = budget
+        self.replica_host = replica_host
+        self.psql_user = psql_user
+        self.control_file = control_file
+        self.max_latency = max_latency
+        self.max_lag = max_lag
+        self.interval = interval
+        self.finished = Event()
+        self._mtime = None
+        self._read_bytes = 0
+        self._checked = monotonic()
+        self._rtt = None
+
+    def stop(self) -> None:
+        self.finished.set()
+        self.budget.reload.set()
+
+    def run(self) -> None:
+        try:
+            with sql_pool.connection(self.replica_host, self.psql_user) as replica:
+                reload = False
+                while not self.finished.is_set():
+                    self.load_control_file(reload)
+                    if self.budget.limits["adaptive"]:
+                        self.adapt(replica)
+                    reload = self.budget.reload.wait(self.interval)
+                    self.budget.reload.clear()
+        except Exception as err:
+            _logger.error(f"I/O budget controller stopped: {err}")
+
+    def load_control_file(self, reload: bool = False) -> None:
+        if self.control_file is None:
+            return
+        try:
+            mtime = os.stat(self.control_file).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime and not reload:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.control_file, "r") as control:
+                limits = json.load(control)
+        except (OSError, ValueError) as err:
+            _logger.warning(f"Ignoring I/O control file {self.control_file}: {err}")
+            return
+        _logger.info(f"Loading I/O limits from {self.control_file}")
+        self.budget.configure(**control_limits(self.control_file, limits))
+
+    def baseline(self, replica: SqlConn) -> None:
+        samples = []
+        for _ in range(RTT_SAMPLES):
+            started = monotonic()
+            replica.is_healthy(ping=True)
+            samples.append(monotonic() - started)
+        self._rtt = min(samples)
+        _logger.debug(f"Replica baseline round trip {self._rtt * 1000:.1f} ms")
+
+    def adapt(self, replica: SqlConn) -> None:
+        if self._rtt is None:
+            self.baseline(replica)
+        started = monotonic()
+        backlog = replica.get_replay_backlog()
+        elapsed = monotonic() - started
+        self._rtt = min(self._rtt, elapsed)
+        latency = (elapsed - self._rtt) * 1000
+        read_bytes = self.budget.read.bytes
+        rate = (read_bytes - self._read_bytes) / max(started - self._checked, 1)
+        self._read_bytes, self._checked = read_bytes, started
+        _logger.debug(f"Replica latency {latency:.1f} ms, replay backlog {backlog}, read {rate / MB:.1f} MB/s")
+        if latency > self.max_latency or (backlog is not None and backlog > self.max_lag):
+            _logger.warning(
+                f"Replica under pressure, latency {latency:.1f} ms, replay backlog {backlog}, backing off reads"
+            )
+            self.budget.backoff(rate)
+        else:
+            self.budget.recover()
+
+
+@contextmanager
+def budget_control(budget: IoBudget, replica_host: str, psql_user: str, control_file: str = None,
+                   max_latency: float = ADAPTIVE_MAX_LATENCY, max_lag: int = ADAPTIVE_MAX_LAG * MB):
+    controller = BudgetController(budget, replica_host, psql_user, control_file, max_latency, max_lag)
+    previous = None
+    if current_thread() is main_thread():
+        previous = signal.signal(signal.SIGHUP, lambda signum, frame: budget.reload.set())
+    controller.start()
+    try:
+        yield controller
+    finally:
+        controller.stop()
+        if previous is not None:
+            signal.signal(signal.SIGHUP, previous)
+        timings.set_counter("read_throttle_seconds", round(budget.read.waited, 1))
+        timings.set_counter("write_throttle_seconds", round(budget.write.waited, 1))
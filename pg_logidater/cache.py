@@ -0,0 +1,102 @@
+import os
+import json
+from functools import wraps
+from logging import getLogger
+from threading import Lock
+
+_logger = getLogger(__name__)
+
+
+class MetadataCache():
+    """
+    Discovery results stored on disk per host, port and database. Entry is
+    dropped when server signature changes: system identifier, timeline,
+    postmaster start and config load time, pg_class, pg_constraint and
+    pg_index size and newest row version, newest pg_database row version.
+    Catalog xmin is used instead of statistics counters as those are not
+    updated by WAL replay on standby.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.path = None
+        self.entries = {}
+        self._checked = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def open(self, cache_path: str) -> None:
+        self.path = cache_path
+        if not os.path.isfile(cache_path):
+            return
+        try:
+            with open(cache_path, "r") as cache_file:
+                self.entries = json.load(cache_file)
+            _logger.debug(f"Loaded metadata cache {cache_path}")
+        except (OSError, ValueError) as err:
+            _logger.warning(f"Ignoring metadata cache {cache_path}: {err}")
+
+    def save(self) -> None:
+        if self.path is None or not self._dirty:
+            return
+        _logger.debug(f"Saving metadata cache {self.path}, hits: {self.hits}, misses: {self.misses}")
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w") as cache_file:
+                json.dump(self.entries, cache_file)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def _entry(self, conn) -> dict:
+        key = "/".join(conn.key[:3])
+        with self._lock:
+            if key in self._checked:
+                return self._checked[key]
+        try:
+            signature = [str(value) for value in conn.get_cache_signature()]
+        except Exception as err:
+            _logger.debug(f"Metadata cache disabled for {key}: {err}")
+            conn.sql_conn.rollback()
+            signature = None
+        with self._lock:
+            entry = None
+            if signature is not None:
+                entry = self.entries.get(key)
+                if entry is None or entry["signature"] != signature:
+                    _logger.debug(f"Metadata cache for {key} invalidated")
+                    entry = {"signature": signature, "values": {}}
+                    self.entries[key] = entry
+                    self._dirty = True
+            self._checked[key] = entry
+            return entry
+
+    def get(self, conn, name: str, loader):
+        if self.path is None:
+            return loader()
+        entry = self._entry(conn)
+        if entry is None:
+            return loader()
+        with self._lock:
+            if name in entry["values"]:
+                self.hits += 1
+                return entry["values"][name]
+        value = loader()
+        with self._lock:
+            self.misses += 1
+            entry["values"][name] = value
+            self._dirty = True
+        return value
+
+
+metadata_cache = MetadataCache()
+
+
+def cached(func):
+    """
+    SqlConn method result cached by method name and arguments
+    """
+    @wraps(func)
+    def wrapper(self, *args):
+        name = ":".join([func.__name__] + [str(arg) for arg in args])
+        return metadata_cache.get(self, name, lambda: func(self, *args))
+    return wrapper
@@ -0,0 +1,109 @@
+import os
+import json
+from logging import getLogger
+from threading import Lock
+
+_logger = getLogger(__name__)
+
+
+class Checkpoint():
+    """
+    Append only journal of completed setup phases, tables and indexes,
+    one json record per line
+    """
+    def __init__(self, tmp_dir: str, database: str):
+        self.path = os.path.join(tmp_dir, f"checkpoint_{database}.jsonl")
+        self._lock = Lock()
+        self.meta = {}
+        self.phases = set()
+        self.tables = set()
+        self.indexes = set()
+        self.resumed = False
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def _append(self, record: dict) -> None:
+        with self._lock:
+            with open(self.path, "a") as journal:
+                journal.write(json.dumps(record) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+
+    def start(self, **meta) -> None:
+        _logger.debug(f"Starting checkpoint journal {self.path}")
+        with self._lock:
+            with open(self.path, "w") as journal:
+                journal.write(json.dumps({"meta": meta}) + "\n")
+        self.meta = meta
+        self.phases = set()
+        self.tables = set()
+        self.indexes = set()
+
+    def load(self) -> None:
+        _logger.info(f"Loading checkpoint journal {self.path}")
+        self.resumed = True
+        with open(self.path, "r") as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    _logger.warning(f"Ignoring broken checkpoint record: {line.strip()}")
+                    continue
+                if "meta" in record:
+                    self.meta = record["meta"]
+                elif "phase" in record:
+                    self.phases.add(record["phase"])
+                elif "table" in record:
+                    self.tables.add(record["table"])
+                elif "index" in record:
+                    self.indexes.add(record["index"])
+        _logger.info(
+            f"Checkpoint: phases {sorted(self.phases)}, {len(self.tables)} tables, {len(self.indexes)} indexes done"
+        )
+
+    def phase_done(self, phase: str) -> None:
+        self.phases.add(phase)
+        self._append({"phase": phase})
+
+    def is_phase_done(self, phase: str) -> bool:
+        return phase in self.phases
+
+    def table_done(self, table: str) -> None:
+        self.tables.add(table)
+        self._append({"table": table})
+
+    def index_done(self, index: str) -> None:
+        self.indexes.add(index)
+        self._append({"index": index})
+
+    def remove(self) -> None:
+        _logger.debug(f"Removing checkpoint journal {self.path}")
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class NullCheckpoint(Checkpoint):
+    """
+    Checkpoint kept in memory only, for sync running without journal
+    """
+    def __init__(self, database: str):
+        super().__init__("", database)
+        self.path = None
+
+    def exists(self) -> bool:
+        return False
+
+    def _append(self, record: dict) -> None:
+        pass
+
+    def start(self, **meta) -> None:
+        self.meta = meta
+
+    def load(self) -> None:
+        pass
+
+    def remove(self) -> None:
+        pass
@@ -3,36 +3,68 @@ import pwd
 import argparse
 import json
 from threading import Thread, Event
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from psycopg2 import OperationalError
 from logging import getLogger
 from sys import exit
 from pg_logidater.exceptions import (
     PsqlConnectionError,
+    ResumeNotPossible,
+    SyncAborted,
+    SyncFailed,
 )
+from pg_logidater.checkpoint import Checkpoint
 from pg_logidater.utils import (
     SqlConn,
-    ServerConn,
+    sql_pool,
     setup_logging,
     prepare_directories
 )
 from pg_logidater.master import (
     master_prepare,
-    master_checks
+)
+from pg_logidater.scheduler import (
+    plan_copy,
+    CopyTask,
+    SPLIT_METHODS
+)
+from pg_logidater.progress import SyncProgress, ProgressStream
+from pg_logidater.timing import timings
+from pg_logidater.cache import metadata_cache
+from pg_logidater.watchdog import WalWatchdog, GB
+from pg_logidater.budget import io_budget, budget_control, MB, ADAPTIVE_MAX_LATENCY, ADAPTIVE_MAX_LAG
+from pg_logidater.estimator import table_breakdown, measure_read, measure_write, estimate_sync, log_estimate
+from pg_logidater.verifier import verify_database, VERIFY_MODES
+from pg_logidater.monitor import LagMonitor, format_lag, CAUGHT_UP_BYTES
+from pg_logidater.preflight import (
+    run_preflight,
+    master_preflight,
+    target_preflight,
+    replica_preflight,
+    PREFLIGHT_TIMEOUT
 )
 from pg_logidater.replica import (
     pause_replica,
-    replica_info,
+    resume_replica,
+    resume_checks,
+    early_resume_checks,
+    export_snapshots,
+    ReplicaSnapshot
 )
 from pg_logidater.tartget import (
     create_subscriber,
     create_database,
-    target_check,
+    check_disk_space,
+    check_dump_space,
     sync_roles,
     sync_database,
     get_replica_position,
-    sync_seq_pipe,
+    sync_seq_values,
     analyse_target,
-    db_sync_progress_bar
+    db_sync_progress_bar,
+    SYNC_MODES,
+    SSH_COMPRESSION
 )
 
 
@@ -60,6 +92,16 @@ parser.add_argument(
     help="Path to file with saved json config",
     type=str
 )
+parser.add_argument(
+    "--no-metadata-cache",
+    help="Don't use catalog metadata cache stored next to --saved-conf",
+    action="store_true"
+)
+parser.add_argument(
+    "--progress-stream",
+    help="Write JSON lines progress records to file or FIFO",
+    type=str
+)
 parser.add_argument(
     "-u",
     "--user",
@@ -149,6 +191,177 @@ def drop_privileges(user) -> None:
         exit(1)
 
 
+sync_arguments = [
+    argument(
+        "--update-interval",
+        help="Progress update interval, default 2s",
+        default=2,
+        type=float
+    ),
+    argument(
+        "--sync-mode",
+        help="Database sync mode, ssh streams compressed dump from replica host, default: plain",
+        choices=SYNC_MODES,
+        default="plain"
+    ),
+    argument(
+        "--jobs",
+        help="Number of parallel jobs used by parallel and copy sync modes, default 4",
+        default=4,
+        type=int
+    ),
+    argument(
+        "--copy-buffer-size",
+        help="Copy sync mode pipeline chunk size in kB, default 1024",
+        default=1024,
+        type=int
+    ),
+    argument(
+        "--copy-buffers",
+        help="Copy sync mode in-flight chunks per table, default 8",
+        default=8,
+        type=int
+    ),
+    argument(
+        "--split-size",
+        help="Copy sync mode splits tables bigger than this size in MB into ranges, default 0 (disabled)",
+        default=0,
+        type=int
+    ),
+    argument(
+        "--split-method",
+        help="Copy sync mode table split method, default: ctid",
+        choices=SPLIT_METHODS,
+        default="ctid"
+    ),
+    argument(
+        "--ssh-compression",
+        help="Ssh sync mode stream compression, default: zstd",
+        choices=list(SSH_COMPRESSION),
+        default="zstd"
+    ),
+    argument(
+        "--compression-level",
+        help="Ssh sync mode compression level, default 3",
+        default=3,
+        type=int
+    ),
+    argument(
+        "--wal-warn-size",
+        help="Warn when replication slot keeps more WAL in GB, 0 disables, default 20",
+        default=20,
+        type=int
+    ),
+    argument(
+        "--wal-throttle-size",
+        help="Pause copy while replication slot keeps more WAL in GB, copy sync mode only, 0 disables, default 50",
+        default=50,
+        type=int
+    ),
+    argument(
+        "--wal-abort-size",
+        help="Abort setup, drop slot and resume replica when slot keeps more WAL in GB, 0 disables, default 100",
+        default=100,
+        type=int
+    ),
+    argument(
+        "--min-free-disk",
+        help="Abort setup when master or replica WAL disk has less free space in GB, 0 disables, default 10",
+        default=10,
+        type=int
+    ),
+    argument(
+        "--max-read-rate",
+        help="Replica read rate limit in MB/s, 0 disables, default 0",
+        default=0,
+        type=int
+    ),
+    argument(
+        "--max-write-rate",
+        help="Target write rate limit in MB/s, 0 disables, default 0",
+        default=0,
+        type=int
+    ),
+    argument(
+        "--max-read-workers",
+        help="Concurrent replica readers, 0 uses --jobs, default 0",
+        default=0,
+        type=int
+    ),
+    argument(
+        "--max-write-workers",
+        help="Concurrent target writers, 0 uses --jobs, default 0",
+        default=0,
+        type=int
+    ),
+    argument(
+        "--io-control-file",
+        help="Json file with read_rate, write_rate, read_workers, write_workers and adaptive limits, "
+             "re-read when changed or on SIGHUP"
+    ),
+    argument(
+        "--adaptive-io",
+        help="Back off replica reads while replica query latency or replay backlog is over limit",
+        action="store_true"
+    ),
+    argument(
+        "--adaptive-max-latency",
+        help=f"Adaptive mode replica query latency limit in ms over baseline round trip, "
+             f"default {ADAPTIVE_MAX_LATENCY}",
+        default=ADAPTIVE_MAX_LATENCY,
+        type=float
+    ),
+    argument(
+        "--adaptive-max-lag",
+        help=f"Adaptive mode replica replay backlog limit in MB, default {ADAPTIVE_MAX_LAG}",
+        default=ADAPTIVE_MAX_LAG,
+        type=int
+    ),
+    argument(
+        "--verify",
+        help="Compare target with paused replica before subscription is enabled: row counts or counts and "
+             "checksums of primary key chunks, default: none",
+        choices=VERIFY_MODES,
+        default="none"
+    ),
+    argument(
+        "--verify-chunk-size",
+        help="Verify tables bigger than this size in MB by primary key chunks, default 256",
+        default=256,
+        type=int
+    ),
+    argument(
+        "--analyze-jobs",
+        help="Parallel ANALYZE workers after subscription is enabled, default 4",
+        default=4,
+        type=int
+    ),
+    argument(
+        "--statistics-target",
+        help="default_statistics_target for ANALYZE workers, default: server setting",
+        type=int
+    ),
+    argument(
+        "--index-jobs",
+        help="Copy sync mode parallel index and constraint build workers, default 2",
+        default=2,
+        type=int
+    ),
+    argument(
+        "--maintenance-work-mem",
+        help="maintenance_work_mem for index build workers, default 1GB",
+        default="1GB",
+        type=str
+    ),
+    argument(
+        "--max-parallel-maintenance-workers",
+        help="max_parallel_maintenance_workers for index build workers, default 2",
+        default=2,
+        type=int
+    )
+]
+
+
 @cli(
     [
         argument(
@@ -157,52 +370,87 @@ def drop_privileges(user) -> None:
             action="store_true"
         ),
         argument(
-            "--update-interval",
-            help="Progress update interval, default 2s",
-            default=2,
+            "--databases",
+            help="Setup several databases with one replica pause, --repl-name is suffixed with database name",
+            nargs="+"
+        ),
+        argument(
+            "--preflight-timeout",
+            help=f"Per host connect and preflight checks timeout in seconds, default {PREFLIGHT_TIMEOUT}",
+            default=PREFLIGHT_TIMEOUT,
             type=float
+        ),
+        argument(
+            "--all-databases",
+            help="Setup all master databases with one replica pause",
+            action="store_true"
+        ),
+        argument(
+            "--include-tables",
+            help="Publish and sync only tables matching schema.table or schema patterns",
+            nargs="+"
+        ),
+        argument(
+            "--exclude-tables",
+            help="Don't publish and sync tables matching schema.table or schema patterns",
+            nargs="+"
+        ),
+        argument(
+            "--exclude-no-identity",
+            help="Don't publish and sync tables without usable replica identity",
+            action="store_true"
+        ),
+        argument(
+            "--early-resume",
+            help="Resume replica right after snapshot is exported, dump reads the snapshot while replay "
+                 "continues, requires hot_standby_feedback, plain, parallel and ssh sync modes",
+            action="store_true"
         )
-    ]
+    ] + sync_arguments
 )
 def setup_replica(args) -> None:
+    if args["databases"] or args["all_databases"]:
+        setup_replica_multi(args)
+        return
+    timeout = args["preflight_timeout"]
     try:
-        master_sql = SqlConn(args["master_host"], user=args["psql_user"], db=args["database"])
-        replica_sql = SqlConn(args["replica_host"], args["psql_user"])
-        target_sql = SqlConn("/tmp", user="postgres", db="postgres")
+        checks = run_preflight(
+            {
+                "master": partial(master_preflight, args["master_host"], args["psql_user"], args["database"],
+                                  args["repl_name"], args["ignore_pkey"], timeout, args["include_tables"],
+                                  args["exclude_tables"], args["exclude_no_identity"]),
+                "target": partial(target_preflight, [args["database"]], timeout),
+                "replica": partial(replica_preflight, args["replica_host"], args["psql_user"], args["user"], timeout),
+            },
+            timeout=timeout
+        )
     except PsqlConnectionError as e:
         _logger.critical(e)
-    db_size = master_checks(
-        psql=master_sql,
-        slot_name=args["repl_name"],
-        pub_name=args["repl_name"],
-        skip_pkey_check=args["ignore_pkey"]
-    )
-    target_check(
-        psql=target_sql,
-        database=args["database"],
-        name=args["repl_name"],
-        db_size=db_size
-    )
-    with ServerConn(args["replica_host"], args["user"]) as ssh:
-        app_name, slot_name = replica_info(
-            psql=replica_sql,
-            ssh=ssh
-        )
+        exit(1)
+    master_sql, db_size, tables, args["excluded_tables"] = checks["master"]
+    target_sql, available_disk = checks["target"]
+    replica_sql, app_name, slot_name = checks["replica"]
+    check_disk_space(available_disk, db_size)
+    if args["sync_mode"] == "parallel":
+        check_dump_space(args["app_tmp_dir"], db_size, target_sql.get_datadirectory())
+    if args["early_resume"]:
+        early_resume_checks(replica_sql, args["sync_mode"], args["verify"])
     sync_roles(
-        host=args["replica_host"],
-        tmp_path=args["app_tmp_dir"],
-        log_dir=args["app_log_dir"],
+        source=replica_sql,
+        target=target_sql
     )
     db_owner = master_prepare(
         psql=master_sql,
         name=args["repl_name"],
-        database=args["database"]
+        database=args["database"],
+        tables=tables
     )
     create_database(
         psql=target_sql,
         database=args["database"],
         owner=db_owner
     )
+    copy_plan = plan_replica_copy(args, master_sql)
     pause_replica(
         psql=replica_sql
     )
@@ -210,77 +458,541 @@ def setup_replica(args) -> None:
         psql=master_sql,
         app_name=app_name
     )
+    checkpoint = Checkpoint(args["app_tmp_dir"], args["database"])
+    checkpoint.start(
+        database=args["database"],
+        sync_mode=args["sync_mode"],
+        app_name=app_name,
+        replica_stop_position=replica_stop_position,
+        db_size=db_size,
+        slot_name=args["repl_name"],
+        excluded_tables=args["excluded_tables"],
+        early_resume=args["early_resume"]
+    )
+    snapshot = None
+    if args["early_resume"]:
+        snapshot = export_snapshots(args["replica_host"], args["psql_user"], [args["database"]])[args["database"]]
+        resume_replica(replica_sql)
+    with io_budget_control(args):
+        finish_setup(args, master_sql, replica_sql, target_sql, db_size, replica_stop_position, checkpoint,
+                     snapshot, copy_plan)
+
+
+def setup_replica_multi(args: dict) -> None:
+    """
+    Several databases synced concurrently from one replica pause window,
+    one replication slot, publication and subscription per database
+    """
+    timeout = args["preflight_timeout"]
+    databases = args["databases"] or []
+    if args["all_databases"]:
+        with sql_pool.connection(args["master_host"], user=args["psql_user"], db=args["database"] or "postgres") as psql:
+            databases = psql.get_databases()
+    _logger.info(f"Setting up databases: {', '.join(databases)}")
+    checks = {
+        f"master {database}": partial(master_preflight, args["master_host"], args["psql_user"], database,
+                                      f"{args['repl_name']}_{database}", args["ignore_pkey"], timeout,
+                                      args["include_tables"], args["exclude_tables"], args["exclude_no_identity"])
+        for database in databases
+    }
+    checks["target"] = partial(target_preflight, databases, timeout)
+    checks["replica"] = partial(replica_preflight, args["replica_host"], args["psql_user"], args["user"], timeout)
+    results = run_preflight(checks, timeout=timeout)
+    target_sql, available_disk = results["target"]
+    replica_sql, app_name, _ = results["replica"]
+    if args["early_resume"]:
+        early_resume_checks(replica_sql, args["sync_mode"], args["verify"])
+    setups = {}
+    run_slots = [f"{args['repl_name']}_{database}" for database in databases]
+    for database in databases:
+        master_sql, db_size, tables, excluded = results[f"master {database}"]
+        db_args = dict(args, database=database, repl_name=f"{args['repl_name']}_{database}",
+                       published_tables=tables, excluded_tables=excluded, run_slots=run_slots)
+        setups[database] = (db_args, master_sql, db_size)
+    check_disk_space(available_disk, sum(db_size for _, _, db_size in setups.values()))
+    if args["sync_mode"] == "parallel":
+        check_dump_space(args["app_tmp_dir"], sum(db_size for _, _, db_size in setups.values()),
+                         target_sql.get_datadirectory())
+    sync_roles(
+        source=replica_sql,
+        target=target_sql
+    )
+    for database, (db_args, master_sql, _) in setups.items():
+        db_owner = master_prepare(
+            psql=master_sql,
+            name=db_args["repl_name"],
+            database=database,
+            tables=db_args["published_tables"]
+        )
+        create_database(
+            psql=target_sql,
+            database=database,
+            owner=db_owner
+        )
+    concurrent = max(min(len(setups), args["jobs"]), 1)
+    db_jobs = max(args["jobs"] // concurrent, 1)
+    for db_args, _, _ in setups.values():
+        db_args["jobs"] = db_jobs
+    copy_plans = {
+        database: plan_replica_copy(db_args, master_sql) for database, (db_args, master_sql, _) in setups.items()
+    }
+    pause_replica(
+        psql=replica_sql
+    )
+    replica_stop_position = get_replica_position(
+        psql=next(iter(setups.values()))[1],
+        app_name=app_name
+    )
+    snapshots = {}
+    if args["early_resume"]:
+        snapshots = export_snapshots(args["replica_host"], args["psql_user"], list(setups))
+        resume_replica(replica_sql)
+    _logger.info(f"Syncing {len(setups)} databases, {concurrent} at once with {db_jobs} jobs each")
+    stream = ProgressStream(args["progress_stream"])
+    abort = Event()
+
+    def sync_one(database: str) -> SyncProgress:
+        db_args, master_sql, db_size = setups[database]
+        checkpoint = Checkpoint(args["app_tmp_dir"], database)
+        checkpoint.start(
+            database=database,
+            sync_mode=args["sync_mode"],
+            app_name=app_name,
+            replica_stop_position=replica_stop_position,
+            db_size=db_size,
+            slot_name=db_args["repl_name"],
+            excluded_tables=db_args["excluded_tables"],
+            early_resume=args["early_resume"]
+        )
+        progress = sync_replica_database(db_args, master_sql, target_sql, db_size, checkpoint, stream,
+                                         progress_bar=False, abort=abort, snapshot=snapshots.get(database),
+                                         copy_plan=copy_plans[database])
+        verify_replica_database(db_args, checkpoint)
+        create_subscriber(
+           sub_target=args["master_host"],
+           database=database,
+           slot_name=db_args["repl_name"],
+           repl_position=replica_stop_position
+        )
+        checkpoint.phase_done("create_subscriber")
+        return progress
+
+    failed = []
+    synced_bytes = 0
+    ordered = sorted(setups, key=lambda database: setups[database][2], reverse=True)
+    with io_budget_control(args), ThreadPoolExecutor(max_workers=concurrent) as executor:
+        futures = {executor.submit(sync_one, database): database for database in ordered}
+        for future in as_completed(futures):
+            try:
+                synced_bytes += future.result().bytes
+            except Exception as err:
+                _logger.error(f"Database {futures[future]} setup failed: {err}")
+                failed.append(futures[future])
+    stream.close()
+    timings.set_counter("bytes_moved", synced_bytes)
+    if abort.is_set():
+        raise SyncAborted
+    if failed and args["early_resume"]:
+        raise SyncFailed(f"Failed databases: {', '.join(failed)}, replica was resumed, start setup again")
+    if failed:
+        raise SyncFailed(
+            f"Failed databases: {', '.join(failed)}, replica left paused, continue with "
+            f"resume-setup --databases {' '.join(setups)}"
+        )
+    if not args["early_resume"]:
+        resume_replica(replica_sql)
+    for database in setups:
+        analyse_target(database, args["analyze_jobs"], args["statistics_target"])
+        Checkpoint(args["app_tmp_dir"], database).remove()
+
+
+@cli(
+    [
+        argument(
+            "--databases",
+            help="Resume databases set up together with setup-replica --databases, replica is resumed "
+                 "after the last one",
+            nargs="+"
+        )
+    ] + sync_arguments
+)
+def resume_setup(args) -> None:
+    databases = args["databases"] or [args["database"]]
+    replica_sql = sql_pool.acquire(args["replica_host"], args["psql_user"])
+    target_sql = sql_pool.acquire("/tmp", user="postgres", db="postgres")
+    resumed = []
+    with io_budget_control(args):
+        for database in databases:
+            db_args = dict(args, database=database)
+            resumed.append((db_args, resume_database(db_args, replica_sql, target_sql)))
+    if not all(checkpoint.meta.get("early_resume", False) for _, checkpoint in resumed):
+        resume_replica(replica_sql)
+    for db_args, checkpoint in resumed:
+        analyse_target(db_args["database"], db_args["analyze_jobs"], db_args["statistics_target"])
+        checkpoint.remove()
+
+
+def resume_database(args: dict, replica_sql: SqlConn, target_sql: SqlConn) -> Checkpoint:
+    """
+    Continue setup of one database from its checkpoint journal, replica
+    is left paused
+    """
+    checkpoint = Checkpoint(args["app_tmp_dir"], args["database"])
+    if not checkpoint.exists():
+        raise FileNotFoundError(f"{checkpoint.path} doesn't exists")
+    checkpoint.load()
+    master_sql = sql_pool.acquire(args["master_host"], user=args["psql_user"], db=args["database"])
+    replica_stop_position = checkpoint.meta["replica_stop_position"]
+    args["repl_name"] = checkpoint.meta.get("slot_name", args["repl_name"])
+    args["excluded_tables"] = checkpoint.meta.get("excluded_tables", [])
+    early_resume = checkpoint.meta.get("early_resume", False)
+    if early_resume and not checkpoint.is_phase_done("sync_database"):
+        raise ResumeNotPossible("Replica was resumed after snapshot export, start setup again")
+    resume_checks(
+        master=master_sql,
+        replica=replica_sql,
+        slot_name=args["repl_name"],
+        app_name=checkpoint.meta["app_name"],
+        position=replica_stop_position,
+        replica_resumed=early_resume
+    )
+    args["sync_mode"] = checkpoint.meta["sync_mode"]
+    restart_sync = not checkpoint.is_phase_done("sync_database") and (
+        args["sync_mode"] != "copy" or not checkpoint.is_phase_done("pre-data")
+    )
+    if restart_sync:
+        _logger.info(f"Recreating database {args['database']}")
+        target_sql.drop_database(args["database"])
+        create_database(
+            psql=target_sql,
+            database=args["database"],
+            owner=master_sql.get_database_owner(args["database"])
+        )
+    complete_database(args, master_sql, target_sql, checkpoint.meta["db_size"], replica_stop_position, checkpoint)
+    return checkpoint
+
+
+def io_budget_control(args: dict):
+    io_budget.rates_enforced = args.get("sync_mode") != "parallel"
+    io_budget.configure(
+        control_file=args["io_control_file"],
+        read_rate=args["max_read_rate"],
+        write_rate=args["max_write_rate"],
+        read_workers=args["max_read_workers"],
+        write_workers=args["max_write_workers"],
+        adaptive=args["adaptive_io"]
+    )
+    return budget_control(
+        budget=io_budget,
+        replica_host=args["replica_host"],
+        psql_user=args["psql_user"],
+        control_file=args["io_control_file"],
+        max_latency=args["adaptive_max_latency"],
+        max_lag=args["adaptive_max_lag"] * MB
+    )
+
+
+def finish_setup(args: dict, master_sql: SqlConn, replica_sql: SqlConn, target_sql: SqlConn, db_size: int,
+                 replica_stop_position: str, checkpoint: Checkpoint, snapshot: ReplicaSnapshot = None,
+                 copy_plan: list[CopyTask] = None) -> None:
+    complete_database(args, master_sql, target_sql, db_size, replica_stop_position, checkpoint, snapshot, copy_plan)
+    if not checkpoint.meta.get("early_resume", False):
+        resume_replica(replica_sql)
+    analyse_target(args["database"], args["analyze_jobs"], args["statistics_target"])
+    checkpoint.remove()
+
+
+def complete_database(args: dict, master_sql: SqlConn, target_sql: SqlConn, db_size: int,
+                      replica_stop_position: str, checkpoint: Checkpoint, snapshot: ReplicaSnapshot = None,
+                      copy_plan: list[CopyTask] = None) -> None:
+    """
+    Sync, verify and subscribe, steps already in checkpoint are skipped
+    """
+    if not checkpoint.is_phase_done("sync_database"):
+        with ProgressStream(args["progress_stream"]) as stream:
+            progress = sync_replica_database(args, master_sql, target_sql, db_size, checkpoint, stream,
+                                             snapshot=snapshot, copy_plan=copy_plan)
+        timings.set_counter("bytes_moved", progress.bytes)
+        timings.set_counter("rows_moved", progress.rows)
+    verify_replica_database(args, checkpoint)
+    if not checkpoint.is_phase_done("create_subscriber"):
+        create_subscriber(
+           sub_target=args["master_host"],
+           database=args["database"],
+           slot_name=args["repl_name"],
+           repl_position=replica_stop_position
+        )
+        checkpoint.phase_done("create_subscriber")
+
 
+def verify_replica_database(args: dict, checkpoint: Checkpoint) -> None:
+    if args["verify"] == "none" or checkpoint.is_phase_done("verify"):
+        return
+    verify_database(
+        host=args["replica_host"],
+        user=args["psql_user"],
+        database=args["database"],
+        jobs=args["jobs"],
+        mode=args["verify"],
+        chunk_size=args["verify_chunk_size"] * 1024 * 1024,
+        exclude_tables=args["excluded_tables"]
+    )
+    checkpoint.phase_done("verify")
+
+
+def plan_replica_copy(args: dict, master_sql: SqlConn) -> list[CopyTask]:
+    """
+    Copy schedule is built from master catalog, before replica is paused
+    """
+    if args["sync_mode"] != "copy":
+        return None
+    return plan_copy(
+        psql=master_sql,
+        jobs=args["jobs"],
+        split_size=args["split_size"] * 1024 * 1024,
+        split_method=args["split_method"],
+        exclude=args["excluded_tables"]
+    )
+
+
+def sync_replica_database(args: dict, master_sql: SqlConn, target_sql: SqlConn, db_size: int,
+                          checkpoint: Checkpoint, stream: ProgressStream, progress_bar: bool = True,
+                          abort: Event = None, snapshot: ReplicaSnapshot = None,
+                          copy_plan: list[CopyTask] = None) -> SyncProgress:
+    if copy_plan is None:
+        copy_plan = plan_replica_copy(args, master_sql)
+
+    progress = SyncProgress(
+        total=sum(task.size for task in copy_plan) if copy_plan else db_size,
+        database=args["database"],
+        stream=stream
+    )
     event_finished = Event()
     progress_thread = Thread(
         target=db_sync_progress_bar,
         args=(
             target_sql,
-            db_size,
+            progress,
             event_finished,
             args["database"],
             args["update_interval"],
+            args["sync_mode"] not in ("copy", "ssh")
         )
     )
-    progress_thread.start()
-    sync_database(
-        host=args["replica_host"],
-        user=args["psql_user"],
+    watchdog = WalWatchdog(
+        master_host=args["master_host"],
+        replica_host=args["replica_host"],
+        psql_user=args["psql_user"],
+        ssh_user=args["user"],
         database=args["database"],
-        tmp_dir=args["app_tmp_dir"],
-        log_dir=args["app_log_dir"],
-        event=event_finished
-    )
-    progress_thread.join()
-    create_subscriber(
-       sub_target=args["master_host"],
-       database=args["database"],
-       slot_name=args["repl_name"],
-       repl_position=replica_stop_position
+        slot_name=args["repl_name"],
+        warn_size=args["wal_warn_size"] * GB,
+        throttle_size=args["wal_throttle_size"] * GB,
+        abort_size=args["wal_abort_size"] * GB,
+        min_free=args["min_free_disk"] * GB,
+        abort=abort,
+        run_slots=args.get("run_slots"),
+        throttling=args["sync_mode"] == "copy"
     )
-    _logger.info("Rresuming replication")
-    replica_sql.resume_replica()
-    analyse_target(target_sql)
+    if progress_bar:
+        progress_thread.start()
+    watchdog.start()
+    try:
+        sync_database(
+            host=args["replica_host"],
+            user=args["psql_user"],
+            database=args["database"],
+            tmp_dir=args["app_tmp_dir"],
+            log_dir=args["app_log_dir"],
+            event=event_finished,
+            mode=args["sync_mode"],
+            jobs=args["jobs"],
+            buffer_size=args["copy_buffer_size"] * 1024,
+            buffers=args["copy_buffers"],
+            plan=copy_plan,
+            index_jobs=args["index_jobs"],
+            work_mem=args["maintenance_work_mem"],
+            parallel_workers=args["max_parallel_maintenance_workers"],
+            progress=progress,
+            checkpoint=checkpoint,
+            exclude_tables=args["excluded_tables"],
+            ssh_user=args["user"],
+            compression=args["ssh_compression"],
+            compression_level=args["compression_level"],
+            throttle=watchdog.throttle,
+            abort=watchdog.aborted,
+            snapshot=snapshot.name if snapshot else None
+        )
+    except Exception as err:
+        if watchdog.aborted.is_set():
+            raise SyncAborted from err
+        raise
+    finally:
+        if snapshot is not None:
+            snapshot.release()
+        watchdog.stop()
+        event_finished.set()
+        if progress_bar:
+            progress_thread.join()
+    return progress
 
 
-@cli()
-def drop_setup(args) -> None:
-    _logger.info("Cleaning target server")
+@cli(
+    [
+        argument(
+            "--sample-size",
+            help="Read and write throughput sample size in MB, default 256",
+            default=256,
+            type=int
+        ),
+        argument(
+            "--top",
+            help="Number of largest tables to show, default 20",
+            default=20,
+            type=int
+        )
+    ] + sync_arguments
+)
+def plan(args) -> None:
+    """
+    Database size breakdown, sample throughput and predicted sync duration
+    and peak disk usage
+    """
+    read_rate = write_rate = 0.0
+    with sql_pool.connection(args["replica_host"], user=args["psql_user"], db=args["database"]) as replica_sql:
+        tables = table_breakdown(replica_sql)
+        sampled = [table for table in tables if table.heap > 0]
+        if sampled:
+            sample_table = max(sampled, key=lambda table: table.heap)
+            _logger.info(f"Sampling {args['sample_size']} MB from {sample_table.table}")
+            data, read_seconds = measure_read(replica_sql, sample_table, args["sample_size"] * 1024 * 1024)
+    if sampled:
+        with sql_pool.connection("/tmp", user="postgres", db="postgres") as target_sql:
+            write_seconds = measure_write(target_sql, data)
+        read_rate = len(data) / read_seconds if read_seconds else 0.0
+        write_rate = len(data) / write_seconds if write_seconds else 0.0
+    estimate = estimate_sync(tables, read_rate, write_rate, args["jobs"], args["index_jobs"], args["sync_mode"])
+    log_estimate(tables, estimate, args["top"])
+    report_path = os.path.join(args["app_log_dir"], f"plan_{args['database']}.json")
+    _logger.info(f"Saving plan to {report_path}")
+    with open(report_path, "w") as report:
+        json.dump(estimate, report, indent=2)
+
+
+def drop_database_setup(args: dict, database: str, repl_name: str) -> None:
+    _logger.info(f"Cleaning target server, database {database}")
     try:
-        target_sql = SqlConn("/tmp", user="postgres", db=args["database"])
-        target_sql.drop_subscriber(sub_name=args["repl_name"])
-        target_sql = SqlConn("/tmp", user="postgres", db="postgres")
-        target_sql.drop_database(args["database"])
+        with SqlConn("/tmp", user="postgres", db=database) as target_sql:
+            target_sql.drop_subscriber(sub_name=repl_name)
+        target_sql = sql_pool.acquire("/tmp", user="postgres", db="postgres")
+        target_sql.drop_database(database)
     except OperationalError as err:
         _logger.warning(err)
-    _logger.info("Cleaning up master")
-    master_sql = SqlConn(args["master_host"], user=args["psql_user"], db=args["database"])
-    master_sql.drop_publication(args["repl_name"])
-    master_sql.drop_repl_slot(args["repl_name"])
+    _logger.info(f"Cleaning up master, database {database}")
+    master_sql = sql_pool.acquire(args["master_host"], user=args["psql_user"], db=database)
+    master_sql.drop_publication(repl_name)
+    master_sql.drop_repl_slot(repl_name)
+
+
+@cli(
+    [
+        argument(
+            "--databases",
+            help="Drop databases set up with setup-replica --databases, --repl-name is suffixed with database name",
+            nargs="+"
+        )
+    ]
+)
+def drop_setup(args) -> None:
+    if args["databases"]:
+        setups = [(database, f"{args['repl_name']}_{database}") for database in args["databases"]]
+    else:
+        setups = [(args["database"], args["repl_name"])]
+    for database, repl_name in setups:
+        drop_database_setup(args, database, repl_name)
     _logger.info("Cleaning up replica")
-    replica_sql = SqlConn(args["replica_host"], args["psql_user"])
-    replica_sql.resume_replica()
+    replica_sql = sql_pool.acquire(args["replica_host"], args["psql_user"])
+    resume_replica(replica_sql)
 
 
-@cli()
+@cli(
+    [
+        argument(
+            "--dry-run",
+            help="Only show sequences which differ from master",
+            action="store_true"
+        )
+    ]
+)
 def sync_sequences(args) -> None:
-    master_sql = SqlConn(args["master_host"], user=args["psql_user"], db=args["database"])
-    sync_seq_pipe(
-        psql=master_sql,
-        log_dir=args["app_log_dir"]
-    )
+    master_sql = sql_pool.acquire(args["master_host"], user=args["psql_user"], db=args["database"])
+    target_sql = sql_pool.acquire("/tmp", user="postgres", db=args["database"])
+    with ProgressStream(args["progress_stream"]) as stream:
+        sync_seq_values(
+            psql=master_sql,
+            target=target_sql,
+            dry_run=args["dry_run"],
+            progress=SyncProgress(database=args["database"], stream=stream)
+        )
+
+
+@cli(
+    [
+        argument(
+            "--interval",
+            help="Poll interval in seconds, default 5",
+            default=5,
+            type=float
+        ),
+        argument(
+            "--json",
+            help="Print JSON lines instead of live view",
+            action="store_true"
+        ),
+        argument(
+            "--until-caught-up",
+            help="Exit when subscriber lag drops below 1MB",
+            action="store_true"
+        )
+    ]
+)
+def monitor(args) -> None:
+    """
+    Subscriber apply lag, throughput and catch-up ETA
+    """
+    master_sql = sql_pool.acquire(args["master_host"], user=args["psql_user"], db=args["database"])
+    target_sql = sql_pool.acquire("/tmp", user="postgres", db=args["database"])
+    lag_monitor = LagMonitor(master_sql, target_sql, args["repl_name"])
+    stop = Event()
+    with ProgressStream(args["progress_stream"]) as stream:
+        try:
+            while not stop.is_set():
+                record = lag_monitor.poll()
+                stream.write(record)
+                if args["json"]:
+                    print(json.dumps(record), flush=True)
+                else:
+                    print(f"\r{format_lag(record):<120}", end="", flush=True)
+                if args["until_caught_up"] and record["lag_bytes"] < CAUGHT_UP_BYTES:
+                    break
+                stop.wait(args["interval"])
+        except KeyboardInterrupt:
+            pass
+    if not args["json"]:
+        print()
+    _logger.info(f"Monitoring {args['repl_name']} finished")
 
 
 @cli()
 def remove_repl_config(args) -> None:
     _logger.info("Removing logical replication configuration")
     try:
-        target_sql = SqlConn("/tmp", user="postgres", db=args["database"])
+        target_sql = sql_pool.acquire("/tmp", user="postgres", db=args["database"])
         _logger.debug(f"Dropping subscriber on localhost for db {args['database']}")
         target_sql.drop_subscriber(drop_slot=True, sub_name=args["repl_name"])
     except OperationalError as err:
         _logger.warning(err)
-    master_sql = SqlConn(args["master_host"], user=args["psql_user"], db=args["database"])
+    master_sql = sql_pool.acquire(args["master_host"], user=args["psql_user"], db=args["database"])
     _logger.debug(f"Dropping publication on host {args['master_host']} for db {args['database']}")
     master_sql.drop_publication(args["repl_name"])
 
@@ -364,10 +1076,19 @@ def main():
         args.func(args_dict)
     else:
         if args.saved_conf is not None:
+            if not args.no_metadata_cache:
+                metadata_cache.open(f"{args.saved_conf}.cache")
             args_dict = resolve_config(args_dict)
         drop_privileges(args_dict["user"])
         prepare_directories(args_dict["app_log_dir"], args_dict["app_tmp_dir"])
-        args.func(args_dict)
+        try:
+            with sql_pool:
+                args.func(args_dict)
+        finally:
+            metadata_cache.save()
+            if timings.phases:
+                timings.log_report()
+                timings.save(os.path.join(args_dict["app_log_dir"], f"{args.cli}_report.json"))
         _logger.info(f"App debug log: {args.save_log}")
         _logger.info(f"Dump/restore logs: {args.app_log_dir}")
 
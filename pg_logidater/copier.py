@@ -0,0 +1,257 @@
+from logging import getLogger
+from queue import Queue, Empty, Full
+from threading import Thread, Event, Lock
+from collections import Counter
+from time import monotonic
+from psycopg2 import Error
+from pg_logidater.utils import SqlConn, sql_pool
+from pg_logidater import sqlqueries as sql
+from pg_logidater.exceptions import SyncFailed
+from pg_logidater.scheduler import CopyTask
+from pg_logidater.progress import SyncProgress
+from pg_logidater.timing import timings
+from pg_logidater.checkpoint import Checkpoint
+from pg_logidater.budget import io_budget
+
+PIPE_POLL_INTERVAL = 1
+
+_logger = getLogger(__name__)
+
+
+class CopyPipe():
+    """
+    Bounded in-memory buffer between COPY TO STDOUT and COPY FROM STDIN.
+    Writer side blocks when all buffers are full, so the replica is never
+    read faster than the target can load. Writer also waits while sync
+    is throttled, chunks are charged to I/O budget read and write side.
+    """
+    def __init__(self, buffer_size: int, buffers: int, table: str = None, progress: SyncProgress = None,
+                 throttle: Event = None, abort: Event = None):
+        self.buffer_size = buffer_size
+        self.table = table
+        self.progress = progress
+        self.throttle = throttle
+        self.abort_sync = abort
+        self.queue = Queue(maxsize=buffers)
+        self.aborted = Event()
+        self.bytes = 0
+        self._chunk = bytearray()
+        self._eof = False
+
+    def _put(self, item) -> None:
+        while not self.aborted.is_set():
+            if self.abort_sync is not None and self.abort_sync.is_set():
+                break
+            if self.throttle is not None and self.throttle.is_set():
+                self.aborted.wait(PIPE_POLL_INTERVAL)
+                continue
+            try:
+                self.queue.put(item, timeout=PIPE_POLL_INTERVAL)
+                return
+            except Full:
+                continue
+        raise SyncFailed("Copy pipe aborted")
+
+    def write(self, data: bytes) -> int:
+        self._chunk += data
+        if len(self._chunk) >= self.buffer_size:
+            io_budget.read.consume(len(self._chunk), self.aborted)
+            self._put(bytes(self._chunk))
+            self._chunk = bytearray()
+        return len(data)
+
+    def close(self) -> None:
+        if self._chunk:
+            io_budget.read.consume(len(self._chunk), self.aborted)
+            self._put(bytes(self._chunk))
+            self._chunk = bytearray()
+        self._put(None)
+
+    def abort(self) -> None:
+        self.aborted.set()
+
+    def read(self, size: int = -1) -> bytes:
+        if self._eof:
+            return b""
+        while True:
+            if self.aborted.is_set():
+                raise SyncFailed("Copy pipe aborted")
+            try:
+                chunk = self.queue.get(timeout=PIPE_POLL_INTERVAL)
+                break
+            except Empty:
+                continue
+        if chunk is None:
+            self._eof = True
+            return b""
+        io_budget.write.consume(len(chunk), self.aborted)
+        self.bytes += len(chunk)
+        if self.progress:
+            self.progress.add_bytes(self.table, len(chunk))
+        return chunk
+
+
+def copy_statements(task: CopyTask) -> (str, str):
+    if task.where:
+        return (
+            sql.SQL_COPY_QUERY_TO_STDOUT.format(columns=task.columns, table=task.table, where=task.where),
+            sql.SQL_COPY_COLUMNS_FROM_STDIN.format(table=task.table, columns=task.columns)
+        )
+    return sql.SQL_COPY_TO_STDOUT.format(table=task.table), sql.SQL_COPY_FROM_STDIN.format(table=task.table)
+
+
+def rollback(psql: SqlConn) -> None:
+    """
+    Best effort, connection may be already broken by the copy error
+    """
+    try:
+        psql.sql_conn.rollback()
+    except Error as err:
+        _logger.debug(f"Rollback on {psql.host} failed: {err}")
+
+
+def copy_table(src: SqlConn, dst: SqlConn, task: CopyTask, buffer_size: int, buffers: int,
+               progress: SyncProgress = None, throttle: Event = None, abort: Event = None) -> (int, int, float):
+    pipe = CopyPipe(buffer_size, buffers, task.table, progress, throttle, abort)
+    errors = []
+    copy_out_sql, copy_in_sql = copy_statements(task)
+
+    def copy_out() -> None:
+        try:
+            src.cursor.copy_expert(copy_out_sql, pipe)
+            pipe.close()
+        except Exception as err:
+            errors.append(err)
+            pipe.abort()
+
+    _logger.debug(f"Copying table {task}")
+    if progress:
+        progress.table_started(task.table)
+    started = monotonic()
+    reader = Thread(target=copy_out, name=f"copy-out-{task.table}")
+    reader.start()
+    try:
+        dst.cursor.copy_expert(copy_in_sql, pipe, size=buffer_size)
+        rows = dst.cursor.rowcount
+        dst.sql_conn.commit()
+    except Exception as err:
+        errors.append(err)
+        pipe.abort()
+        rollback(dst)
+    reader.join()
+    if errors:
+        rollback(src)
+        raise SyncFailed(f"Copy of {task} failed: {errors[0]}")
+    src.sql_conn.commit()
+    if progress:
+        progress.table_finished(task.table, rows)
+    elapsed = monotonic() - started
+    timings.record_query(src.host, copy_out_sql, elapsed)
+    _logger.debug(f"Copied {task}: {rows} rows, {pipe.bytes} bytes in {elapsed:.1f}s")
+    return rows, pipe.bytes, elapsed
+
+
+class CopyJob():
+    """
+    State shared by copy workers: task queue, settings, failures and
+    per-table completion tracking for checkpoint journal
+    """
+    def __init__(self, host: str, user: str, database: str, tables: list[CopyTask], buffer_size: int,
+                 buffers: int, progress: SyncProgress = None, checkpoint: Checkpoint = None,
+                 throttle: Event = None, abort: Event = None):
+        self.host = host
+        self.user = user
+        self.database = database
+        self.buffer_size = buffer_size
+        self.buffers = buffers
+        self.progress = progress
+        self.checkpoint = checkpoint
+        self.throttle = throttle
+        self.abort = abort
+        self.tasks = Queue()
+        for task in tables:
+            self.tasks.put(task)
+        self.failed = []
+        self.stop = Event()
+        self._lock = Lock()
+        self._remaining = Counter(task.table for task in tables)
+
+    def fail(self, name: str) -> None:
+        with self._lock:
+            self.failed.append(name)
+        self.stop.set()
+
+    def task_done(self, task: CopyTask) -> None:
+        with self._lock:
+            self._remaining[task.table] -= 1
+            table_done = self._remaining[task.table] == 0
+        if table_done and self.checkpoint:
+            self.checkpoint.table_done(task.table)
+
+
+def copy_worker(job: CopyJob) -> None:
+    try:
+        src = sql_pool.acquire(job.host, db=job.database, user=job.user)
+    except Error as err:
+        _logger.error(f"Copy worker unable to connect: {err}")
+        job.fail("worker connection")
+        return
+    try:
+        dst = sql_pool.acquire("/tmp", user="postgres", db=job.database)
+        dst.query(sql.SQL_SYNC_COMMIT_OFF)
+    except Error as err:
+        _logger.error(f"Copy worker unable to connect: {err}")
+        job.fail("worker connection")
+        sql_pool.release(src)
+        return
+    try:
+        copy_loop(job, src, dst)
+    finally:
+        sql_pool.release(src)
+        sql_pool.release(dst)
+
+
+def copy_loop(job: CopyJob, src: SqlConn, dst: SqlConn) -> None:
+    while not job.stop.is_set():
+        if job.abort is not None and job.abort.is_set():
+            job.fail("sync aborted")
+            break
+        try:
+            task = job.tasks.get_nowait()
+        except Empty:
+            break
+        try:
+            with io_budget.worker_slot(job.abort):
+                rows, size, elapsed = copy_table(src, dst, task, job.buffer_size, job.buffers, job.progress,
+                                                 job.throttle, job.abort)
+            job.task_done(task)
+        except SyncFailed as err:
+            _logger.error(err)
+            job.fail(str(task))
+            break
+        except Exception as err:
+            _logger.error(f"Copy of {task} failed: {err}")
+            job.fail(str(task))
+            break
+        rate = size / elapsed / 1024 / 1024 if elapsed else 0
+        _logger.info(f"Table {task} copied: {rows} rows, {size / 1024 / 1024:.1f} MB, {rate:.1f} MB/s")
+
+
+def copy_tables(host: str, user: str, database: str, tables: list[CopyTask], jobs: int,
+                buffer_size: int, buffers: int, progress: SyncProgress = None, checkpoint: Checkpoint = None,
+                throttle: Event = None, abort: Event = None) -> None:
+    _logger.info(f"Copying {len(tables)} tables with {jobs} workers")
+    job = CopyJob(host, user, database, tables, buffer_size, buffers, progress, checkpoint, throttle, abort)
+    workers = []
+    for worker_id in range(min(jobs, len(tables))):
+        worker = Thread(
+            target=copy_worker,
+            name=f"copy-worker-{worker_id}",
+            args=(job,)
+        )
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+    if job.failed:
+        raise SyncFailed(f"Failed to copy tables: {', '.join(job.failed)}")
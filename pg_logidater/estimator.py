@@ -0,0 +1,114 @@
+from io import BytesIO
+from logging import getLogger
+from time import monotonic
+from typing import NamedTuple
+from pg_logidater.utils import SqlConn
+from pg_logidater import sqlqueries as sql
+from pg_logidater.scheduler import CopyTask, assign_workers
+from pg_logidater.progress import format_duration
+
+SAMPLE_ROWS_DEFAULT = 100000
+MB = 1024 * 1024
+
+_logger = getLogger(__name__)
+
+
+class TableSize(NamedTuple):
+    table: str
+    heap: int
+    toast: int
+    indexes: int
+    rows: int
+
+    @property
+    def data(self) -> int:
+        return self.heap + self.toast
+
+
+def table_breakdown(psql: SqlConn) -> list[TableSize]:
+    return [TableSize(*row) for row in psql.get_table_size_breakdown()]
+
+
+def measure_read(psql: SqlConn, table: TableSize, sample_size: int) -> (bytes, float):
+    """
+    COPY first rows of a table, about sample_size bytes, returns data and
+    seconds it took
+    """
+    rows = int(table.rows * sample_size / table.heap) if table.rows > 0 and table.heap else SAMPLE_ROWS_DEFAULT
+    sample = BytesIO()
+    started = monotonic()
+    psql.cursor.copy_expert(sql.SQL_COPY_SAMPLE_TO_STDOUT.format(table=table.table, rows=max(rows, 1)), sample)
+    elapsed = monotonic() - started
+    psql.sql_conn.commit()
+    return sample.getvalue(), elapsed
+
+
+def measure_write(psql: SqlConn, data: bytes) -> float:
+    """
+    COPY sample into scratch table on target, each line as single column,
+    synchronous commit is off only for the timed transaction
+    """
+    psql.query(sql.SQL_DROP_WRITE_TEST)
+    psql.query(sql.SQL_CREATE_WRITE_TEST)
+    try:
+        started = monotonic()
+        psql.cursor.execute(sql.SQL_SYNC_COMMIT_OFF_LOCAL)
+        psql.cursor.copy_expert(sql.SQL_COPY_WRITE_TEST, BytesIO(data.replace(b"\t", b"\\t")))
+        psql.sql_conn.commit()
+        return monotonic() - started
+    except Exception:
+        psql.sql_conn.rollback()
+        raise
+    finally:
+        psql.query(sql.SQL_DROP_WRITE_TEST)
+
+
+def estimate_sync(tables: list[TableSize], read_rate: float, write_rate: float, jobs: int, index_jobs: int,
+                  mode: str) -> dict:
+    """
+    Copy time from LPT critical path at single stream rate, index build at
+    write rate, peak target disk including dump directory in parallel mode
+    """
+    tasks = sorted((CopyTask(table.table, table.data) for table in tables), key=lambda task: task.size, reverse=True)
+    loads = assign_workers(tasks, jobs)
+    critical_path = max(loads) if loads else 0
+    stream_rate = min(read_rate, write_rate)
+    data = sum(table.data for table in tables)
+    indexes = sum(table.indexes for table in tables)
+    if mode in ("plain", "ssh"):
+        copy_seconds = (data + indexes) / stream_rate if stream_rate else None
+        index_seconds = 0.0
+    else:
+        copy_seconds = critical_path / stream_rate if stream_rate else None
+        index_seconds = indexes / write_rate / max(index_jobs, 1) if write_rate else None
+    peak_disk = data + indexes + (data if mode == "parallel" else 0)
+    return {
+        "tables": len(tables),
+        "heap_bytes": sum(table.heap for table in tables),
+        "toast_bytes": sum(table.toast for table in tables),
+        "index_bytes": indexes,
+        "critical_path_bytes": critical_path,
+        "read_mb_s": round(read_rate / MB, 1),
+        "write_mb_s": round(write_rate / MB, 1),
+        "copy_seconds": copy_seconds,
+        "index_seconds": index_seconds,
+        "total_seconds": copy_seconds + index_seconds if copy_seconds is not None and index_seconds is not None else None,
+        "peak_disk_bytes": peak_disk,
+    }
+
+
+def log_estimate(tables: list[TableSize], estimate: dict, top: int) -> None:
+    _logger.info(f"{'table':<50} {'heap MB':>10} {'toast MB':>10} {'index MB':>10}")
+    for table in tables[:top]:
+        _logger.info(f"{table.table:<50} {table.heap / MB:>10.1f} {table.toast / MB:>10.1f} {table.indexes / MB:>10.1f}")
+    _logger.info(
+        f"{estimate['tables']} tables, heap {estimate['heap_bytes'] / MB:.1f} MB, "
+        f"toast {estimate['toast_bytes'] / MB:.1f} MB, indexes {estimate['index_bytes'] / MB:.1f} MB"
+    )
+    _logger.info(f"Sample throughput, read: {estimate['read_mb_s']} MB/s, write: {estimate['write_mb_s']} MB/s")
+    _logger.info(f"Largest worker load: {estimate['critical_path_bytes'] / MB:.1f} MB")
+    _logger.info(
+        f"Predicted copy {format_duration(estimate['copy_seconds'])}, indexes {format_duration(estimate['index_seconds'])}, "
+        f"total {format_duration(estimate['total_seconds'])}"
+    )
+    _logger.info(f"Predicted peak target disk usage: {estimate['peak_disk_bytes'] / MB:.1f} MB")
@@ -51,3 +51,60 @@ class DiskSpaceTooLow(Exception):
     """
     Disk space too low exception
     """
+
+
+class TablesNotReplicable(Exception):
+    def __init__(self, message=None):
+        if not message:
+            message = "Database has tables that can't be replicated"
+        super().__init__(message)
+
+
+class ResumeNotPossible(Exception):
+    def __init__(self, message=None):
+        if not message:
+            message = "Setup can't be resumed"
+        super().__init__(message)
+
+
+class SyncFailed(Exception):
+    def __init__(self, message=None):
+        if not message:
+            message = "Database sync failed"
+        super().__init__(message)
+
+
+class SyncAborted(SyncFailed):
+    def __init__(self, message=None):
+        if not message:
+            message = "Setup aborted by WAL watchdog, replication slots dropped and replica resumed, " \
+                      "resume is not possible, start setup again"
+        super().__init__(message)
+
+
+class PreflightTimeout(Exception):
+    def __init__(self, message=None):
+        if not message:
+            message = "Preflight checks timed out"
+        super().__init__(message)
+
+
+class ReplicationSlotMissing(Exception):
+    def __init__(self, message=None):
+        if not message:
+            message = "Replication slot doesn't exist"
+        super().__init__(message)
+
+
+class EarlyResumeNotPossible(Exception):
+    def __init__(self, message=None):
+        if not message:
+            message = "Replica can't be resumed before sync"
+        super().__init__(message)
+
+
+class VerificationFailed(Exception):
+    def __init__(self, message=None):
+        if not message:
+            message = "Target data doesn't match replica"
+        super().__init__(message)
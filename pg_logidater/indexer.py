@@ -0,0 +1,144 @@
+from logging import getLogger
+from queue import Queue, Empty
+from threading import Thread
+from time import monotonic
+from typing import NamedTuple
+from psycopg2 import Error
+from psycopg2.errors import DuplicateTable
+from pg_logidater.utils import SqlConn, sql_pool
+from pg_logidater.exceptions import SyncFailed
+from pg_logidater.checkpoint import Checkpoint
+
+ADD_CONSTRAINT = "ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"
+VALIDATE_CONSTRAINT = "ALTER TABLE {table} VALIDATE CONSTRAINT {name}"
+REPLICA_IDENTITY = "ALTER TABLE ONLY {table} REPLICA IDENTITY USING INDEX {index}"
+CLUSTER_ON = "ALTER TABLE ONLY {table} CLUSTER ON {index}"
+
+_logger = getLogger(__name__)
+
+
+class IndexTask(NamedTuple):
+    table: str
+    name: str
+    statements: list
+    size: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.table}/{self.name}"
+
+
+def index_statements(table: str, index: str, replident: bool, clustered: bool) -> list[str]:
+    statements = []
+    if replident:
+        statements.append(REPLICA_IDENTITY.format(table=table, index=index))
+    if clustered:
+        statements.append(CLUSTER_ON.format(table=table, index=index))
+    return statements
+
+
+def collect_post_data(psql: SqlConn) -> (list[IndexTask], list[IndexTask]):
+    """
+    Returns indexes with primary/unique/exclusion constraints and foreign
+    keys separately, foreign keys must be built after referenced keys
+    """
+    keys = []
+    foreign_keys = []
+    for table, index, definition, replident, clustered, size in psql.get_index_defs():
+        # partitioned index definition is ON ONLY, build it down to partitions
+        definition = definition.replace(" ON ONLY ", " ON ", 1)
+        statements = [definition] + index_statements(table, index, replident, clustered)
+        keys.append(IndexTask(table, index, statements, size))
+    for constraint in psql.get_constraint_defs():
+        table, name, contype, definition, validated, replident, clustered, index, size, partitioned = constraint
+        if contype == "f":
+            statements = [ADD_CONSTRAINT.format(table=table, name=name, definition=definition)]
+            # NOT VALID foreign keys on partitioned tables are rejected before version 18
+            if validated and not partitioned:
+                statements = [
+                    ADD_CONSTRAINT.format(table=table, name=name, definition=f"{definition} NOT VALID"),
+                    VALIDATE_CONSTRAINT.format(table=table, name=name)
+                ]
+            foreign_keys.append(IndexTask(table, name, statements, size))
+        else:
+            statements = [ADD_CONSTRAINT.format(table=table, name=name, definition=definition)]
+            statements += index_statements(table, index, replident, clustered)
+            keys.append(IndexTask(table, name, statements, size))
+    keys.sort(key=lambda task: task.size, reverse=True)
+    foreign_keys.sort(key=lambda task: task.size, reverse=True)
+    return keys, foreign_keys
+
+
+def index_worker(tasks: Queue, failed: list, database: str, work_mem: str, parallel_workers: int,
+                 checkpoint: Checkpoint = None) -> None:
+    try:
+        psql = sql_pool.acquire("/tmp", user="postgres", db=database)
+        psql.set_maintenance_settings(work_mem, parallel_workers)
+    except Error as err:
+        _logger.error(f"Index worker unable to connect: {err}")
+        failed.append("worker connection")
+        return
+    try:
+        index_loop(tasks, failed, psql, checkpoint)
+    finally:
+        sql_pool.release(psql)
+
+
+def index_loop(tasks: Queue, failed: list, psql: SqlConn, checkpoint: Checkpoint = None) -> None:
+    while True:
+        try:
+            task = tasks.get_nowait()
+        except Empty:
+            break
+        started = monotonic()
+        try:
+            for statement in task.statements:
+                psql.query(statement)
+        except DuplicateTable:
+            psql.sql_conn.rollback()
+            _logger.warning(f"{task.name} on {task.table} already exists")
+        except Error as err:
+            psql.sql_conn.rollback()
+            _logger.error(f"Failed to build {task.name} on {task.table}: {str(err).strip()}")
+            failed.append(task.name)
+            continue
+        if checkpoint:
+            checkpoint.index_done(task.key)
+        _logger.info(f"Built {task.name} on {task.table} in {monotonic() - started:.1f}s")
+
+
+def run_index_stage(tasks: list[IndexTask], database: str, jobs: int, work_mem: str, parallel_workers: int,
+                    checkpoint: Checkpoint = None) -> list:
+    work = Queue()
+    for task in tasks:
+        work.put(task)
+    failed = []
+    workers = []
+    for worker_id in range(min(jobs, len(tasks))):
+        worker = Thread(
+            target=index_worker,
+            name=f"index-worker-{worker_id}",
+            args=(work, failed, database, work_mem, parallel_workers, checkpoint)
+        )
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+    return failed
+
+
+def build_indexes(psql: SqlConn, database: str, jobs: int, work_mem: str, parallel_workers: int,
+                  checkpoint: Checkpoint = None) -> None:
+    keys, foreign_keys = collect_post_data(psql)
+    if checkpoint and checkpoint.indexes:
+        keys = [task for task in keys if task.key not in checkpoint.indexes]
+        foreign_keys = [task for task in foreign_keys if task.key not in checkpoint.indexes]
+        _logger.info(f"Skipping {len(checkpoint.indexes)} indexes and keys built before")
+    _logger.info(f"Building {len(keys)} indexes and keys with {jobs} workers")
+    started = monotonic()
+    failed = run_index_stage(keys, database, jobs, work_mem, parallel_workers, checkpoint)
+    _logger.info(f"Building {len(foreign_keys)} foreign keys with {jobs} workers")
+    failed += run_index_stage(foreign_keys, database, jobs, work_mem, parallel_workers, checkpoint)
+    _logger.info(f"Index and constraint build finished in {monotonic() - started:.1f}s")
+    if failed:
+        raise SyncFailed(f"Failed to build: {', '.join(failed)}")
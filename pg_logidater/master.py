@@ -1,19 +1,112 @@
 from logging import getLogger
+from collections import Counter
+from fnmatch import fnmatchcase
+from typing import NamedTuple
 from pg_logidater.utils import SqlConn
+from pg_logidater.timing import timed_phase
 from pg_logidater.exceptions import (
     PublicationExists,
     ReplicaLevelNotCorrect,
     ReplicaSlotExists,
+    TablesNotReplicable,
 )
 
 PG_DUMP = "/usr/bin/pg_dump --no-publications --no-subscriptions"
 PG_DUMPALL = "/usr/bin/pg_dumpall"
 PSQL = "/usr/bin/psql"
 
+UNLOGGED_ISSUE = "unlogged, data is not replicated"
+
 _logger = getLogger(__name__)
 
 
-def master_checks(psql: SqlConn, slot_name: str, pub_name: str, skip_pkey_check: bool) -> int:
+class TableIssue(NamedTuple):
+    table: str
+    issue: str
+    fatal: bool
+
+
+def table_replication_report(psql: SqlConn) -> list[TableIssue]:
+    """
+    Tables logical replication can't handle or handles with caveats,
+    fatal issues break UPDATE and DELETE replication
+    """
+    report = []
+    for table, partitioned, unlogged, identity, has_pkey, has_identity_index in psql.get_table_replication_info():
+        if partitioned:
+            report.append(TableIssue(table, "partitioned, partitions are replicated separately", False))
+        if unlogged:
+            report.append(TableIssue(table, UNLOGGED_ISSUE, False))
+        if identity == "n":
+            report.append(TableIssue(table, "replica identity nothing", True))
+        elif identity == "f":
+            report.append(TableIssue(table, "replica identity full, slow apply on subscriber", False))
+        elif identity == "d" and not has_pkey and not partitioned:
+            report.append(TableIssue(table, "no primary key", True))
+        elif identity == "i" and not has_identity_index:
+            report.append(TableIssue(table, "replica identity index missing", True))
+    return report
+
+
+def match_table(schema: str, table: str, patterns: list[str]) -> bool:
+    return any(fnmatchcase(f"{schema}.{table}", pattern) or fnmatchcase(schema, pattern) for pattern in patterns)
+
+
+def publication_tables(psql: SqlConn, include: list[str] = None, exclude: list[str] = None,
+                       exclude_no_identity: bool = False) -> (list[str], list[str]):
+    """
+    Tables for publication and tables left out of it. Patterns match
+    schema.table or schema, without filters publication is for all tables
+    """
+    if not include and not exclude and not exclude_no_identity:
+        return None, []
+    unusable = set()
+    if exclude_no_identity:
+        unusable = {item.table for item in table_replication_report(psql) if item.fatal or item.issue == UNLOGGED_ISSUE}
+    tables = []
+    excluded = []
+    for schema, table, name in psql.get_table_names():
+        if include and not match_table(schema, table, include):
+            excluded.append(name)
+        elif exclude and match_table(schema, table, exclude):
+            excluded.append(name)
+        elif name in unusable:
+            _logger.warning(f"Excluding {name}, no usable replica identity")
+            excluded.append(name)
+        else:
+            tables.append(name)
+    check_excluded_references(psql, excluded)
+    _logger.info(f"Publishing {len(tables)} tables, excluded {len(excluded)}")
+    return tables, excluded
+
+
+def excluded_references(references: list[tuple], excluded: list[str]) -> list[tuple]:
+    """
+    Foreign keys of synced tables pointing into excluded tables, those
+    tables are created empty on target, so constraints can't be restored
+    """
+    excluded = set(excluded)
+    return [
+        (table, name, referenced) for table, name, referenced in references
+        if referenced in excluded and table not in excluded
+    ]
+
+
+def check_excluded_references(psql: SqlConn, excluded: list[str]) -> None:
+    if not excluded:
+        return
+    broken = excluded_references(psql.get_foreign_key_references(), excluded)
+    for table, name, referenced in broken:
+        _logger.error(f"Foreign key {name} of {table} references excluded table {referenced}")
+    if broken:
+        raise TablesNotReplicable(
+            f"{len(broken)} foreign keys reference excluded tables, exclude referencing tables too"
+        )
+
+
+@timed_phase
+def master_checks(psql: SqlConn, slot_name: str, pub_name: str, skip_pkey_check: bool,
+                  tables: list[str] = None) -> int:
     _logger.info("Executing master checks")
     _logger.debug("Checking wal_level")
     wal_level = psql.get_wal_level()
@@ -28,26 +121,33 @@ def master_checks(psql: SqlConn, slot_name: str, pub_name: str, skip_pkey_check:
     if publication:
         raise PublicationExists(f"Publication {pub_name} already exists for db: {psql.sql_conn.get_dsn_parameters()['dbname']}")
     if not skip_pkey_check:
-        _logger.debug("Checking tables without primary keys")
-        no_keys_list = psql.get_no_primary_key()
-        if no_keys_list:
-            _logger.warning("Database have tables without primary key, that can cause issues with logical replication")
-            _logger.warning("Following tables doesn't have primary key")
-            for item in no_keys_list:
-                print(f"{item[0]}.{item[1]}")
-            _logger.warning("If that's fine, add --ignore-pkey switch")
-            exit(1)
+        _logger.debug("Checking tables primary keys and replica identity")
+        report = table_replication_report(psql)
+        if tables is not None:
+            published = set(tables)
+            report = [item for item in report if item.table in published]
+        for item in report:
+            if item.fatal:
+                _logger.error(f"{item.table}: {item.issue}")
+            else:
+                _logger.warning(f"{item.table}: {item.issue}")
+        fatal = Counter(item.issue for item in report if item.fatal)
+        if fatal:
+            summary = ", ".join(f"{issue}: {count}" for issue, count in fatal.items())
+            raise TablesNotReplicable(f"Tables not ready for logical replication ({summary}), "
+                                      "if that's fine, add --ignore-pkey switch")
     _logger.debug("Getting db size")
     db = psql.sql_conn.get_dsn_parameters()["dbname"]
     db_size = psql.get_db_size(db)
     return db_size
 
 
-def master_prepare(psql: SqlConn, name: str, database: str) -> str:
+@timed_phase
+def master_prepare(psql: SqlConn, name: str, database: str, tables: list[str] = None) -> str:
     _logger.info("Creating logical replication slot")
     psql.create_logical_slot(name)
     _logger.info("Creating publication")
-    psql.create_publication(name)
+    psql.create_publication(name, tables)
     _logger.info(f"Geting db owner for {database}")
     db_owner = psql.get_database_owner(database)
     return db_owner
@@ -0,0 +1,83 @@
+from collections import deque
+from datetime import datetime
+from logging import getLogger
+from time import monotonic
+from typing import NamedTuple
+from pg_logidater.utils import SqlConn
+from pg_logidater.exceptions import ReplicationSlotMissing
+from pg_logidater.progress import format_duration
+
+MONITOR_WINDOW = 12
+CAUGHT_UP_BYTES = 1048576
+
+_logger = getLogger(__name__)
+
+
+class LagSample(NamedTuple):
+    time: float
+    current_lsn: int
+    confirmed_lsn: int
+
+
+class LagMonitor():
+    """
+    Subscriber apply lag from master slot position, pg_stat_replication
+    and target pg_stat_subscription, rates over sliding sample window
+    """
+    def __init__(self, master: SqlConn, target: SqlConn, name: str, window: int = MONITOR_WINDOW):
+        self.master = master
+        self.target = target
+        self.name = name
+        self.samples = deque(maxlen=window)
+
+    def poll(self) -> dict:
+        positions = self.master.get_slot_positions(self.name)
+        if positions is None:
+            raise ReplicationSlotMissing(f"Replication slot {self.name} doesn't exist on master")
+        current_lsn, confirmed_lsn, active = positions
+        self.samples.append(LagSample(monotonic(), current_lsn, confirmed_lsn))
+        state, lag_seconds = self.master.get_replication_lag(self.name) or (None, None)
+        pid, received_lsn, last_msg_age = self.target.get_subscription_stats(self.name) or (None, None, None)
+        lag_bytes = max(current_lsn - confirmed_lsn, 0)
+        apply_rate, wal_rate = self.rates()
+        catchup_rate = apply_rate - wal_rate
+        return {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "subscription": self.name,
+            "slot_active": active,
+            "state": state,
+            "worker_pid": pid,
+            "lag_bytes": lag_bytes,
+            "lag_seconds": round(lag_seconds, 1) if lag_seconds is not None else None,
+            "received_lag_bytes": max(current_lsn - received_lsn, 0) if received_lsn is not None else None,
+            "last_msg_age": round(last_msg_age, 1) if last_msg_age is not None else None,
+            "apply_mb_s": round(apply_rate / 1024 / 1024, 2),
+            "wal_mb_s": round(wal_rate / 1024 / 1024, 2),
+            "eta": self.eta(lag_bytes, catchup_rate),
+        }
+
+    def eta(self, lag_bytes: int, catchup_rate: float) -> float:
+        if not lag_bytes:
+            return 0.0
+        if catchup_rate <= 0:
+            return None
+        return round(lag_bytes / catchup_rate, 1)
+
+    def rates(self) -> (float, float):
+        if len(self.samples) < 2:
+            return 0.0, 0.0
+        first, last = self.samples[0], self.samples[-1]
+        elapsed = last.time - first.time
+        if not elapsed:
+            return 0.0, 0.0
+        return (last.confirmed_lsn - first.confirmed_lsn) / elapsed, (last.current_lsn - first.current_lsn) / elapsed
+
+
+def format_lag(record: dict) -> str:
+    lag_seconds = f"{record['lag_seconds']:.1f}s" if record["lag_seconds"] is not None else "-"
+    return (
+        f"{record['subscription']} {record['state'] or 'not connected'}, "
+        f"lag {record['lag_bytes'] / 1024 / 1024:.1f} MB / {lag_seconds}, "
+        f"apply {record['apply_mb_s']:.1f} MB/s, wal {record['wal_mb_s']:.1f} MB/s, "
+        f"ETA {format_duration(record['eta'])}"
+    )
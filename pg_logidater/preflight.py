@@ -0,0 +1,96 @@
+from logging import getLogger
+from threading import Thread
+from time import monotonic
+from pg_logidater.exceptions import PreflightTimeout
+from pg_logidater.timing import timings
+from pg_logidater.utils import SqlConn, ServerConn, sql_pool
+from pg_logidater.master import master_checks, publication_tables
+from pg_logidater.replica import replica_info
+from pg_logidater.tartget import target_check
+
+PREFLIGHT_TIMEOUT = 30
+
+_logger = getLogger(__name__)
+
+
+class PreflightCheck(Thread):
+    """
+    Single host check running in daemon thread, so hanging host can't
+    block exit after timeout
+    """
+    def __init__(self, name: str, func):
+        super().__init__(name=f"preflight-{name}", daemon=True)
+        self.check = name
+        self.func = func
+        self.result = None
+        self.error = None
+        self.elapsed = 0.0
+
+    def run(self) -> None:
+        started = monotonic()
+        try:
+            self.result = self.func()
+        except BaseException as err:
+            self.error = err
+        finally:
+            self.elapsed = monotonic() - started
+
+
+def run_preflight(checks: dict, timeout: float = PREFLIGHT_TIMEOUT) -> dict:
+    """
+    Run independent host checks at once, returns results by check name.
+    First failed check error is raised.
+    """
+    threads = [PreflightCheck(name, func) for name, func in checks.items()]
+    with timings.phase("preflight"):
+        for thread in threads:
+            thread.start()
+        deadline = monotonic() + timeout
+        results = {}
+        for thread in threads:
+            thread.join(max(deadline - monotonic(), 0))
+            if thread.is_alive():
+                raise PreflightTimeout(f"Preflight {thread.check} didn't finish in {timeout}s")
+            if thread.error is not None:
+                raise thread.error
+            _logger.debug(f"Preflight {thread.check} finished in {thread.elapsed:.2f}s")
+            results[thread.check] = thread.result
+    return results
+
+
+def master_preflight(host: str, user: str, database: str, name: str, skip_pkey_check: bool,
+                     timeout: float = PREFLIGHT_TIMEOUT, include: list[str] = None, exclude: list[str] = None,
+                     exclude_no_identity: bool = False) -> (SqlConn, int, list[str], list[str]):
+    psql = sql_pool.acquire(host, user=user, db=database, connect_timeout=timeout)
+    tables, excluded = publication_tables(psql, include, exclude, exclude_no_identity)
+    db_size = master_checks(
+        psql=psql,
+        slot_name=name,
+        pub_name=name,
+        skip_pkey_check=skip_pkey_check,
+        tables=tables
+    )
+    return psql, db_size, tables, excluded
+
+
+def target_preflight(databases: list[str], timeout: float = PREFLIGHT_TIMEOUT) -> (SqlConn, int):
+    psql = sql_pool.acquire("/tmp", user="postgres", db="postgres", connect_timeout=timeout)
+    available_disk = 0
+    for database in databases:
+        available_disk = target_check(
+            psql=psql,
+            database=database,
+            name=database
+        )
+    return psql, available_disk
+
+
+def replica_preflight(host: str, psql_user: str, ssh_user: str,
+                      timeout: float = PREFLIGHT_TIMEOUT) -> (SqlConn, str, str):
+    psql = sql_pool.acquire(host, psql_user, connect_timeout=timeout)
+    with ServerConn(host, ssh_user) as ssh:
+        app_name, slot_name = replica_info(
+            psql=psql,
+            ssh=ssh
+        )
+    return psql, app_name, slot_name
@@ -0,0 +1,217 @@
+import os
+import json
+import stat
+from select import PIPE_BUF
+from datetime import datetime
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+
+_logger = getLogger(__name__)
+
+
+def format_duration(seconds: float) -> str:
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressStream():
+    """
+    JSON lines progress records written to a file or FIFO. FIFO stays
+    non-blocking, records are dropped while reader doesn't keep up. FIFO
+    records over PIPE_BUF are dropped too, only smaller writes are atomic.
+    """
+    def __init__(self, stream_path: str = None):
+        self._lock = Lock()
+        self._file = None
+        self._fifo = None
+        self.dropped = 0
+        self.oversized = 0
+        if not stream_path:
+            return
+        try:
+            if os.path.exists(stream_path) and stat.S_ISFIFO(os.stat(stream_path).st_mode):
+                self._fifo = os.open(stream_path, os.O_WRONLY | os.O_NONBLOCK)
+            else:
+                self._file = open(stream_path, "a", buffering=1)
+            _logger.info(f"Writing progress stream to {stream_path}")
+        except OSError as err:
+            _logger.warning(f"Unable to open progress stream {stream_path}: {err}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write(self, record: dict) -> None:
+        with self._lock:
+            if self._fifo is not None:
+                self._write_fifo(json.dumps(record) + "\n")
+                return
+            if self._file is None:
+                return
+            try:
+                self._file.write(json.dumps(record) + "\n")
+            except OSError as err:
+                _logger.warning(f"Progress stream closed: {err}")
+                self._file = None
+
+    def _write_fifo(self, line: str) -> None:
+        data = line.encode()
+        if len(data) > PIPE_BUF:
+            self.dropped += 1
+            if not self.oversized:
+                _logger.warning(f"Progress record of {len(data)} bytes over FIFO limit {PIPE_BUF}, dropping")
+            self.oversized += 1
+            return
+        try:
+            written = os.write(self._fifo, data)
+            if written != len(data):
+                # not expected for atomic writes, reader gets broken line
+                self.dropped += 1
+                _logger.warning(f"Progress record written partially, {written} of {len(data)} bytes")
+        except BlockingIOError:
+            self.dropped += 1
+            if self.dropped == 1:
+                _logger.warning("Progress stream reader is too slow, dropping records")
+        except OSError as err:
+            _logger.warning(f"Progress stream closed: {err}")
+            os.close(self._fifo)
+            self._fifo = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fifo is not None:
+                try:
+                    os.close(self._fifo)
+                except OSError:
+                    pass
+                self._fifo = None
+                if self.dropped:
+                    _logger.info(f"Progress stream dropped {self.dropped} records")
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+                self._file = None
+
+
+class SyncProgress():
+    """
+    Bytes and rows moved by database sync, fed either by copy pipeline or
+    by polling pg_stat_progress_copy on target
+    """
+    def __init__(self, total: int = 0, database: str = None, stream: ProgressStream = None):
+        self._lock = Lock()
+        self.total = total
+        self.database = database
+        self.stream = stream
+        self.phase = "init"
+        self.started = monotonic()
+        self.bytes = 0
+        self.rows = 0
+        self.tables = {}
+        self.index = None
+        self._server_copy = {}
+
+    def table_started(self, table: str) -> None:
+        with self._lock:
+            counters = self.tables.setdefault(
+                table,
+                {"rows": 0, "bytes": 0, "started": monotonic(), "finished": None, "running": 0}
+            )
+            counters["running"] += 1
+            counters["finished"] = None
+
+    def add_bytes(self, table: str, size: int) -> None:
+        with self._lock:
+            self.bytes += size
+            if table in self.tables:
+                self.tables[table]["bytes"] += size
+
+    def table_finished(self, table: str, rows: int) -> None:
+        with self._lock:
+            self.rows += rows
+            if table in self.tables:
+                counters = self.tables[table]
+                counters["rows"] += rows
+                counters["running"] -= 1
+                if counters["running"] <= 0:
+                    counters["finished"] = monotonic()
+
+    def set_phase(self, phase: str) -> None:
+        _logger.debug(f"Sync phase: {phase}")
+        self.phase = phase
+        self.emit()
+
+    def emit(self, **extra) -> None:
+        if self.stream is None:
+            return
+        eta = self.eta()
+        record = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "database": self.database,
+            "phase": self.phase,
+            "bytes": self.bytes,
+            "total_bytes": self.total,
+            "rows": self.rows,
+            "mb_s": round(self.rate() / 1024 / 1024, 2),
+            "elapsed": round(self.elapsed(), 1),
+            "eta": round(eta, 1) if eta is not None else None,
+            "tables": self.current_tables(),
+        }
+        record.update(extra)
+        self.stream.write(record)
+
+    def set_bytes(self, size: int) -> None:
+        with self._lock:
+            self.bytes = size
+
+    def update_from_copy_stats(self, stats: list[tuple]) -> None:
+        """
+        pg_stat_progress_copy shows only running COPY, keep last seen
+        counters of finished tables
+        """
+        with self._lock:
+            now = monotonic()
+            active = set()
+            for table, size, rows in stats:
+                active.add(table)
+                self._server_copy[table] = (size, rows)
+                self.tables.setdefault(
+                    table,
+                    {"rows": 0, "bytes": 0, "started": now, "finished": None, "running": 1}
+                )
+                self.tables[table].update(bytes=size, rows=rows, finished=None)
+            for table, counters in self.tables.items():
+                if table not in active and counters["finished"] is None:
+                    counters["finished"] = now
+            self.bytes = sum(size for size, _ in self._server_copy.values())
+            self.rows = sum(rows for _, rows in self._server_copy.values())
+
+    def current_tables(self) -> list[str]:
+        with self._lock:
+            return [table for table, counters in self.tables.items() if counters["finished"] is None]
+
+    def elapsed(self) -> float:
+        return monotonic() - self.started
+
+    def rate(self) -> float:
+        elapsed = self.elapsed()
+        return self.bytes / elapsed if elapsed else 0
+
+    def eta(self) -> float:
+        rate = self.rate()
+        if not rate or not self.total:
+            return None
+        return max(self.total - self.bytes, 0) / rate
+
+    def summary(self) -> str:
+        return (
+            f"{self.bytes / 1024 / 1024:.1f} MB, {self.rows} rows, {self.rate() / 1024 / 1024:.1f} MB/s, "
+            f"elapsed {format_duration(self.elapsed())}, ETA {format_duration(self.eta())}"
+        )
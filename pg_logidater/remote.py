@@ -0,0 +1,195 @@
+import re
+import posixpath
+from logging import getLogger
+from shlex import quote
+from time import monotonic
+from urllib.parse import urlparse, parse_qs
+from typing import NamedTuple
+from pg_logidater.timing import timings
+from pg_logidater.utils import ServerConn
+from pg_logidater.exceptions import VersionNotSupported
+
+PROBE_MARKER = "@@pg_logidater@@"
+PROBE_TIMEOUT = 60
+MAX_INCLUDE_DEPTH = 10
+
+# min server version, config files read in order, later values override
+CONF_LAYOUT = [
+    (12, ("{config_file}", "{data_directory}/postgresql.auto.conf")),
+    (11, ("{config_file}", "{data_directory}/postgresql.auto.conf", "{data_directory}/recovery.conf")),
+]
+INCLUDE_DIRECTIVES = ("include", "include_if_exists", "include_dir")
+DEFAULT_APP_NAME = "walreceiver"
+
+CONF_LINE = re.compile(r"^\s*([A-Za-z_][\w.]*)\s*=?\s*('(?:[^'\\]|\\.|'')*'|[^\s#]*)")
+CONNINFO_PAIR = re.compile(r"(\w+)\s*=\s*('(?:[^'\\]|\\.)*'|\S+)")
+
+_logger = getLogger(__name__)
+
+
+class RemoteInfo(NamedTuple):
+    app_name: str
+    slot_name: str
+    free_space: int
+    wal_size: int
+
+
+def conf_files(version: int, data_directory: str, config_file: str) -> list[str]:
+    for min_version, files in CONF_LAYOUT:
+        if version >= min_version:
+            return [name.format(data_directory=data_directory, config_file=config_file) for name in files]
+    raise VersionNotSupported(f"Version {version} not supported")
+
+
+def unquote_conf(value: str) -> str:
+    if len(value) > 1 and value.startswith("'") and value.endswith("'"):
+        return re.sub(r"\\(.)", r"\1", value[1:-1].replace("''", "'"))
+    return value
+
+
+def conninfo_value(conninfo: str, key: str) -> str:
+    if conninfo.startswith(("postgres://", "postgresql://")):
+        return parse_qs(urlparse(conninfo).query).get(key, [None])[-1]
+    value = None
+    for name, item in CONNINFO_PAIR.findall(conninfo):
+        if name == key:
+            value = re.sub(r"\\(.)", r"\1", item[1:-1]) if item.startswith("'") else item
+    return value
+
+
+class ConfFile():
+    """
+    Settings and include directives of single config file, in file order
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.exists = False
+        self.entries = []
+
+    def feed(self, line: str) -> None:
+        self.exists = True
+        match = CONF_LINE.match(line)
+        if match is None:
+            return
+        name, value = match.group(1).lower(), unquote_conf(match.group(2))
+        if name in INCLUDE_DIRECTIVES and not posixpath.isabs(value):
+            value = posixpath.join(posixpath.dirname(self.path), value)
+        self.entries.append((name, value))
+
+
+class RemoteInspect():
+    """
+    Batch of remote probes executed as one command over single ssh session,
+    output is read and parsed line by line
+    """
+    def __init__(self, ssh: ServerConn, timeout: float = PROBE_TIMEOUT):
+        self.ssh = ssh
+        self.timeout = timeout
+        self.files = {}
+        self.dirs = {}
+        self.values = {}
+
+    def _script(self, files: list[str], dirs: list[str], free_space: str, dir_size: str) -> str:
+        script = []
+        for name in files:
+            script.append(f"echo '{PROBE_MARKER} file '{quote(name)}; cat {quote(name)} 2>/dev/null")
+        for name in dirs:
+            script.append(
+                f"echo '{PROBE_MARKER} dir '{quote(name)}; "
+                f"for f in $(ls {quote(name)}/*.conf 2>/dev/null | sort); do "
+                f"echo '{PROBE_MARKER} file '\"$f\"; cat \"$f\"; done"
+            )
+        if free_space is not None:
+            script.append(f"echo '{PROBE_MARKER} free_space'; df -B1 --output=avail {quote(free_space)} | tail -1")
+        if dir_size is not None:
+            script.append(f"echo '{PROBE_MARKER} dir_size'; du -sb {quote(dir_size)} | cut -f1")
+        return "; ".join(script)
+
+    def run(self, files: list[str], dirs: list[str] = None, free_space: str = None, dir_size: str = None) -> None:
+        dirs = dirs or []
+        command = self._script(files, dirs, free_space, dir_size)
+        _logger.debug(f"Executing {len(files) + len(dirs)} remote probes on {self.ssh.host}")
+        started = monotonic()
+        _, out, err = self.ssh.exec_command(command=command, timeout=self.timeout)
+        current, current_dir = None, None
+        for line in out:
+            if line.startswith(PROBE_MARKER):
+                kind, _, name = line[len(PROBE_MARKER):].strip().partition(" ")
+                if kind == "file":
+                    current = self.files.setdefault(name, ConfFile(name))
+                    if current_dir is not None:
+                        self.dirs[current_dir].append(name)
+                elif kind == "dir":
+                    current, current_dir = None, name
+                    self.dirs[name] = []
+                else:
+                    current, current_dir = kind, None
+                continue
+            if isinstance(current, ConfFile):
+                current.feed(line)
+            elif current is not None and line.strip():
+                self.values[current] = int(line.strip())
+        returncode = out.channel.recv_exit_status()
+        error = err.read().decode().strip()
+        if len(error) > 0:
+            _logger.warning(f"Remote probe on {self.ssh.host}: {error}")
+        timings.record_command(f"remote probes on {self.ssh.host}", monotonic() - started, returncode)
+
+    def settings(self, files: list[str]) -> dict:
+        """
+        Read config files with all include directives resolved, fetching
+        missing includes in further batches over the same session
+        """
+        for _ in range(MAX_INCLUDE_DEPTH + 1):
+            missing_files = [name for name in files if name not in self.files]
+            missing_dirs = []
+            for conf in list(self.files.values()):
+                for name, value in conf.entries:
+                    if name == "include_dir" and value not in self.dirs and value not in missing_dirs:
+                        missing_dirs.append(value)
+                    elif name in ("include", "include_if_exists") and value not in self.files and value not in missing_files:
+                        missing_files.append(value)
+            if not missing_files and not missing_dirs:
+                break
+            self.run(missing_files, missing_dirs)
+        settings = {}
+        for name in files:
+            self._apply(name, settings, 0)
+        return settings
+
+    def _apply(self, path: str, settings: dict, depth: int) -> None:
+        conf = self.files.get(path)
+        if conf is None or not conf.exists:
+            _logger.debug(f"Config file {path} not found")
+            return
+        if depth > MAX_INCLUDE_DEPTH:
+            _logger.warning(f"Config file {path} nested too deep, skipping")
+            return
+        for name, value in conf.entries:
+            if name in ("include", "include_if_exists"):
+                included = self.files.get(value)
+                if name == "include" and (included is None or not included.exists):
+                    _logger.warning(f"Included config file {value} not found")
+                self._apply(value, settings, depth + 1)
+            elif name == "include_dir":
+                for included in self.dirs.get(value, []):
+                    self._apply(included, settings, depth + 1)
+            else:
+                settings[name] = value
+
+
+def inspect_replica(ssh: ServerConn, version: int, data_directory: str, config_file: str,
+                    timeout: float = PROBE_TIMEOUT) -> RemoteInfo:
+    inspect = RemoteInspect(ssh, timeout)
+    files = conf_files(version, data_directory, config_file)
+    inspect.run(files, free_space=data_directory, dir_size=posixpath.join(data_directory, "pg_wal"))
+    settings = inspect.settings(files)
+    app_name = conninfo_value(settings.get("primary_conninfo", ""), "application_name")
+    if not app_name:
+        app_name = settings.get("cluster_name") or DEFAULT_APP_NAME
+    return RemoteInfo(
+        app_name=app_name,
+        slot_name=settings.get("primary_slot_name"),
+        free_space=inspect.values.get("free_space"),
+        wal_size=inspect.values.get("dir_size"),
+    )
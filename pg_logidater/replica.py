@@ -1,45 +1,101 @@
 from logging import getLogger
 from pg_logidater.utils import SqlConn, ServerConn
-from os import path
+from pg_logidater.timing import timings, timed_phase
+from pg_logidater.cache import metadata_cache
+from pg_logidater.remote import inspect_replica
 from pg_logidater.exceptions import (
+    EarlyResumeNotPossible,
     ReplicaPaused,
-    VersionNotSupported
+    ResumeNotPossible
 )
+from pg_logidater import sqlqueries as sql
 
 _logger = getLogger(__name__)
 
-RECOVYRY_CONF_BY_VERSION = {
-    11: "recovery.conf",
-    12: "postgresql.auto.conf"
-}
-
 
+@timed_phase
 def pause_replica(psql: SqlConn) -> None:
     _logger.info("Pausing replica")
     if psql.is_replica_pause():
         raise ReplicaPaused
     psql.pause_replica()
+    timings.mark("replica_paused")
+
+
+@timed_phase
+def resume_replica(psql: SqlConn) -> None:
+    _logger.info("Rresuming replication")
+    psql.resume_replica()
+    timings.mark("replica_resumed")
+    pause_seconds = timings.pause_seconds()
+    if pause_seconds is not None:
+        _logger.info(f"Replica replay was paused for {pause_seconds:.3f}s")
+
+
+class ReplicaSnapshot():
+    """
+    Snapshot exported on paused replica, transaction is held open until
+    dump imported it, so replay can be resumed right after export
+    """
+    def __init__(self, host: str, user: str, database: str):
+        self.database = database
+        self.psql = SqlConn(host, db=database, user=user)
+        self.name = self.psql.export_snapshot()
+        _logger.info(f"Exported snapshot {self.name} for {database}")
+
+    def release(self) -> None:
+        _logger.debug(f"Releasing snapshot {self.name} for {self.database}")
+        self.psql.close()
+
 
+def early_resume_checks(psql: SqlConn, sync_mode: str, verify: str) -> None:
+    _logger.info("Checking if replica can be resumed before sync")
+    if sync_mode == "copy":
+        raise EarlyResumeNotPossible("Copy sync mode reads replica outside of pg_dump snapshot")
+    if verify != "none":
+        raise EarlyResumeNotPossible("Verify compares target with paused replica")
+    if psql.show_setting("hot_standby_feedback") != "on":
+        raise EarlyResumeNotPossible("hot_standby_feedback is off, replay would cancel dump")
+    if psql.show_setting("max_standby_streaming_delay") != "-1":
+        _logger.warning(
+            "max_standby_streaming_delay is not -1, dump can be cancelled by conflicting lock replay"
+        )
 
+
+@timed_phase
+def export_snapshots(host: str, user: str, databases: list[str]) -> dict:
+    return {database: ReplicaSnapshot(host, user, database) for database in databases}
+
+
+@timed_phase
+def resume_checks(master: SqlConn, replica: SqlConn, slot_name: str, app_name: str, position: str,
+                  replica_resumed: bool = False) -> None:
+    _logger.info("Checking if setup can be resumed")
+    if not replica_resumed:
+        if not replica.query(sql.SQL_IS_REPLICA_PASUSED, fetchone=True)[0]:
+            raise ResumeNotPossible("Replica is not paused anymore")
+        current_position = master.get_replay_lsn(app_name)
+        if current_position != position:
+            raise ResumeNotPossible(f"Replica position changed from {position} to {current_position}")
+    if master.get_replica_slot(slot_name) is None:
+        raise ResumeNotPossible(f"Replication slot {slot_name} doesn't exist")
+
+
+@timed_phase
 def replica_info(psql: SqlConn, ssh: ServerConn) -> (str, str):
     _logger.info("Collecting replica info")
-    pgdata = psql.get_datadirectory()
-    psql_version = int(psql.server_version())
-    if psql_version not in RECOVYRY_CONF_BY_VERSION.keys():
-        raise VersionNotSupported
-    recovey_conf = RECOVYRY_CONF_BY_VERSION[psql_version]
-    auto_conf_name = path.join(pgdata, recovey_conf)
-    cli = f"cat {auto_conf_name}"
-    _logger.debug(f"Executing: {cli}")
-    psql_auto_conf = ssh.run_cmd(cli)
-    for line in reversed(psql_auto_conf.splitlines()):
-        if "application_name" in line:
-            replica_app_name = line.split(" ")[-1].removeprefix("application_name=").strip("'")
-            _logger.debug(f"Got replica app name: {replica_app_name}")
-            break
-    for line in reversed(psql_auto_conf.splitlines()):
-        if "primary_slot_name" in line:
-            replica_slot_name = line.split(" ")[-1].strip("'")
-            _logger.debug(f"Got replica slot name: {replica_slot_name}")
-            break
-    return replica_app_name, replica_slot_name
+    app_name, slot_name = metadata_cache.get(psql, "replica_info", lambda: read_replica_conf(psql, ssh))
+    return app_name, slot_name
+
+
+def read_replica_conf(psql: SqlConn, ssh: ServerConn) -> (str, str):
+    info = inspect_replica(
+        ssh=ssh,
+        version=int(psql.server_version()),
+        data_directory=psql.get_datadirectory(),
+        config_file=psql.get_config_file()
+    )
+    _logger.debug(f"Got replica app name: {info.app_name}")
+    _logger.debug(f"Got replica slot name: {info.slot_name}")
+    _logger.debug(f"Replica free disk: {info.free_space}, pg_wal size: {info.wal_size}")
+    return info.app_name, info.slot_name
@@ -0,0 +1,105 @@
+from logging import getLogger
+from typing import NamedTuple
+from psycopg2 import Error
+from pg_logidater.utils import SqlConn
+
+ROLE_FLAGS = (
+    ("SUPERUSER", "NOSUPERUSER"),
+    ("INHERIT", "NOINHERIT"),
+    ("CREATEROLE", "NOCREATEROLE"),
+    ("CREATEDB", "NOCREATEDB"),
+    ("LOGIN", "NOLOGIN"),
+    ("REPLICATION", "NOREPLICATION"),
+    ("BYPASSRLS", "NOBYPASSRLS"),
+)
+LIST_SETTINGS = {
+    "search_path",
+    "temp_tablespaces",
+    "session_preload_libraries",
+    "local_preload_libraries",
+    "shared_preload_libraries",
+}
+
+_logger = getLogger(__name__)
+
+
+class Role(NamedTuple):
+    name: str
+    flags: tuple
+    connlimit: int
+    password: str
+    valid_until: str
+
+
+def read_roles(psql: SqlConn) -> (dict, dict, dict):
+    """
+    Roles, memberships and role settings, role names quoted, valid until
+    in UTC so it compares equal whatever session time zone is
+    """
+    roles = {row[0]: Role(row[0], tuple(row[1:8]), row[8], row[9], row[10]) for row in psql.get_roles()}
+    members = {(role, member): admin for role, member, admin in psql.get_role_memberships()}
+    settings = {}
+    for role, setting in psql.get_role_settings():
+        name, _, value = setting.partition("=")
+        settings[(role, name)] = value
+    return roles, members, settings
+
+
+def role_statement(command: str, role: Role) -> tuple:
+    flags = " ".join(on if value else off for (on, off), value in zip(ROLE_FLAGS, role.flags))
+    return (
+        f"{command} ROLE {role.name} WITH {flags} CONNECTION LIMIT {role.connlimit} PASSWORD %s VALID UNTIL %s",
+        (role.password, role.valid_until or "infinity")
+    )
+
+
+def setting_statement(role: str, name: str, value: str) -> tuple:
+    if name in LIST_SETTINGS:
+        return f"ALTER ROLE {role} SET {name} TO {value}", ()
+    return f"ALTER ROLE {role} SET {name} TO %s", (value,)
+
+
+def roles_diff(source: SqlConn, target: SqlConn) -> list[tuple]:
+    """
+    Statements creating missing and altering changed roles, grants and
+    role settings, each with role it belongs to, grants belong to member.
+    Roles existing only on target are left untouched.
+    """
+    source_roles, source_members, source_settings = read_roles(source)
+    target_roles, target_members, target_settings = read_roles(target)
+    statements = []
+    for name, role in source_roles.items():
+        if name not in target_roles:
+            _logger.debug(f"Role {name} missing on target")
+            statements.append((name,) + role_statement("CREATE", role))
+        elif role != target_roles[name]:
+            _logger.debug(f"Role {name} differs on target")
+            statements.append((name,) + role_statement("ALTER", role))
+    for (role, member), admin in source_members.items():
+        if (role, member) in target_members and (target_members[(role, member)] or not admin):
+            continue
+        admin_option = " WITH ADMIN OPTION" if admin else ""
+        statements.append((member, f"GRANT {role} TO {member}{admin_option}", ()))
+    for (role, name), value in source_settings.items():
+        if target_settings.get((role, name)) != value:
+            statements.append((role,) + setting_statement(role, name, value))
+    return statements
+
+
+def apply_roles(target: SqlConn, statements: list[tuple]) -> int:
+    """
+    Each statement in its own transaction, so one rejected statement,
+    like change of bootstrap superuser, doesn't undo other roles. Rest of
+    failed role statements are skipped. Returns failed role count.
+    """
+    failed = set()
+    for role, statement, params in statements:
+        if role in failed:
+            _logger.warning(f"Skipping {statement}, previous change of role {role} failed")
+            continue
+        try:
+            target.execute_transaction([(statement, params)])
+        except Error as err:
+            _logger.error(f"Role {role} change failed: {str(err).strip()}")
+            failed.add(role)
+    return len(failed)
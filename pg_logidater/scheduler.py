@@ -0,0 +1,125 @@
+from logging import getLogger
+from heapq import heapify, heapreplace
+from typing import NamedTuple
+from pg_logidater.utils import SqlConn
+
+SPLIT_METHODS = ["ctid", "pk"]
+# ctid ranges are read with TID range scan, older versions scan whole table per range
+TID_RANGE_SCAN_VERSION = 14
+
+_logger = getLogger(__name__)
+
+
+class CopyTask(NamedTuple):
+    table: str
+    size: int
+    where: str = None
+    columns: str = None
+
+    def __str__(self) -> str:
+        if self.where:
+            return f"{self.table} [{self.where}]"
+        return self.table
+
+
+def ctid_ranges(relpages: int, chunks: int) -> list[str]:
+    step = -(-relpages // chunks)
+    bounds = list(range(step, relpages, step))
+    ranges = []
+    lower = None
+    for upper in bounds + [None]:
+        conditions = []
+        if lower is not None:
+            conditions.append(f"ctid >= '({lower},0)'::tid")
+        if upper is not None:
+            conditions.append(f"ctid < '({upper},0)'::tid")
+        ranges.append(" AND ".join(conditions))
+        lower = upper
+    return ranges
+
+
+def pk_ranges(column: str, min_value: int, max_value: int, chunks: int) -> list[str]:
+    step = max(-(-(max_value - min_value + 1) // chunks), 1)
+    bounds = list(range(min_value + step, max_value + 1, step))
+    ranges = []
+    lower = None
+    for upper in bounds + [None]:
+        conditions = []
+        if lower is not None:
+            conditions.append(f"{column} >= {lower}")
+        if upper is not None:
+            conditions.append(f"{column} < {upper}")
+        ranges.append(" AND ".join(conditions))
+        lower = upper
+    return ranges
+
+
+def split_table(psql: SqlConn, table: str, size: int, relpages: int, pk_column: str,
+                split_size: int, method: str, tid_range_scan: bool = True) -> list[CopyTask]:
+    chunks = -(-size // split_size)
+    if method == "pk":
+        if not pk_column and not tid_range_scan:
+            return [CopyTask(table, size)]
+        if not pk_column:
+            _logger.warning(f"{table} has no single integer primary key, splitting by ctid")
+            method = "ctid"
+        else:
+            min_value, max_value = psql.get_pk_range(table, pk_column)
+            if min_value is None:
+                return [CopyTask(table, size)]
+            ranges = pk_ranges(pk_column, min_value, max_value, chunks)
+    if method == "ctid":
+        ranges = ctid_ranges(relpages, chunks)
+    ranges = [where for where in ranges if where]
+    if not ranges:
+        return [CopyTask(table, size)]
+    columns = psql.get_table_columns(table)
+    chunk_size = size // len(ranges)
+    tasks = [CopyTask(table, chunk_size, where, columns) for where in ranges]
+    _logger.debug(f"Split {table} into {len(tasks)} {method} ranges")
+    return tasks
+
+
+def assign_workers(tasks: list[CopyTask], jobs: int) -> list[int]:
+    """
+    Longest processing time first, returns bytes planned per worker
+    """
+    loads = [(0, worker) for worker in range(max(jobs, 1))]
+    heapify(loads)
+    for task in tasks:
+        load, worker = loads[0]
+        _logger.debug(f"Worker {worker}: {task} ({task.size} bytes)")
+        heapreplace(loads, (load + task.size, worker))
+    return [load for load, _ in sorted(loads, key=lambda item: item[1])]
+
+
+def plan_copy(psql: SqlConn, jobs: int, split_size: int = 0, split_method: str = "ctid",
+              exclude: list[str] = None) -> list[CopyTask]:
+    _logger.info("Planning table copy schedule")
+    excluded = set(exclude or [])
+    tid_range_scan = int(psql.server_version()) >= TID_RANGE_SCAN_VERSION
+    if split_size and split_method == "ctid" and not tid_range_scan:
+        _logger.warning(f"ctid split needs version {TID_RANGE_SCAN_VERSION} or newer, tables are not split")
+        split_size = 0
+    tasks = []
+    for table, size, relpages, pk_column in psql.get_table_sizes():
+        if table in excluded:
+            continue
+        if split_size and size > split_size and relpages > 1:
+            tasks.extend(split_table(psql, table, size, relpages, pk_column, split_size, split_method,
+                                     tid_range_scan))
+        else:
+            tasks.append(CopyTask(table, size))
+    tasks.sort(key=lambda task: task.size, reverse=True)
+    loads = assign_workers(tasks, jobs)
+    total = sum(task.size for task in tasks)
+    critical_path = max(loads) if loads else 0
+    ideal = total / max(jobs, 1)
+    _logger.info(f"Planned {len(tasks)} copy tasks, {total / 1024 / 1024:.1f} MB across {jobs} workers")
+    if tasks:
+        _logger.info(f"Largest task: {tasks[0]} {tasks[0].size / 1024 / 1024:.1f} MB")
+    _logger.info(
+        f"Critical path: {critical_path / 1024 / 1024:.1f} MB "
+        f"(ideal {ideal / 1024 / 1024:.1f} MB, efficiency {ideal / critical_path * 100 if critical_path else 100:.0f}%)"
+    )
+    return tasks
@@ -1,4 +1,15 @@
+SQL_PING = "SELECT 1"
+SQL_RESET_ALL = "RESET ALL"
+SQL_SET_TEXT_OUTPUT = """
+    SET TimeZone TO 'UTC';
+    SET DateStyle TO 'ISO, MDY';
+    SET IntervalStyle TO 'postgres';
+    SET extra_float_digits TO 3;
+    SET bytea_output TO 'hex'
+"""
 SQL_WAL_LEVEL = "SHOW wal_level"
+SQL_SHOW_SETTING = "SHOW {setting}"
+SQL_EXPORT_SNAPSHOT = "SELECT pg_export_snapshot()"
 SQL_IS_REPLICA_PASUSED = "SELECT pg_is_wal_replay_paused()"
 SQL_PAUSE_REPLICA = "SELECT pg_wal_replay_pause()"
 SQL_RESUME_REPLICA = "SELECT pg_wal_replay_resume()"
@@ -14,18 +25,28 @@ SQL_GET_DB_SUBSCRIPTION = "SELECT subname FROM pg_subscription"
 SQL_CREATE_REPL_LOGICAL_SLOT = "SELECT pg_create_logical_replication_slot('{0}', 'pgoutput')"
 SQL_DROP_REPL_SLOT = "SELECT pg_drop_replication_slot('{0}')"
 SQL_CREAATE_PUB = "CREATE publication {0} for all tables"
+SQL_CREATE_PUB_EMPTY = "CREATE publication {0}"
+SQL_PUB_ADD_TABLES = "ALTER publication {0} ADD TABLE {1}"
 SQL_DROP_PUB = "DROP publication {0}"
 SQL_DATA_DIRECTORY = "SHOW data_directory"
+SQL_CONFIG_FILE = "SHOW config_file"
 SQL_DB_SIZE = "SELECT pg_database_size('{db}')"
 SQL_ANALYZE = "ANALYZE VERBOSE"
+SQL_ANALYZE_TABLE = "ANALYZE {table}"
+SQL_SET_STATISTICS_TARGET = "SET default_statistics_target TO {0}"
+SQL_RESET_STATISTICS_TARGET = "RESET default_statistics_target"
 
-SQL_SELECT_ALL_SEQUENCES = """
+SQL_SELECT_DATABASES = """
 SELECT
-  sequence_schema,
-  sequence_name
+  datname
 FROM
-  information_schema.sequences
-"""
+  pg_catalog.pg_database
+WHERE
+  datallowconn
+  AND NOT datistemplate
+  AND datname <> 'postgres'
+ORDER BY
+  datname"""
 
 SQL_CREATE_SUBSCRIPTION = """
 CREATE SUBSCRIPTION {name} connection 'host={master} port=5432 dbname={db} user=repmgr'
@@ -96,20 +117,431 @@ WHERE
   'pg_' || sub.oid = ro.roname AND
   sub.subname = '{name}'"""
 
-SQL_NO_PRIMARY_KEYS = """
+SQL_TABLE_REPLICATION_INFO = """
+SELECT
+  format('%I.%I', n.nspname, c.relname) AS table_name,
+  c.relkind = 'p' AS partitioned,
+  c.relpersistence = 'u' AS unlogged,
+  c.relreplident AS replica_identity,
+  coalesce(i.has_pkey, false) AS has_pkey,
+  coalesce(i.has_identity_index, false) AS has_identity_index
+FROM
+  pg_catalog.pg_class c
+  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+  LEFT JOIN (
+    SELECT
+      indrelid,
+      bool_or(indisprimary) AS has_pkey,
+      bool_or(indisreplident) AS has_identity_index
+    FROM
+      pg_catalog.pg_index
+    GROUP BY
+      indrelid
+  ) i ON i.indrelid = c.oid
+WHERE
+  c.relkind IN ('r', 'p')
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+  AND n.nspname NOT LIKE 'pg_temp%'
+  AND (
+    c.relkind = 'p'
+    OR c.relpersistence = 'u'
+    OR c.relreplident IN ('n', 'f')
+    OR (c.relreplident = 'd' AND i.has_pkey IS NOT true)
+    OR (c.relreplident = 'i' AND i.has_identity_index IS NOT true)
+  )
+ORDER BY
+  1"""
+
+SQL_COPY_TO_STDOUT = "COPY {table} TO STDOUT"
+SQL_COPY_FROM_STDIN = "COPY {table} FROM STDIN"
+SQL_SYNC_COMMIT_OFF = "SET synchronous_commit TO off"
+SQL_SYNC_COMMIT_OFF_LOCAL = "SET LOCAL synchronous_commit TO off"
+SQL_TRUNCATE_TABLES = "TRUNCATE ONLY {tables}"
+
+SQL_SELECT_TABLES = """
+SELECT
+  format('%I.%I', n.nspname, c.relname) AS table_name
+FROM
+  pg_catalog.pg_class c
+  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE
+  c.relkind = 'r'
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+  AND n.nspname NOT LIKE 'pg_temp%'
+  AND NOT EXISTS (
+    SELECT
+      1
+    FROM
+      pg_catalog.pg_depend d
+    WHERE
+      d.classid = 'pg_catalog.pg_class'::regclass
+      AND d.objid = c.oid
+      AND d.deptype = 'e'
+  )
+ORDER BY
+  1"""
+
+SQL_SELECT_FOREIGN_KEY_REFERENCES = """
+SELECT
+  format('%I.%I', n.nspname, t.relname) AS table_name,
+  format('%I', con.conname) AS constraint_name,
+  format('%I.%I', rn.nspname, rt.relname) AS referenced_table
+FROM
+  pg_catalog.pg_constraint con
+  JOIN pg_catalog.pg_class t ON t.oid = con.conrelid
+  JOIN pg_catalog.pg_namespace n ON n.oid = t.relnamespace
+  JOIN pg_catalog.pg_class rt ON rt.oid = con.confrelid
+  JOIN pg_catalog.pg_namespace rn ON rn.oid = rt.relnamespace
+WHERE
+  con.contype = 'f'
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')"""
+
+SQL_SELECT_TABLE_NAMES = """
+SELECT
+  n.nspname,
+  c.relname,
+  format('%I.%I', n.nspname, c.relname) AS table_name
+FROM
+  pg_catalog.pg_class c
+  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE
+  c.relkind = 'r'
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+  AND n.nspname NOT LIKE 'pg_temp%'
+  AND NOT EXISTS (
+    SELECT
+      1
+    FROM
+      pg_catalog.pg_depend d
+    WHERE
+      d.classid = 'pg_catalog.pg_class'::regclass
+      AND d.objid = c.oid
+      AND d.deptype = 'e'
+  )
+ORDER BY
+  3"""
+
+SQL_SELECT_SEQUENCE_VALUES = """
+SELECT
+  format('%I.%I', schemaname, sequencename) AS sequence_name,
+  coalesce(last_value, start_value) AS last_value,
+  last_value IS NOT NULL AS is_called
+FROM
+  pg_catalog.pg_sequences"""
+
+SQL_SET_SEQUENCE_VALUES = """
 SELECT
-  t.table_schema,
-  t.table_name
+  pg_catalog.setval(s.name::regclass, s.value, s.is_called)
+FROM
+  unnest(%s::text[], %s::bigint[], %s::boolean[]) AS s(name, value, is_called)"""
+
+SQL_COPY_QUERY_TO_STDOUT = "COPY (SELECT {columns} FROM {table} WHERE {where}) TO STDOUT"
+SQL_COPY_COLUMNS_FROM_STDIN = "COPY {table} ({columns}) FROM STDIN"
+SQL_PK_RANGE = "SELECT min({column}), max({column}) FROM {table}"
+
+SQL_TABLE_SIZES = """
+SELECT
+  format('%I.%I', n.nspname, c.relname) AS table_name,
+  pg_catalog.pg_table_size(c.oid) AS table_size,
+  c.relpages,
+  (
+    SELECT
+      quote_ident(a.attname)
+    FROM
+      pg_catalog.pg_index i
+      JOIN pg_catalog.pg_attribute a ON (
+        a.attrelid = i.indrelid
+        AND a.attnum = i.indkey[0]
+      )
+    WHERE
+      i.indrelid = c.oid
+      AND i.indisprimary
+      AND i.indnatts = 1
+      AND a.atttypid IN ('int2'::regtype, 'int4'::regtype, 'int8'::regtype)
+  ) AS pk_column
 FROM
-  information_schema.tables AS t
-  LEFT JOIN information_schema.table_constraints AS tc ON (
-    t.table_schema = t.table_schema
-    AND t.table_name = tc.table_name
-    AND tc.constraint_type = 'PRIMARY KEY'
+  pg_catalog.pg_class c
+  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE
+  c.relkind = 'r'
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+  AND n.nspname NOT LIKE 'pg_temp%'
+  AND NOT EXISTS (
+    SELECT
+      1
+    FROM
+      pg_catalog.pg_depend d
+    WHERE
+      d.classid = 'pg_catalog.pg_class'::regclass
+      AND d.objid = c.oid
+      AND d.deptype = 'e'
   )
+ORDER BY
+  2 DESC"""
+
+SQL_PARTITIONED_TABLES = """
+SELECT
+  format('%I.%I', n.nspname, c.relname) AS table_name
+FROM
+  pg_catalog.pg_class c
+  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
 WHERE
-  t.table_type = 'BASE TABLE'
-  AND t.table_schema NOT IN ('pg_catalog', 'information_schema')
-  AND tc.constraint_name IS NULL
+  c.relkind = 'p'
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+  AND n.nspname NOT LIKE 'pg_temp%'
 ORDER BY
-  t.table_schema"""
+  1"""
+
+SQL_TABLE_COLUMNS = """
+SELECT
+  string_agg(quote_ident(column_name), ', ' ORDER BY ordinal_position)
+FROM
+  information_schema.columns
+WHERE
+  format('%I.%I', table_schema, table_name) = '{table}'
+  AND is_generated = 'NEVER'"""
+
+SQL_SET_MAINTENANCE_WORK_MEM = "SET maintenance_work_mem TO '{0}'"
+SQL_SET_MAX_PARALLEL_MAINTENANCE_WORKERS = "SET max_parallel_maintenance_workers TO {0}"
+
+SQL_SELECT_INDEX_DEFS = """
+SELECT
+  format('%I.%I', n.nspname, t.relname) AS table_name,
+  format('%I', ic.relname) AS index_name,
+  pg_catalog.pg_get_indexdef(i.indexrelid) AS index_def,
+  i.indisreplident,
+  i.indisclustered,
+  pg_catalog.pg_table_size(t.oid) AS table_size
+FROM
+  pg_catalog.pg_index i
+  JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+  JOIN pg_catalog.pg_class t ON t.oid = i.indrelid
+  JOIN pg_catalog.pg_namespace n ON n.oid = t.relnamespace
+WHERE
+  t.relkind IN ('r', 'p', 'm')
+  AND NOT ic.relispartition
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+  AND n.nspname NOT LIKE 'pg_temp%'
+  AND NOT EXISTS (
+    SELECT
+      1
+    FROM
+      pg_catalog.pg_constraint con
+    WHERE
+      con.conindid = i.indexrelid
+      AND con.contype IN ('p', 'u', 'x')
+  )
+  AND NOT EXISTS (
+    SELECT
+      1
+    FROM
+      pg_catalog.pg_depend d
+    WHERE
+      d.classid = 'pg_catalog.pg_class'::regclass
+      AND d.objid = t.oid
+      AND d.deptype = 'e'
+  )"""
+
+SQL_SELECT_CONSTRAINT_DEFS = """
+SELECT
+  format('%I.%I', n.nspname, t.relname) AS table_name,
+  format('%I', con.conname) AS constraint_name,
+  con.contype,
+  pg_catalog.pg_get_constraintdef(con.oid) AS constraint_def,
+  con.convalidated,
+  coalesce(i.indisreplident, FALSE),
+  coalesce(i.indisclustered, FALSE),
+  format('%I', ic.relname) AS index_name,
+  pg_catalog.pg_table_size(t.oid) AS table_size,
+  t.relkind = 'p' AS partitioned
+FROM
+  pg_catalog.pg_constraint con
+  JOIN pg_catalog.pg_class t ON t.oid = con.conrelid
+  JOIN pg_catalog.pg_namespace n ON n.oid = t.relnamespace
+  LEFT JOIN pg_catalog.pg_index i ON (
+    i.indexrelid = con.conindid
+    AND con.contype IN ('p', 'u', 'x')
+  )
+  LEFT JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+WHERE
+  con.contype IN ('p', 'u', 'x', 'f')
+  AND con.conparentid = 0
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+  AND n.nspname NOT LIKE 'pg_temp%'
+  AND NOT EXISTS (
+    SELECT
+      1
+    FROM
+      pg_catalog.pg_depend d
+    WHERE
+      d.classid = 'pg_catalog.pg_class'::regclass
+      AND d.objid = t.oid
+      AND d.deptype = 'e'
+  )"""
+
+SQL_PROGRESS_COPY = """
+SELECT
+  relid::regclass::text AS table_name,
+  bytes_processed,
+  tuples_processed
+FROM
+  pg_catalog.pg_stat_progress_copy
+WHERE
+  datname = '{db}'
+  AND command = 'COPY FROM'"""
+
+SQL_PROGRESS_CREATE_INDEX = """
+SELECT
+  index_relid::regclass::text AS index_name,
+  phase,
+  CASE
+    WHEN blocks_total > 0 THEN round(100.0 * blocks_done / blocks_total)
+    ELSE NULL
+  END AS blocks_percent
+FROM
+  pg_catalog.pg_stat_progress_create_index
+WHERE
+  datname = '{db}'"""
+
+SQL_SLOT_POSITIONS = """
+SELECT
+  pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')::bigint AS current_lsn,
+  pg_wal_lsn_diff(confirmed_flush_lsn, '0/0')::bigint AS confirmed_lsn,
+  active
+FROM
+  pg_catalog.pg_replication_slots
+WHERE
+  slot_name = '{0}'"""
+
+SQL_REPLAY_BACKLOG = """
+SELECT
+  CASE WHEN pg_is_wal_replay_paused() THEN NULL
+  ELSE pg_wal_lsn_diff(pg_last_wal_receive_lsn(), pg_last_wal_replay_lsn())::bigint
+  END"""
+
+SQL_REPLICATION_LAG = """
+SELECT
+  state,
+  extract(epoch FROM replay_lag)::float AS replay_lag
+FROM
+  pg_catalog.pg_stat_replication
+WHERE
+  application_name = '{0}'"""
+
+SQL_SUBSCRIPTION_STATS = """
+SELECT
+  pid,
+  pg_wal_lsn_diff(received_lsn, '0/0')::bigint AS received_lsn,
+  extract(epoch FROM now() - last_msg_receipt_time)::float AS last_msg_age
+FROM
+  pg_catalog.pg_stat_subscription
+WHERE
+  subname = '{0}'
+  AND relid IS NULL"""
+
+SQL_SLOT_RETAINED_WAL = """
+SELECT
+  pg_wal_lsn_diff(pg_current_wal_lsn(), restart_lsn)::bigint
+FROM
+  pg_catalog.pg_replication_slots
+WHERE
+  slot_name = '{0}'"""
+
+SQL_TABLE_SIZE_BREAKDOWN = """
+SELECT
+  format('%I.%I', n.nspname, c.relname) AS table_name,
+  pg_catalog.pg_relation_size(c.oid) AS heap_bytes,
+  pg_catalog.pg_table_size(c.oid) - pg_catalog.pg_relation_size(c.oid) AS toast_bytes,
+  pg_catalog.pg_indexes_size(c.oid) AS index_bytes,
+  c.reltuples::bigint AS row_estimate
+FROM
+  pg_catalog.pg_class c
+  JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE
+  c.relkind = 'r'
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg_toast%'
+  AND n.nspname NOT LIKE 'pg_temp%'
+ORDER BY
+  pg_catalog.pg_total_relation_size(c.oid) DESC"""
+
+SQL_COPY_SAMPLE_TO_STDOUT = "COPY (SELECT * FROM {table} LIMIT {rows}) TO STDOUT"
+SQL_CREATE_WRITE_TEST = "CREATE TABLE pg_logidater_write_test (line text)"
+SQL_DROP_WRITE_TEST = "DROP TABLE IF EXISTS pg_logidater_write_test"
+SQL_COPY_WRITE_TEST = "COPY pg_logidater_write_test FROM STDIN"
+
+SQL_VERIFY_COUNT = "SELECT count(*), NULL FROM {table} t WHERE {where}"
+# order independent digest, row md5 halves summed as exact numeric, no row order or text size limit
+SQL_VERIFY_HASH = """
+SELECT
+  count(*),
+  sum(('x' || substr(h, 1, 16))::bit(64)::bigint::numeric),
+  sum(('x' || substr(h, 17, 16))::bit(64)::bigint::numeric)
+FROM
+  (SELECT md5(t::text) AS h FROM {table} t WHERE {where}) r"""
+
+SQL_SELECT_ROLES = """
+SELECT
+  format('%I', rolname) AS role,
+  rolsuper,
+  rolinherit,
+  rolcreaterole,
+  rolcreatedb,
+  rolcanlogin,
+  rolreplication,
+  rolbypassrls,
+  rolconnlimit,
+  rolpassword,
+  CASE
+    WHEN isfinite(rolvaliduntil) THEN to_char(rolvaliduntil AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS.US') || '+00'
+    ELSE rolvaliduntil::text
+  END AS rolvaliduntil
+FROM
+  pg_catalog.pg_authid
+WHERE
+  rolname !~ '^pg_'
+ORDER BY
+  rolname"""
+
+SQL_SELECT_ROLE_MEMBERSHIPS = """
+SELECT
+  format('%I', r.rolname) AS role,
+  format('%I', m.rolname) AS member,
+  am.admin_option
+FROM
+  pg_catalog.pg_auth_members am
+  JOIN pg_catalog.pg_authid r ON r.oid = am.roleid
+  JOIN pg_catalog.pg_authid m ON m.oid = am.member
+WHERE
+  m.rolname !~ '^pg_'"""
+
+SQL_SELECT_ROLE_SETTINGS = """
+SELECT
+  format('%I', r.rolname) AS role,
+  unnest(s.setconfig) AS setting
+FROM
+  pg_catalog.pg_db_role_setting s
+  JOIN pg_catalog.pg_authid r ON r.oid = s.setrole
+WHERE
+  s.setdatabase = 0"""
+
+SQL_CACHE_SIGNATURE = """
+SELECT
+  (SELECT system_identifier FROM pg_catalog.pg_control_system())::text,
+  (SELECT timeline_id FROM pg_catalog.pg_control_checkpoint()),
+  pg_catalog.pg_postmaster_start_time()::text,
+  pg_catalog.pg_conf_load_time()::text,
+  (SELECT count(*) FROM pg_catalog.pg_class),
+  (SELECT max(xmin::text::bigint) FROM pg_catalog.pg_class),
+  (SELECT count(*) FROM pg_catalog.pg_constraint),
+  (SELECT max(xmin::text::bigint) FROM pg_catalog.pg_constraint),
+  (SELECT count(*) FROM pg_catalog.pg_index),
+  (SELECT max(xmin::text::bigint) FROM pg_catalog.pg_index),
+  (SELECT max(xmin::text::bigint) FROM pg_catalog.pg_database)"""
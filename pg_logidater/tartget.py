@@ -1,51 +1,177 @@
 from logging import getLogger
-from pg_logidater.utils import SqlConn
+from pg_logidater.utils import SqlConn, ServerConn, sql_pool
 from subprocess import Popen, PIPE
-from os import path
-from shutil import disk_usage
+from os import path, stat
+import re
+from shutil import disk_usage, rmtree
 from pg_logidater.exceptions import (
     DatabaseExists,
-    DiskSpaceTooLow
+    DiskSpaceTooLow,
+    SyncFailed
 )
-from threading import Event
+from threading import Event, Thread, Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pycotore import ProgressBar
+from pg_logidater.copier import copy_tables
+from pg_logidater.scheduler import CopyTask
+from pg_logidater.indexer import build_indexes
+from pg_logidater.progress import SyncProgress, format_duration
+from pg_logidater.timing import timings, timed_phase
+from pg_logidater.checkpoint import Checkpoint, NullCheckpoint
+from pg_logidater.roles import apply_roles, roles_diff
+from pg_logidater.budget import io_budget
+from time import monotonic
+from shlex import quote
 
 PG_DUMP_DB = "/usr/bin/pg_dump --no-publications --no-subscriptions -h {host} -U {user} {db}"
-PG_DUMP_SEQ = "/usr/bin/pg_dump --no-publications --no-subscriptions -h {host} -d {db} -U {user} -t {seq_name}"
-PG_DUMP_ROLES = "/usr/bin/pg_dumpall --roles-only -h {host} -U repmgr"
-PSQL_SQL_RESTORE = "/usr/bin/psql -f {file} -d {db}"
+PG_DUMP_DIR = "/usr/bin/pg_dump --no-publications --no-subscriptions -Fd -j {jobs} -h {host} -U {user} -f {dump_dir} {db}"
+PG_DUMP_SECTION = "/usr/bin/pg_dump --no-publications --no-subscriptions --section={section} -h {host} -U {user} {db}"
+PG_DUMP_POST_DATA_ARCHIVE = "/usr/bin/pg_dump --no-publications --no-subscriptions --section=post-data -Fc -h {host} -U {user} -f {file} {db}"
 PSQL_SQL_PIPE_RESTORE = "/usr/bin/psql -d {db}"
+PG_DUMP_REMOTE = "pg_dump --no-publications --no-subscriptions -U {user}{options} {db} | {compress}"
+REMOTE_PIPEFAIL = "bash -o pipefail -c {command}"
+PG_RESTORE_DIR = "/usr/bin/pg_restore -j {jobs} -d {db} {dump_dir}"
+PG_RESTORE_LIST = "/usr/bin/pg_restore -l {file}"
+PG_RESTORE_USE_LIST = "/usr/bin/pg_restore -L {toc} -d {db} {file}"
+# post-data entries built by indexer.build_indexes
+TOC_INDEX_ENTRY = re.compile(r"^\d+; \d+ \d+ (INDEX|INDEX ATTACH|CONSTRAINT|FK CONSTRAINT) ")
+SYNC_MODES = ["plain", "parallel", "copy", "ssh"]
+SSH_COMPRESSION = {
+    "zstd": ("zstd -{level} -c", "/usr/bin/zstd -d -c"),
+    "lz4": ("lz4 -{level} -c", "/usr/bin/lz4 -d -c"),
+}
+SSH_STREAM_CHUNK = 1048576
 
 
 _logger = getLogger(__name__)
+_running = set()
+_running_lock = Lock()
 
 
-def target_check(psql: SqlConn, database: str, name: str, db_size: int) -> None:
+@timed_phase
+def target_check(psql: SqlConn, database: str, name: str, db_size: int = None) -> int:
+    """
+    Returns usable disk space, compared with db_size when it is known
+    """
     _logger.info("Executing target checks")
     _logger.debug("Checking available disk space")
     data_path = psql.get_datadirectory()
     available_disk = int(disk_usage(path=data_path).free * 0.9)
-    if available_disk < db_size:
-        raise DiskSpaceTooLow(f"Low disk space for {data_path}")
+    if db_size is not None:
+        check_disk_space(available_disk, db_size)
     _logger.debug("Checking if database not exists")
     if psql.check_database(database):
         raise DatabaseExists
+    return available_disk
+
+
+def check_disk_space(available_disk: int, db_size: int) -> None:
+    if available_disk < db_size:
+        raise DiskSpaceTooLow(f"Low disk space, available: {available_disk}, required: {db_size}")
+
 
+def check_dump_space(tmp_dir: str, db_size: int, data_path: str = None) -> None:
+    """
+    Parallel mode dump directory takes up to database size, checked before
+    replica is paused. Dump sharing filesystem with target data needs room
+    for both.
+    """
+    available_disk = int(disk_usage(path=tmp_dir).free * 0.9)
+    required = db_size
+    if data_path is not None and stat(tmp_dir).st_dev == stat(data_path).st_dev:
+        required += db_size
+    if available_disk < required:
+        raise DiskSpaceTooLow(
+            f"Low disk space for dump in {tmp_dir}, available: {available_disk}, required: {required}"
+        )
+
+
+def run_local_cli(cli, std_log, err_log, cli2: str = None, pipe: bool = False, options: list[str] = None) -> int:
+    """
+    Options are passed as separate arguments after split cli, so they
+    may contain spaces and quotes
+    """
+    started = monotonic()
+    cli = cli.split() + (options or [])
+    returncode = run_local_cli_logged(cli, std_log, err_log, cli2, pipe)
+    command = " ".join(cli)
+    timings.record_command(f"{command} | {cli2}" if pipe else command, monotonic() - started, returncode)
+    return returncode
 
-def run_local_cli(cli, std_log, err_log, cli2: str = None, pipe: bool = False) -> None:
+
+def run_local_cli_logged(cli: list[str], std_log, err_log, cli2: str = None, pipe: bool = False) -> int:
     with open(std_log, "w") as log:
         with open(err_log, "w") as err:
             if pipe:
                 if not cli2:
                     _logger.critical("cli2 parameter mandaroty for pipe true")
                     exit(1)
-                _logger.debug(f"Running: {cli} | {cli2}")
-                pipe_output = Popen(cli.split(), stdout=PIPE)
-                pipe_sync = Popen(cli2.split(), stdin=pipe_output.stdout, stdout=log, stderr=err)
-                pipe_sync.communicate()
+                _logger.debug(f"Running: {' '.join(cli)} | {cli2}")
+                pipe_output = track_process(Popen(cli, stdout=PIPE))
+                pump = None
+                if io_budget.active:
+                    pipe_sync = track_process(Popen(cli2.split(), stdin=PIPE, stdout=log, stderr=err))
+                    pump = Thread(target=pump_budget, args=(pipe_output.stdout, pipe_sync.stdin))
+                    pump.start()
+                else:
+                    pipe_sync = track_process(Popen(cli2.split(), stdin=pipe_output.stdout, stdout=log, stderr=err))
+                try:
+                    if pump is not None:
+                        pump.join()
+                        pipe_sync.wait()
+                    else:
+                        pipe_sync.communicate()
+                    return pipe_output.wait() or pipe_sync.returncode
+                finally:
+                    untrack_process(pipe_output, pipe_sync)
             else:
-                _logger.debug(f"Executing: {cli}")
-                Popen(cli.split(), stdout=log, stderr=err).communicate()
+                _logger.debug(f"Executing: {' '.join(cli)}")
+                run = track_process(Popen(cli, stdout=log, stderr=err))
+                try:
+                    run.communicate()
+                    return run.returncode
+                finally:
+                    untrack_process(run)
+
+
+def pump_budget(source, sink) -> None:
+    """
+    Dump stream copied into restore in-process, so it can be charged to
+    I/O budget, used instead of direct pipe while budget is active
+    """
+    try:
+        for chunk in iter(lambda: source.read1(SSH_STREAM_CHUNK), b""):
+            io_budget.consume_stream(len(chunk))
+            sink.write(chunk)
+    except BrokenPipeError:
+        _logger.error("Restore closed input stream")
+    finally:
+        try:
+            sink.close()
+        except BrokenPipeError:
+            pass
+
+
+def track_process(process: Popen) -> Popen:
+    with _running_lock:
+        _running.add(process)
+    return process
+
+
+def untrack_process(*processes: Popen) -> None:
+    with _running_lock:
+        _running.difference_update(processes)
+
+
+def terminate_commands() -> None:
+    """
+    Stops running dump and restore commands when sync is aborted
+    """
+    with _running_lock:
+        processes = list(_running)
+    for process in processes:
+        _logger.warning(f"Terminating {' '.join(process.args)}")
+        process.terminate()
 
 
 def get_replica_position(psql: SqlConn, app_name: str) -> str:
@@ -53,77 +179,458 @@ def get_replica_position(psql: SqlConn, app_name: str) -> str:
     return psql.get_replay_lsn(app_name)
 
 
-def sync_roles(host: str, tmp_path: str, log_dir: str) -> None:
+@timed_phase
+def sync_roles(source: SqlConn, target: SqlConn) -> None:
     _logger.info("Syncing roles")
-    roles_dump_path = path.join(tmp_path, "roles.sql")
-    roles_dump_err_log = path.join(log_dir, "roles_dump.err")
-    _logger.debug(f"Dumping roles to {roles_dump_path}")
-    run_local_cli(
-        PG_DUMP_ROLES.format(host=host),
-        roles_dump_path,
-        roles_dump_err_log
-    )
-    roles_restore_log = path.join(log_dir, "roles_restore.log")
-    roles_restore_err_log = path.join(tmp_path, "roles_restore.err")
-    _logger.debug(f"Restoring roles from {roles_dump_path}")
-    run_local_cli(
-        PSQL_SQL_RESTORE.format(file=roles_dump_path, db='postgres'),
-        roles_restore_log,
-        roles_restore_err_log
-    )
+    statements = roles_diff(source, target)
+    if not statements:
+        _logger.info("Roles are in sync")
+        return
+    failed = apply_roles(target, statements)
+    if failed:
+        _logger.warning(f"Applied role changes, {failed} roles not synced, check errors above")
+        return
+    _logger.info(f"Applied {len(statements)} role changes")
 
 
-def sync_database(host: str, user: str, database: str, tmp_dir: str, log_dir: str, event: Event) -> None:
-    _logger.info(f"Syncing database {database}")
+@timed_phase
+def sync_database(host: str, user: str, database: str, tmp_dir: str, log_dir: str, event: Event,
+                  mode: str = "plain", jobs: int = 1, buffer_size: int = 1048576, buffers: int = 8,
+                  plan: list[CopyTask] = None, index_jobs: int = 1, work_mem: str = "1GB",
+                  parallel_workers: int = 2, progress: SyncProgress = None, checkpoint: Checkpoint = None,
+                  exclude_tables: list[str] = None, ssh_user: str = None, compression: str = "zstd",
+                  compression_level: int = 3, throttle: Event = None, abort: Event = None,
+                  snapshot: str = None) -> None:
+    _logger.info(f"Syncing database {database}, mode: {mode}")
+    if progress is None:
+        progress = SyncProgress(database=database)
+    if checkpoint is None:
+        checkpoint = NullCheckpoint(database)
+    event.set()
+    if mode == "parallel":
+        sync_database_parallel(host, user, database, tmp_dir, log_dir, jobs, progress, checkpoint, exclude_tables,
+                               snapshot)
+    elif mode == "copy":
+        sync_database_copy(
+            host=host,
+            user=user,
+            database=database,
+            tmp_dir=tmp_dir,
+            log_dir=log_dir,
+            jobs=jobs,
+            buffer_size=buffer_size,
+            buffers=buffers,
+            plan=plan,
+            index_jobs=index_jobs,
+            work_mem=work_mem,
+            parallel_workers=parallel_workers,
+            progress=progress,
+            checkpoint=checkpoint,
+            exclude_tables=exclude_tables,
+            throttle=throttle,
+            abort=abort
+        )
+    elif mode == "ssh":
+        sync_database_ssh(host, ssh_user, user, database, log_dir, compression, compression_level, progress,
+                          exclude_tables, snapshot)
+    else:
+        sync_database_plain(host, user, database, log_dir, progress, exclude_tables, snapshot)
+    check_aborted(abort, database)
+    checkpoint.phase_done("sync_database")
+    progress.set_phase("done")
+    event.set()
+
+
+def check_aborted(abort: Event, database: str) -> None:
+    if abort is not None and abort.is_set():
+        raise SyncFailed(f"Sync of {database} aborted")
+
+
+def exclude_table_data(tables: list[str]) -> list[str]:
+    return [f"--exclude-table-data={table}" for table in tables or []]
+
+
+def snapshot_option(snapshot: str) -> list[str]:
+    return [f"--snapshot={snapshot}"] if snapshot else []
+
+
+def sync_database_plain(host: str, user: str, database: str, log_dir: str, progress: SyncProgress,
+                        exclude_tables: list[str] = None, snapshot: str = None) -> None:
+    progress.set_phase("sync")
     sync_log = path.join(log_dir, f"sync_{database}.log")
     sync_err_log = path.join(log_dir, f"sync_{database}.err")
-    event.set()
-    run_local_cli(
+    sync_rc = run_local_cli(
         cli=PG_DUMP_DB.format(db=database, host=host, user=user),
         cli2=PSQL_SQL_PIPE_RESTORE.format(db=database),
         std_log=sync_log,
         err_log=sync_err_log,
+        pipe=True,
+        options=exclude_table_data(exclude_tables) + snapshot_option(snapshot)
+    )
+    if sync_rc != 0:
+        raise SyncFailed(f"Sync of {database} failed with exit code {sync_rc}, check {sync_err_log}")
+
+
+def sync_database_ssh(host: str, ssh_user: str, user: str, database: str, log_dir: str, compression: str,
+                      level: int, progress: SyncProgress, exclude_tables: list[str] = None,
+                      snapshot: str = None) -> None:
+    """
+    pg_dump runs on replica host, compressed stream comes over ssh channel
+    and is decompressed on the fly into psql restore
+    """
+    progress.set_phase("sync")
+    compress, decompress = SSH_COMPRESSION[compression]
+    options = exclude_table_data(exclude_tables) + snapshot_option(snapshot)
+    remote_cli = REMOTE_PIPEFAIL.format(command=quote(PG_DUMP_REMOTE.format(
+        user=user,
+        options="".join(f" {quote(option)}" for option in options),
+        db=database,
+        compress=compress.format(level=level)
+    )))
+    restore_cli = PSQL_SQL_PIPE_RESTORE.format(db=database)
+    sync_log = path.join(log_dir, f"sync_{database}.log")
+    sync_err_log = path.join(log_dir, f"sync_{database}.err")
+    raw_bytes = 0
+    wire_bytes = 0
+    stopped = Event()
+    started = monotonic()
+
+    def feed_restore(unpacked, restore_in, stop) -> None:
+        nonlocal raw_bytes
+        try:
+            for chunk in iter(lambda: unpacked.read1(SSH_STREAM_CHUNK), b""):
+                io_budget.write.consume(len(chunk))
+                restore_in.write(chunk)
+                raw_bytes += len(chunk)
+                progress.add_bytes(database, len(chunk))
+        except BrokenPipeError:
+            _logger.error("psql restore closed input stream")
+            stop()
+            unpacked.close()
+        finally:
+            try:
+                restore_in.close()
+            except BrokenPipeError:
+                pass
+
+    with ServerConn(host, ssh_user) as ssh, open(sync_log, "w") as log, open(sync_err_log, "w") as err:
+        _logger.debug(f"Running on {host}: {remote_cli} | {decompress} | {restore_cli}")
+        _, remote_out, remote_err = ssh.exec_command(remote_cli, bufsize=SSH_STREAM_CHUNK)
+        channel = remote_out.channel
+
+        def stop_stream() -> None:
+            """
+            Restore side failed, closing channel unblocks remote pg_dump
+            and sets exit status, so nothing waits on a stalled pipe
+            """
+            stopped.set()
+            channel.close()
+
+        unpack = track_process(Popen(decompress.split(), stdin=PIPE, stdout=PIPE, stderr=err))
+        restore = track_process(Popen(restore_cli.split(), stdin=PIPE, stdout=log, stderr=err))
+        feeder = Thread(target=feed_restore, args=(unpack.stdout, restore.stdin, stop_stream))
+        feeder.start()
+        try:
+            for chunk in iter(lambda: channel.recv(SSH_STREAM_CHUNK), b""):
+                if stopped.is_set():
+                    break
+                io_budget.read.consume(len(chunk))
+                unpack.stdin.write(chunk)
+                wire_bytes += len(chunk)
+        except BrokenPipeError:
+            _logger.error(f"{decompress} closed input stream")
+            stop_stream()
+        finally:
+            try:
+                unpack.stdin.close()
+            except BrokenPipeError:
+                pass
+        feeder.join()
+        unpack_code = unpack.wait()
+        restore_code = restore.wait()
+        untrack_process(unpack, restore)
+        remote_code = channel.recv_exit_status()
+        err.write(remote_err.read().decode())
+    elapsed = monotonic() - started
+    timings.record_command(f"ssh {host} {remote_cli} | {decompress} | {restore_cli}", elapsed,
+                           remote_code or unpack_code or restore_code)
+    if remote_code or unpack_code or restore_code or stopped.is_set():
+        raise SyncFailed(f"Database {database} stream failed, remote: {remote_code}, "
+                         f"{compression}: {unpack_code}, psql: {restore_code}, check {sync_err_log}")
+    ratio = raw_bytes / wire_bytes if wire_bytes else 0
+    _logger.info(
+        f"Streamed {wire_bytes / 1024 / 1024:.1f} MB {compression} for {raw_bytes / 1024 / 1024:.1f} MB dump, "
+        f"ratio {ratio:.2f}, wire {wire_bytes / 1024 / 1024 / elapsed:.1f} MB/s, "
+        f"effective {raw_bytes / 1024 / 1024 / elapsed:.1f} MB/s"
+    )
+    timings.set_counter("stream_wire_bytes", wire_bytes)
+    timings.set_counter("stream_raw_bytes", raw_bytes)
+    timings.set_counter("stream_compression_ratio", round(ratio, 2))
+    progress.emit(wire_bytes=wire_bytes, compression_ratio=round(ratio, 2))
+
+
+def sync_database_parallel(host: str, user: str, database: str, tmp_dir: str, log_dir: str, jobs: int,
+                           progress: SyncProgress, checkpoint: Checkpoint, exclude_tables: list[str] = None,
+                           snapshot: str = None) -> None:
+    """
+    Directory format dump with parallel workers, pg_dump workers share
+    leader's exported snapshot, pg_restore loads data in parallel and
+    builds indexes and constraints after data is loaded
+    """
+    dump_dir = path.join(tmp_dir, f"dump_{database}")
+    dump_jobs, restore_jobs = io_budget.workers(jobs, jobs)
+    if checkpoint.is_phase_done("dump") and path.exists(dump_dir):
+        _logger.info(f"Reusing dump {dump_dir}")
+    else:
+        dump_database_dir(host, user, database, dump_dir, log_dir, dump_jobs, progress, exclude_tables, snapshot)
+        checkpoint.phase_done("dump")
+    _logger.info(f"Restoring {database} with {restore_jobs} jobs")
+    progress.set_phase("restore")
+    restore_rc = run_local_cli(
+        cli=PG_RESTORE_DIR.format(db=database, jobs=restore_jobs, dump_dir=dump_dir),
+        std_log=path.join(log_dir, f"restore_{database}.log"),
+        err_log=path.join(log_dir, f"restore_{database}.err")
+    )
+    if restore_rc != 0:
+        raise SyncFailed(
+            f"pg_restore of {database} failed with exit code {restore_rc}, check restore_{database}.err"
+        )
+    _logger.debug(f"Removing dump dir {dump_dir}")
+    rmtree(dump_dir)
+
+
+def dump_database_dir(host: str, user: str, database: str, dump_dir: str, log_dir: str, jobs: int,
+                      progress: SyncProgress, exclude_tables: list[str] = None, snapshot: str = None) -> None:
+    if path.exists(dump_dir):
+        _logger.debug(f"Removing old dump dir {dump_dir}")
+        rmtree(dump_dir)
+    _logger.info(f"Dumping {database} with {jobs} jobs to {dump_dir}")
+    progress.set_phase("dump")
+    dump_rc = run_local_cli(
+        cli=PG_DUMP_DIR.format(db=database, host=host, user=user, jobs=jobs, dump_dir=dump_dir),
+        std_log=path.join(log_dir, f"dump_{database}.log"),
+        err_log=path.join(log_dir, f"dump_{database}.err"),
+        options=exclude_table_data(exclude_tables) + snapshot_option(snapshot)
+    )
+    if dump_rc != 0:
+        raise SyncFailed(f"pg_dump of {database} failed with exit code {dump_rc}")
+
+
+def sync_schema_section(host: str, user: str, database: str, log_dir: str, section: str) -> None:
+    _logger.info(f"Syncing {section} schema for {database}")
+    err_log = path.join(log_dir, f"sync_{database}_{section}.err")
+    sync_rc = run_local_cli(
+        cli=PG_DUMP_SECTION.format(section=section, db=database, host=host, user=user),
+        cli2=PSQL_SQL_PIPE_RESTORE.format(db=database),
+        std_log=path.join(log_dir, f"sync_{database}_{section}.log"),
+        err_log=err_log,
         pipe=True
     )
-    event.set()
+    if sync_rc != 0:
+        raise SyncFailed(f"Sync of {database} {section} schema failed with exit code {sync_rc}, check {err_log}")
+
+
+def reconcile_plan(plan: list[CopyTask], tables: list[str]) -> list[CopyTask]:
+    """
+    Plan is built from master catalog, copy only tables visible on replica
+    and append replica tables missing from the plan
+    """
+    if plan is None:
+        return [CopyTask(table, 0) for table in tables]
+    existing = set(tables)
+    planned = set()
+    reconciled = []
+    for task in plan:
+        planned.add(task.table)
+        if task.table in existing:
+            reconciled.append(task)
+        else:
+            _logger.warning(f"Table {task.table} not found on replica, skipping")
+    reconciled.extend(CopyTask(table, 0) for table in tables if table not in planned)
+    return reconciled
+
+
+def sync_post_data_rest(host: str, user: str, database: str, tmp_dir: str, log_dir: str) -> None:
+    """
+    Restore post-data section without indexes and constraints, those are
+    built by indexer.build_indexes
+    """
+    _logger.info(f"Syncing remaining post-data schema for {database}")
+    archive = path.join(tmp_dir, f"post_data_{database}.dump")
+    toc = path.join(tmp_dir, f"post_data_{database}.toc")
+    dump_err_log = path.join(log_dir, f"dump_{database}_post-data.err")
+    dump_rc = run_local_cli(
+        cli=PG_DUMP_POST_DATA_ARCHIVE.format(host=host, user=user, db=database, file=archive),
+        std_log=path.join(log_dir, f"dump_{database}_post-data.log"),
+        err_log=dump_err_log
+    )
+    if dump_rc != 0:
+        raise SyncFailed(f"pg_dump of {database} post-data failed with exit code {dump_rc}, check {dump_err_log}")
+    list_err_log = path.join(log_dir, f"restore_{database}_post-data_list.err")
+    list_rc = run_local_cli(
+        cli=PG_RESTORE_LIST.format(file=archive),
+        std_log=toc,
+        err_log=list_err_log
+    )
+    if list_rc != 0:
+        raise SyncFailed(f"pg_restore -l of {database} post-data failed with exit code {list_rc}, "
+                         f"check {list_err_log}")
+    with open(toc, "r") as toc_file:
+        entries = toc_file.readlines()
+    with open(toc, "w") as toc_file:
+        toc_file.writelines(entry for entry in entries if not TOC_INDEX_ENTRY.match(entry))
+    restore_err_log = path.join(log_dir, f"restore_{database}_post-data.err")
+    restore_rc = run_local_cli(
+        cli=PG_RESTORE_USE_LIST.format(toc=toc, db=database, file=archive),
+        std_log=path.join(log_dir, f"restore_{database}_post-data.log"),
+        err_log=restore_err_log
+    )
+    if restore_rc != 0:
+        raise SyncFailed(f"pg_restore of {database} post-data failed with exit code {restore_rc}, "
+                         f"check {restore_err_log}")
+
+
+def sync_database_copy(host: str, user: str, database: str, tmp_dir: str, log_dir: str, jobs: int,
+                       buffer_size: int, buffers: int, plan: list[CopyTask] = None, index_jobs: int = 1,
+                       work_mem: str = "1GB", parallel_workers: int = 2, progress: SyncProgress = None,
+                       checkpoint: Checkpoint = None, exclude_tables: list[str] = None, throttle: Event = None,
+                       abort: Event = None) -> None:
+    """
+    Schema from pg_dump pre-data section, table data streamed in-process
+    with COPY through bounded buffers, indexes and constraints built by
+    parallel workers, rest of post-data section restored at the end
+    """
+    if not checkpoint.is_phase_done("pre-data"):
+        progress.set_phase("pre-data")
+        sync_schema_section(host, user, database, log_dir, "pre-data")
+        checkpoint.phase_done("pre-data")
+    with sql_pool.connection(host, db=database, user=user) as src:
+        sync_database_copy_data(src, host, user, database, jobs, buffer_size, buffers, plan, index_jobs,
+                                work_mem, parallel_workers, progress, checkpoint, exclude_tables, throttle, abort)
+    check_aborted(abort, database)
+    if not checkpoint.is_phase_done("post-data"):
+        progress.set_phase("post-data")
+        sync_post_data_rest(host, user, database, tmp_dir, log_dir)
+        checkpoint.phase_done("post-data")
+
+
+def skip_copied_tables(tables: list[CopyTask], database: str, checkpoint: Checkpoint) -> list[CopyTask]:
+    """
+    On resume copy only tables not finished before, partially copied ones
+    are truncated first
+    """
+    if not checkpoint.resumed:
+        return tables
+    pending = [task for task in tables if task.table not in checkpoint.tables]
+    incomplete = sorted({task.table for task in pending})
+    _logger.info(f"Skipping {len(checkpoint.tables)} copied tables, truncating {len(incomplete)} incomplete")
+    with sql_pool.connection("/tmp", user="postgres", db=database) as target:
+        target.truncate_tables(incomplete)
+    return pending
+
+
+def sync_database_copy_data(src: SqlConn, host: str, user: str, database: str, jobs: int, buffer_size: int,
+                            buffers: int, plan: list[CopyTask], index_jobs: int, work_mem: str,
+                            parallel_workers: int, progress: SyncProgress, checkpoint: Checkpoint,
+                            exclude_tables: list[str] = None, throttle: Event = None, abort: Event = None) -> None:
+    if not checkpoint.is_phase_done("copy"):
+        excluded = set(exclude_tables or [])
+        source_tables = [table for table in src.get_tables() if table not in excluded]
+        tables = skip_copied_tables(reconcile_plan(plan, source_tables), database, checkpoint)
+        progress.set_phase("copy")
+        copy_tables(
+            host=host,
+            user=user,
+            database=database,
+            tables=tables,
+            jobs=jobs,
+            buffer_size=buffer_size,
+            buffers=buffers,
+            progress=progress,
+            checkpoint=checkpoint,
+            throttle=throttle,
+            abort=abort
+        )
+        checkpoint.phase_done("copy")
+    with sql_pool.connection("/tmp", user="postgres", db=database) as target:
+        sync_seq_values(src, target, progress=progress)
+    if not checkpoint.is_phase_done("indexes"):
+        progress.set_phase("indexes")
+        build_indexes(
+            psql=src,
+            database=database,
+            jobs=index_jobs,
+            work_mem=work_mem,
+            parallel_workers=parallel_workers,
+            checkpoint=checkpoint
+        )
+        checkpoint.phase_done("indexes")
+
 
+def progress_suffix(db: str, progress: SyncProgress, indexes: list[tuple]) -> str:
+    suffix = f"{db} {progress.rate() / 1024 / 1024:.1f} MB/s ETA {format_duration(progress.eta())}"
+    if indexes:
+        builds = ", ".join(f"{index} {phase} {percent or 0:.0f}%" for index, phase, percent in indexes)
+        return f"{suffix} building: {builds}"
+    tables = progress.current_tables()
+    if tables:
+        return f"{suffix} copying: {', '.join(tables[:3])}{' ...' if len(tables) > 3 else ''}"
+    return suffix
 
-def db_sync_progress_bar(psql: SqlConn, total: float, event: Event, db: str, update_interval: float) -> None:
+
+def db_sync_progress_bar(psql: SqlConn, progress: SyncProgress, event: Event, db: str, update_interval: float,
+                         poll_copy: bool = True) -> None:
+    """
+    Progress comes from copy pipeline counters or from target
+    pg_stat_progress_copy and pg_stat_progress_create_index views
+    """
     _logger.debug("Startign progress bar function")
     bar = ProgressBar()
     suffix = f"{db} sync in progress"
     bar.suffix = suffix
-    bar.total = total
+    bar.total = progress.total
+    server_version = psql.sql_conn.server_version
+    if poll_copy and server_version < 140000:
+        _logger.debug("pg_stat_progress_copy not available, falling back to database size")
     event.wait(timeout=10)
     _logger.debug("Continue progrss function")
     event.clear()
     while True:
         if event.is_set():
             break
-        synced_size = psql.get_db_size(db)
-        bar.progress = synced_size
+        if poll_copy and server_version >= 140000:
+            progress.update_from_copy_stats(psql.get_copy_progress(db))
+        elif poll_copy:
+            progress.set_bytes(psql.get_db_size(db))
+        indexes = psql.get_create_index_progress(db) if server_version >= 120000 else []
+        bar.progress = min(progress.bytes, progress.total)
+        bar.suffix = progress_suffix(db, progress, indexes)
         bar.draw()
+        progress.emit(indexes=[index for index, _, _ in indexes])
         event.wait(update_interval)
-    bar.update_progress = total
+    bar.progress = progress.total
     bar.draw()
+    _logger.info(f"{db} sync finished: {progress.summary()}")
 
 
+@timed_phase
 def create_subscriber(sub_target: str, database: str, slot_name: str, repl_position: str) -> None:
-    psql = SqlConn("/tmp", user="postgres", db=database)
     _logger.info(f"Creating subsriber to {sub_target}")
-    sub_id = psql.create_subscriber(
-        name=slot_name,
-        host=sub_target,
-        database=database,
-        repl_slot=slot_name
-    )
-    psql.enable_subscription(
-        sub_name=slot_name,
-        sub_id=sub_id,
-        pos=repl_position
-    )
+    with sql_pool.connection("/tmp", user="postgres", db=database) as psql:
+        sub_id = psql.create_subscriber(
+            name=slot_name,
+            host=sub_target,
+            database=database,
+            repl_slot=slot_name
+        )
+        psql.enable_subscription(
+            sub_name=slot_name,
+            sub_id=sub_id,
+            pos=repl_position
+        )
 
 
+@timed_phase
 def create_database(psql: SqlConn, database: str, owner: str) -> None:
     _logger.info(f"Creating database {database}")
     psql.create_database(
@@ -132,27 +639,67 @@ def create_database(psql: SqlConn, database: str, owner: str) -> None:
     )
 
 
-def sync_seq_pipe(psql: SqlConn, log_dir: str) -> None:
-    dsn = psql.sql_conn.get_dsn_parameters()
-    database = dsn["dbname"]
-    host = dsn["host"]
-    user = dsn["user"]
+def sync_seq_values(psql: SqlConn, target: SqlConn, dry_run: bool = False, progress: SyncProgress = None) -> None:
+    """
+    Reads all sequence values with one catalog query and applies changed
+    ones on target in one transaction with batched setval
+    """
+    database = psql.sql_conn.get_dsn_parameters()["dbname"]
     _logger.info(f"Syncing sequences for {database}")
-    sequences = psql.get_sequences()
-    for seq in sequences:
-        file_seq_name = f"{seq[0]}.{seq[1]}"
-        sql_seq_name = f"{seq[0]}.\"{seq[1]}\""
-        sync_seq_log = path.join(log_dir, f"sync_seq_{file_seq_name}.log")
-        sync_seq_err_log = path.join(log_dir, f"sync_seq_{file_seq_name}.err")
-        run_local_cli(
-            cli=PG_DUMP_SEQ.format(host=host, db=database, user=user, seq_name=sql_seq_name),
-            cli2=PSQL_SQL_PIPE_RESTORE.format(db=database),
-            std_log=sync_seq_log,
-            err_log=sync_seq_err_log,
-            pipe=True
-        )
+    if progress is None:
+        progress = SyncProgress(database=database)
+    progress.set_phase("sequences")
+    source = psql.get_sequence_values()
+    current = {name: (value, is_called) for name, value, is_called in target.get_sequence_values()}
+    changed = []
+    for name, value, is_called in source:
+        if name not in current:
+            _logger.warning(f"Sequence {name} doesn't exist on target")
+            continue
+        if current[name] != (value, is_called):
+            changed.append((name, value, is_called))
+            if dry_run:
+                print(f"{name}: {current[name][0]} -> {value}")
+    _logger.info(f"{len(changed)} of {len(source)} sequences differ")
+    if dry_run or not changed:
+        progress.emit(sequences=len(source), changed=len(changed), applied=0)
+        return
+    target.set_sequence_values(changed)
+    _logger.info(f"Updated {len(changed)} sequences")
+    progress.emit(sequences=len(source), changed=len(changed), applied=len(changed))
+
+
+def analyse_table(database: str, table: str, statistics_target: int = None) -> float:
+    with sql_pool.connection("/tmp", user="postgres", db=database) as psql:
+        if statistics_target:
+            psql.set_statistics_target(statistics_target)
+        started = monotonic()
+        try:
+            psql.analyze(table)
+        finally:
+            if statistics_target:
+                psql.set_statistics_target()
+        return monotonic() - started
 
 
-def analyse_target(psql: SqlConn) -> None:
-    _logger.info("Updating database statistics")
-    psql.analyze()
+@timed_phase
+def analyse_target(database: str, jobs: int = 4, statistics_target: int = None) -> None:
+    """
+    Per table ANALYZE by worker pool, largest tables first, partitioned
+    parents last as autovacuum never analyzes them. Runs after
+    subscription is enabled, so concurrently with catch-up.
+    """
+    with sql_pool.connection("/tmp", user="postgres", db=database) as psql:
+        tables = [table for table, _, _, _ in psql.get_table_sizes()] + psql.get_partitioned_tables()
+    _logger.info(f"Updating {database} statistics, {len(tables)} tables with {jobs} workers")
+    started = monotonic()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(jobs, 1), thread_name_prefix="analyze") as executor:
+        futures = {executor.submit(analyse_table, database, table, statistics_target): table for table in tables}
+        for future in as_completed(futures):
+            try:
+                _logger.info(f"Analyzed {futures[future]} in {future.result():.1f}s")
+            except Exception as err:
+                _logger.warning(f"ANALYZE {futures[future]} failed: {err}")
+                failed += 1
+    _logger.info(f"{database} statistics updated in {format_duration(monotonic() - started)}, failed: {failed}")
@@ -0,0 +1,123 @@
+import json
+from functools import wraps
+from heapq import heappush, heappushpop
+from itertools import count
+from logging import getLogger
+from threading import Lock
+from time import monotonic
+from contextlib import contextmanager
+
+SLOWEST_QUERIES = 10
+QUERY_TEXT_LIMIT = 200
+
+_logger = getLogger(__name__)
+
+
+class Timings():
+    """
+    Wall time of workflow phases, sql queries and cli commands
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._order = count()
+        self.started = monotonic()
+        self.phases = []
+        self.queries = []
+        self.query_count = 0
+        self.query_time = 0.0
+        self.commands = []
+        self.marks = {}
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = monotonic()
+        _logger.debug(f"Phase {name} started")
+        try:
+            yield
+        finally:
+            elapsed = monotonic() - started
+            with self._lock:
+                self.phases.append((name, elapsed))
+            _logger.debug(f"Phase {name} finished in {elapsed:.2f}s")
+
+    def record_query(self, host: str, query: str, elapsed: float) -> None:
+        item = (elapsed, next(self._order), host, " ".join(query.split())[:QUERY_TEXT_LIMIT])
+        with self._lock:
+            self.query_count += 1
+            self.query_time += elapsed
+            if len(self.queries) < SLOWEST_QUERIES:
+                heappush(self.queries, item)
+            else:
+                heappushpop(self.queries, item)
+
+    def record_command(self, command: str, elapsed: float, returncode: int) -> None:
+        with self._lock:
+            self.commands.append((command, elapsed, returncode))
+
+    def mark(self, name: str) -> None:
+        with self._lock:
+            self.marks[name] = monotonic()
+
+    def set_counter(self, name: str, value) -> None:
+        with self._lock:
+            self.counters[name] = value
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "wall_time": round(monotonic() - self.started, 3),
+                "phases": [{"phase": name, "seconds": round(elapsed, 3)} for name, elapsed in self.phases],
+                "queries": {
+                    "count": self.query_count,
+                    "seconds": round(self.query_time, 3),
+                    "slowest": [
+                        {"seconds": round(elapsed, 3), "host": host, "query": query}
+                        for elapsed, _, host, query in sorted(self.queries, reverse=True)
+                    ]
+                },
+                "commands": [
+                    {"command": command, "seconds": round(elapsed, 3), "returncode": returncode}
+                    for command, elapsed, returncode in self.commands
+                ],
+                "replica_pause_seconds": self._pause_seconds(),
+                "counters": dict(self.counters),
+            }
+
+    def pause_seconds(self) -> float:
+        with self._lock:
+            return self._pause_seconds()
+
+    def _pause_seconds(self) -> float:
+        if "replica_paused" not in self.marks:
+            return None
+        return round(self.marks.get("replica_resumed", monotonic()) - self.marks["replica_paused"], 3)
+
+    def log_report(self) -> None:
+        report = self.report()
+        _logger.info(f"Run time: {report['wall_time']:.1f}s")
+        for item in report["phases"]:
+            _logger.info(f"  {item['phase']:<20} {item['seconds']:>10.1f}s")
+        if report["replica_pause_seconds"] is not None:
+            _logger.info(f"Replica paused for: {report['replica_pause_seconds']:.1f}s")
+        for name, value in report["counters"].items():
+            _logger.info(f"{name}: {value}")
+        _logger.info(f"Queries: {report['queries']['count']} in {report['queries']['seconds']:.1f}s")
+        for item in report["queries"]["slowest"]:
+            _logger.info(f"  {item['seconds']:>8.2f}s {item['host']}: {item['query']}")
+
+    def save(self, report_path: str) -> None:
+        _logger.info(f"Saving performance report to {report_path}")
+        with open(report_path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+
+
+timings = Timings()
+
+
+def timed_phase(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with timings.phase(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
@@ -3,11 +3,18 @@ from sys import stdout
 import paramiko
 import psycopg2
 import psycopg2.extras
+import psycopg2.extensions
 from pg_logidater import sqlqueries as sql
 from os import makedirs, path
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+from pg_logidater.timing import timings
+from pg_logidater.cache import cached
 
 LOG_FORMAT_CON = "[%(module)-8s:%(funcName)-20s| %(levelname)-8s] %(message)-40s"
 LOG_FORMAT_FH = "[%(asctime)s - %(module)s:%(funcName)s|%(levelname)s] %(message)-40s"
+POOL_HEALTH_CHECK_INTERVAL = 30
 
 
 _logger = logging.getLogger(__name__)
@@ -35,33 +42,75 @@ class ServerConn(paramiko.SSHClient):
             _logger.error(f"Command {command} not found")
         return out.read().decode()
 
+    def free_space(self, directory: str) -> int:
+        return int(self.run_cmd(f"df -B1 --output=avail {directory} | tail -1").strip())
+
 
 class SqlConn():
-    def __init__(self, host, db="repmgr", user="repmgr", port="5432"):
+    def __init__(self, host, db="repmgr", user="repmgr", port="5432", connect_timeout=None):
+        self.key = (host, port, db, user)
         self.sql_conn = psycopg2.connect(
             host=host,
             port=port,
             user=user,
-            database=db
+            database=db,
+            connect_timeout=connect_timeout
         )
         self.cursor = self.sql_conn.cursor()
         if host.startswith("/tmp"):
             host = "localhost"
+        self.host = host
         _logger.debug(f"PSQL Connection to {host} with database {db} - established")
 
     def __del__(self) -> None:
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self) -> None:
         try:
             self.cursor.close()
             self.sql_conn.close()
-        except AttributeError:
+        except (AttributeError, psycopg2.InterfaceError):
             pass
 
+    def is_healthy(self, ping: bool = False) -> bool:
+        if self.sql_conn.closed:
+            return False
+        if not ping:
+            return True
+        try:
+            self.cursor.execute(sql.SQL_PING)
+            self.sql_conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def reset_session(self) -> None:
+        self.cursor.execute(sql.SQL_RESET_ALL)
+        self.sql_conn.commit()
+
+    def set_text_output(self) -> None:
+        """
+        Fixed text representation of values, so row text compares equal
+        between servers with different defaults
+        """
+        self.cursor.execute(sql.SQL_SET_TEXT_OUTPUT)
+        self.sql_conn.commit()
+
     def query(self, query, fetchone=False, fetchall=False) -> tuple:
         _logger.debug(f"Executing: {query}")
+        started = monotonic()
         try:
             self.cursor.execute(query)
         except psycopg2.errors.DuplicateObject as e:
             _logger.warning(f"Dublicate object {str(e).strip()}")
+        finally:
+            timings.record_query(self.host, query, monotonic() - started)
         self.sql_conn.commit()
         if fetchone:
             query_results = self.cursor.fetchone()
@@ -84,9 +133,14 @@ class SqlConn():
             _logger.warning(f"Replication slot {slot_name} - doesn't exists")
             self.sql_conn.rollback()
 
-    def create_publication(self, pub_name):
+    def create_publication(self, pub_name, tables: list[str] = None, batch_size: int = 1000):
         try:
-            self.query(sql.SQL_CREAATE_PUB.format(pub_name))
+            if tables is None:
+                self.query(sql.SQL_CREAATE_PUB.format(pub_name))
+                return
+            self.query(sql.SQL_CREATE_PUB_EMPTY.format(pub_name))
+            for start in range(0, len(tables), batch_size):
+                self.query(sql.SQL_PUB_ADD_TABLES.format(pub_name, ", ".join(tables[start:start + batch_size])))
         except psycopg2.errors.DuplicateObject:
             _logger.warning(f"Publication {pub_name} - already exists")
 
@@ -147,9 +201,14 @@ class SqlConn():
         self.query(sql.SQL_CREATE_DATABASE.format(db=database, owner=owner))
         self.sql_conn.autocommit = False
 
+    def get_databases(self) -> list[str]:
+        return [row[0] for row in self.query(sql.SQL_SELECT_DATABASES, fetchall=True)]
+
+    @cached
     def get_database_owner(self, database) -> str:
         return self.query(sql.SQL_SELECT_DB_OWNER.format(database), fetchone=True)[0]
 
+    @cached
     def server_version(self) -> float:
         return float(self.query(sql.SQL_SHOW_VERSION, fetchone=True)[0])
 
@@ -178,9 +237,26 @@ class SqlConn():
             return sub_name[0]
         return False
 
+    @cached
     def get_wal_level(self) -> str:
         return self.query(sql.SQL_WAL_LEVEL, fetchone=True)[0]
 
+    def show_setting(self, setting: str) -> str:
+        return self.query(sql.SQL_SHOW_SETTING.format(setting=setting), fetchone=True)[0]
+
+    def export_snapshot(self) -> str:
+        """
+        Snapshot stays valid while this connection keeps transaction open
+        """
+        _logger.debug(f"Executing: {sql.SQL_EXPORT_SNAPSHOT}")
+        self.sql_conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        started = monotonic()
+        try:
+            self.cursor.execute(sql.SQL_EXPORT_SNAPSHOT)
+        finally:
+            timings.record_query(self.host, sql.SQL_EXPORT_SNAPSHOT, monotonic() - started)
+        return self.cursor.fetchone()[0]
+
     def get_replica_slot(self, name) -> str:
         slot = self.query(sql.SQL_CHECK_REPLICA_SLOT.format(name), fetchone=True)
         if isinstance(slot, tuple):
@@ -191,21 +267,220 @@ class SqlConn():
             return True
         return False
 
-    def get_sequences(self) -> list[tuple]:
-        return self.query(sql.SQL_SELECT_ALL_SEQUENCES, fetchall=True)
+    @cached
+    def get_tables(self) -> list[str]:
+        return [row[0] for row in self.query(sql.SQL_SELECT_TABLES, fetchall=True)]
+
+    def get_table_sizes(self) -> list[tuple]:
+        return self.query(sql.SQL_TABLE_SIZES, fetchall=True)
+
+    def get_partitioned_tables(self) -> list[str]:
+        return [row[0] for row in self.query(sql.SQL_PARTITIONED_TABLES, fetchall=True)]
+
+    def get_table_columns(self, table) -> str:
+        return self.query(sql.SQL_TABLE_COLUMNS.format(table=table.replace("'", "''")), fetchone=True)[0]
+
+    def get_pk_range(self, table, column) -> tuple:
+        return self.query(sql.SQL_PK_RANGE.format(table=table, column=column), fetchone=True)
+
+    def get_index_defs(self) -> list[tuple]:
+        return self.query(sql.SQL_SELECT_INDEX_DEFS, fetchall=True)
+
+    def get_constraint_defs(self) -> list[tuple]:
+        return self.query(sql.SQL_SELECT_CONSTRAINT_DEFS, fetchall=True)
+
+    def set_maintenance_settings(self, work_mem: str, parallel_workers: int) -> None:
+        self.query(sql.SQL_SET_MAINTENANCE_WORK_MEM.format(work_mem))
+        self.query(sql.SQL_SET_MAX_PARALLEL_MAINTENANCE_WORKERS.format(parallel_workers))
+
+    @cached
+    def get_foreign_key_references(self) -> list[tuple]:
+        return self.query(sql.SQL_SELECT_FOREIGN_KEY_REFERENCES, fetchall=True)
+
+    @cached
+    def get_table_names(self) -> list[tuple]:
+        return self.query(sql.SQL_SELECT_TABLE_NAMES, fetchall=True)
+
+    def truncate_tables(self, tables: list[str], batch_size: int = 500) -> None:
+        for start in range(0, len(tables), batch_size):
+            self.query(sql.SQL_TRUNCATE_TABLES.format(tables=", ".join(tables[start:start + batch_size])))
+
+    def get_sequence_values(self) -> list[tuple]:
+        return self.query(sql.SQL_SELECT_SEQUENCE_VALUES, fetchall=True)
+
+    def set_sequence_values(self, values: list[tuple], batch_size: int = 1000) -> None:
+        try:
+            for start in range(0, len(values), batch_size):
+                names, last_values, is_called = zip(*values[start:start + batch_size])
+                self.cursor.execute(sql.SQL_SET_SEQUENCE_VALUES, (list(names), list(last_values), list(is_called)))
+        except psycopg2.Error:
+            self.sql_conn.rollback()
+            raise
+        self.sql_conn.commit()
+
+    def get_roles(self) -> list[tuple]:
+        return self.query(sql.SQL_SELECT_ROLES, fetchall=True)
+
+    def get_role_memberships(self) -> list[tuple]:
+        return self.query(sql.SQL_SELECT_ROLE_MEMBERSHIPS, fetchall=True)
+
+    def get_role_settings(self) -> list[tuple]:
+        return self.query(sql.SQL_SELECT_ROLE_SETTINGS, fetchall=True)
+
+    def execute_transaction(self, statements: list[tuple]) -> None:
+        """
+        Statements with parameters applied in one transaction, parameters
+        are not logged
+        """
+        try:
+            for statement, params in statements:
+                _logger.debug(f"Executing: {statement}")
+                self.cursor.execute(statement, params)
+        except psycopg2.Error:
+            self.sql_conn.rollback()
+            raise
+        self.sql_conn.commit()
 
+    @cached
     def get_datadirectory(self) -> float:
         return (self.query(sql.SQL_DATA_DIRECTORY, fetchone=True))[0]
 
+    @cached
+    def get_config_file(self) -> str:
+        return (self.query(sql.SQL_CONFIG_FILE, fetchone=True))[0]
+
     def get_db_size(self, db) -> int:
         return (self.query(sql.SQL_DB_SIZE.format(db=db), fetchone=True))[0]
 
-    def get_no_primary_key(self) -> list[tuple]:
-        return self.query(sql.SQL_NO_PRIMARY_KEYS, fetchall=True)
+    def get_copy_progress(self, db) -> list[tuple]:
+        return self.query(sql.SQL_PROGRESS_COPY.format(db=db), fetchall=True)
+
+    def get_create_index_progress(self, db) -> list[tuple]:
+        return self.query(sql.SQL_PROGRESS_CREATE_INDEX.format(db=db), fetchall=True)
+
+    def get_cache_signature(self) -> tuple:
+        return self.query(sql.SQL_CACHE_SIGNATURE, fetchone=True)
+
+    def get_slot_retained_wal(self, slot_name: str) -> int:
+        retained = self.query(sql.SQL_SLOT_RETAINED_WAL.format(slot_name), fetchone=True)
+        return retained[0] if retained else None
+
+    def get_slot_positions(self, slot_name: str) -> tuple:
+        return self.query(sql.SQL_SLOT_POSITIONS.format(slot_name), fetchone=True)
+
+    def get_replication_lag(self, app_name: str) -> tuple:
+        return self.query(sql.SQL_REPLICATION_LAG.format(app_name), fetchone=True)
+
+    def get_replay_backlog(self) -> int:
+        return self.query(sql.SQL_REPLAY_BACKLOG, fetchone=True)[0]
+
+    def get_subscription_stats(self, sub_name: str) -> tuple:
+        return self.query(sql.SQL_SUBSCRIPTION_STATS.format(sub_name), fetchone=True)
 
-    def analyze(self) -> None:
+    def get_chunk_checksum(self, table: str, where: str, checksum: bool = False) -> tuple:
+        if checksum:
+            return self.query(sql.SQL_VERIFY_HASH.format(table=table, where=where), fetchone=True)
+        return self.query(sql.SQL_VERIFY_COUNT.format(table=table, where=where), fetchone=True)
+
+    def get_table_size_breakdown(self) -> list[tuple]:
+        return self.query(sql.SQL_TABLE_SIZE_BREAKDOWN, fetchall=True)
+
+    @cached
+    def get_table_replication_info(self) -> list[tuple]:
+        return self.query(sql.SQL_TABLE_REPLICATION_INFO, fetchall=True)
+
+    def analyze(self, table: str = None) -> None:
+        if table:
+            self.query(sql.SQL_ANALYZE_TABLE.format(table=table))
+            return
         self.query(sql.SQL_ANALYZE)
 
+    def set_statistics_target(self, statistics_target: int = None) -> None:
+        if statistics_target:
+            self.query(sql.SQL_SET_STATISTICS_TARGET.format(statistics_target))
+        else:
+            self.query(sql.SQL_RESET_STATISTICS_TARGET)
+
+
+class SqlConnPool():
+    """
+    SqlConn connections reused by host, port, database and user. Session
+    settings are reset when connection is released.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._idle = {}
+        self._conns = []
+        self.opened = 0
+        self.reused = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def acquire(self, host, db="repmgr", user="repmgr", port="5432", connect_timeout=None) -> SqlConn:
+        key = (host, port, db, user)
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    break
+                conn, released = idle.pop()
+            if conn.is_healthy(ping=monotonic() - released > POOL_HEALTH_CHECK_INTERVAL):
+                with self._lock:
+                    self.reused += 1
+                return conn
+            _logger.debug(f"Discarding broken connection to {host} db {db}")
+            self._discard(conn)
+        conn = SqlConn(host, db=db, user=user, port=port, connect_timeout=connect_timeout)
+        with self._lock:
+            self.opened += 1
+            self._conns.append(conn)
+        return conn
+
+    def release(self, conn: SqlConn) -> None:
+        if conn.sql_conn.closed:
+            self._discard(conn)
+            return
+        if conn.sql_conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            conn.sql_conn.rollback()
+        try:
+            conn.reset_session()
+        except psycopg2.Error as err:
+            _logger.debug(f"Discarding connection to {conn.host}, session reset failed: {err}")
+            self._discard(conn)
+            return
+        with self._lock:
+            self._idle.setdefault(conn.key, []).append((conn, monotonic()))
+
+    @contextmanager
+    def connection(self, host, db="repmgr", user="repmgr", port="5432"):
+        conn = self.acquire(host, db=db, user=user, port=port)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def _discard(self, conn: SqlConn) -> None:
+        conn.close()
+        with self._lock:
+            if conn in self._conns:
+                self._conns.remove(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            conns = self._conns
+            self._conns = []
+            self._idle = {}
+        for conn in conns:
+            conn.close()
+        _logger.debug(f"SQL connections opened: {self.opened}, reused: {self.reused}")
+
+
+sql_pool = SqlConnPool()
+
 
 def setup_logging(log_level: str, save_log: str, debug_ssh: bool = False,  log_path: str = None) -> None:
     log_level_int = logging.getLevelName(str(log_level).upper())
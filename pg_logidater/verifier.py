@@ -0,0 +1,157 @@
+from logging import getLogger
+from queue import Queue, Empty
+from threading import Thread, Lock
+from typing import NamedTuple
+from psycopg2 import Error
+from pg_logidater.utils import SqlConn, sql_pool
+from pg_logidater.scheduler import pk_ranges
+from pg_logidater.exceptions import VerificationFailed
+from pg_logidater.timing import timed_phase
+
+VERIFY_MODES = ["none", "count", "hash"]
+
+_logger = getLogger(__name__)
+
+
+class VerifyTask(NamedTuple):
+    table: str
+    size: int
+    where: str = "true"
+    checksum: bool = False
+
+    def __str__(self) -> str:
+        if self.where != "true":
+            return f"{self.table} [{self.where}]"
+        return self.table
+
+
+def verify_tasks(psql: SqlConn, chunk_size: int, checksum: bool, exclude: list[str] = None) -> list[VerifyTask]:
+    """
+    Tables with single integer primary key are split into key ranges,
+    physical ctid ranges differ between replica and target, so other
+    tables are verified whole with order independent digest
+    """
+    excluded = set(exclude or [])
+    tasks = []
+    for table, size, _, pk_column in psql.get_table_sizes():
+        if table in excluded:
+            continue
+        if not pk_column or not chunk_size or size <= chunk_size:
+            tasks.append(VerifyTask(table, size, checksum=checksum))
+            continue
+        min_value, max_value = psql.get_pk_range(table, pk_column)
+        if min_value is None:
+            tasks.append(VerifyTask(table, size, checksum=checksum))
+            continue
+        ranges = [where for where in pk_ranges(pk_column, min_value, max_value, -(-size // chunk_size)) if where]
+        tasks.extend(VerifyTask(table, size // len(ranges), where, checksum) for where in ranges)
+    tasks.sort(key=lambda task: task.size, reverse=True)
+    return tasks
+
+
+class VerifyJob():
+    def __init__(self, host: str, user: str, database: str, tasks: list[VerifyTask]):
+        self.host = host
+        self.user = user
+        self.database = database
+        self.tasks = Queue()
+        for task in tasks:
+            self.tasks.put(task)
+        self.mismatches = []
+        self.errors = []
+        self._lock = Lock()
+
+    def mismatch(self, task: VerifyTask, source: tuple, target: tuple) -> None:
+        _logger.error(f"Mismatch in {task}: replica {source}, target {target}")
+        with self._lock:
+            self.mismatches.append((str(task), source, target))
+
+    def error(self, name: str, err: Exception) -> None:
+        _logger.error(f"Verification of {name} failed: {err}")
+        with self._lock:
+            self.errors.append(name)
+
+
+def verify_worker(job: VerifyJob) -> None:
+    try:
+        src = sql_pool.acquire(job.host, db=job.database, user=job.user)
+    except Error as err:
+        job.error("worker connection", err)
+        return
+    try:
+        dst = sql_pool.acquire("/tmp", user="postgres", db=job.database)
+    except Error as err:
+        sql_pool.release(src)
+        job.error("worker connection", err)
+        return
+    try:
+        src.set_text_output()
+        dst.set_text_output()
+        verify_loop(job, src, dst)
+    except Error as err:
+        job.error("worker session settings", err)
+    finally:
+        for psql in (src, dst):
+            try:
+                psql.sql_conn.rollback()
+                psql.reset_session()
+            except Error as err:
+                _logger.warning(f"Unable to reset verify session on {psql.host}: {err}")
+            sql_pool.release(psql)
+
+
+def verify_loop(job: VerifyJob, src: SqlConn, dst: SqlConn) -> None:
+    while True:
+        try:
+            task = job.tasks.get_nowait()
+        except Empty:
+            break
+        target = []
+
+        def target_checksum() -> None:
+            try:
+                target.append(dst.get_chunk_checksum(task.table, task.where, task.checksum))
+            except Error as err:
+                dst.sql_conn.rollback()
+                target.append(err)
+
+        target_thread = Thread(target=target_checksum, name=f"verify-target-{task.table}")
+        target_thread.start()
+        try:
+            source = src.get_chunk_checksum(task.table, task.where, task.checksum)
+        except Error as err:
+            src.sql_conn.rollback()
+            source = err
+        target_thread.join()
+        if isinstance(source, Exception) or isinstance(target[0], Exception):
+            job.error(str(task), source if isinstance(source, Exception) else target[0])
+        elif tuple(source) != tuple(target[0]):
+            job.mismatch(task, tuple(source), tuple(target[0]))
+        else:
+            _logger.debug(f"Verified {task}: {source[0]} rows")
+
+
+@timed_phase
+def verify_database(host: str, user: str, database: str, jobs: int, mode: str, chunk_size: int,
+                    exclude_tables: list[str] = None) -> None:
+    """
+    Row counts, or counts and sums of row md5 hashes, compared chunk by
+    chunk between paused replica and target
+    """
+    with sql_pool.connection(host, db=database, user=user) as psql:
+        tasks = verify_tasks(psql, chunk_size, mode == "hash", exclude_tables)
+    _logger.info(f"Verifying {database}: {len(tasks)} chunks, mode: {mode}, {jobs} workers")
+    job = VerifyJob(host, user, database, tasks)
+    workers = [
+        Thread(target=verify_worker, name=f"verify-worker-{worker_id}", args=(job,))
+        for worker_id in range(min(jobs, len(tasks)))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if job.mismatches or job.errors:
+        raise VerificationFailed(
+            f"{database}: {len(job.mismatches)} mismatching chunks, {len(job.errors)} failed chunks"
+        )
+    _logger.info(f"{database} verified, {len(tasks)} chunks match")
@@ -0,0 +1,144 @@
+from logging import getLogger
+from os import path
+from threading import Thread, Event
+from psycopg2 import Error
+from pg_logidater.utils import SqlConn, ServerConn, sql_pool
+from pg_logidater.replica import resume_replica
+from pg_logidater.tartget import terminate_commands
+
+WATCHDOG_INTERVAL = 30
+GB = 1024 * 1024 * 1024
+
+_logger = getLogger(__name__)
+
+
+def format_size(size: int) -> str:
+    return "unknown" if size is None else f"{size / GB:.1f} GB"
+
+
+class WalWatchdog(Thread):
+    """
+    Watches WAL kept by master logical slot and free disk on master and
+    replica during sync. Throttles copy over throttle size, aborts setup
+    over abort size or below minimal free disk: stops sync, drops slots
+    and resumes replica. Zero size disables a limit, databases synced from
+    one replica pause share abort event and all their slots are dropped.
+    Failed checks are retried on next interval, unreachable ssh only
+    skips the disk check. Throttling works only in copy sync mode.
+    """
+    def __init__(self, master_host: str, replica_host: str, psql_user: str, ssh_user: str, database: str,
+                 slot_name: str, warn_size: int, throttle_size: int, abort_size: int, min_free: int,
+                 interval: float = WATCHDOG_INTERVAL, abort: Event = None, run_slots: list[str] = None,
+                 throttling: bool = True):
+        super().__init__(name=f"wal-watchdog-{database}", daemon=True)
+        self.master_host = master_host
+        self.replica_host = replica_host
+        self.psql_user = psql_user
+        self.ssh_user = ssh_user
+        self.database = database
+        self.slot_name = slot_name
+        self.run_slots = run_slots or [slot_name]
+        self.warn_size = warn_size
+        self.throttle_size = throttle_size
+        self.abort_size = abort_size
+        self.min_free = min_free
+        self.interval = interval
+        self.throttling = throttling
+        self.throttle = Event()
+        self.aborted = abort or Event()
+        self.finished = Event()
+        self._wal_dirs = {}
+        self._ssh = {}
+        self._throttle_warned = False
+
+    def stop(self) -> None:
+        self.finished.set()
+        self.throttle.clear()
+
+    def run(self) -> None:
+        try:
+            while not self.finished.is_set() and not self.aborted.is_set():
+                try:
+                    with sql_pool.connection(self.master_host, user=self.psql_user, db=self.database) as master, \
+                            sql_pool.connection(self.replica_host, self.psql_user) as replica:
+                        if not self._wal_dirs:
+                            self._wal_dirs = {
+                                self.master_host: path.join(master.get_datadirectory(), "pg_wal"),
+                                self.replica_host: path.join(replica.get_datadirectory(), "pg_wal"),
+                            }
+                        self.check(master, replica, self.free_space(self.master_host),
+                                   self.free_space(self.replica_host))
+                except Exception as err:
+                    _logger.error(f"WAL watchdog check for {self.database} failed, retrying: {err}")
+                self.finished.wait(self.interval)
+        finally:
+            for ssh in self._ssh.values():
+                ssh.close()
+            self._ssh.clear()
+
+    def free_space(self, host: str) -> int:
+        """
+        Free disk of pg_wal directory, None while host is unreachable over
+        ssh, session is opened again on next check
+        """
+        try:
+            if host not in self._ssh:
+                ssh = ServerConn(host, self.ssh_user)
+                ssh.connect(hostname=host, username=self.ssh_user)
+                self._ssh[host] = ssh
+            return self._ssh[host].free_space(self._wal_dirs[host])
+        except Exception as err:
+            _logger.warning(f"WAL watchdog unable to check free disk on {host}: {err}")
+            ssh = self._ssh.pop(host, None)
+            if ssh is not None:
+                ssh.close()
+            return None
+
+    def check(self, master: SqlConn, replica: SqlConn, master_free: int, replica_free: int) -> None:
+        retained = master.get_slot_retained_wal(self.slot_name)
+        if retained is None:
+            _logger.warning(f"Replication slot {self.slot_name} not found on master")
+            return
+        _logger.debug(
+            f"Slot {self.slot_name} keeps {retained / GB:.1f} GB WAL, free disk master: {format_size(master_free)}, "
+            f"replica: {format_size(replica_free)}"
+        )
+        free = [size for size in (master_free, replica_free) if size is not None]
+        if self.abort_size and retained >= self.abort_size:
+            self.abort(master, replica, f"slot {self.slot_name} keeps {retained / GB:.1f} GB WAL")
+        elif self.min_free and free and min(free) < self.min_free:
+            self.abort(
+                master, replica,
+                f"free disk master: {format_size(master_free)}, replica: {format_size(replica_free)}"
+            )
+        elif self.throttle_size and retained >= self.throttle_size:
+            if not self.throttling:
+                if not self._throttle_warned:
+                    _logger.warning(
+                        f"Slot {self.slot_name} keeps {retained / GB:.1f} GB WAL, over throttle size, "
+                        "sync can be throttled only in copy mode"
+                    )
+                    self._throttle_warned = True
+            elif not self.throttle.is_set():
+                _logger.warning(f"Slot {self.slot_name} keeps {retained / GB:.1f} GB WAL, throttling copy")
+                self.throttle.set()
+        else:
+            if self.throttle.is_set():
+                _logger.info(f"Slot {self.slot_name} keeps {retained / GB:.1f} GB WAL, copy resumed")
+                self.throttle.clear()
+            if self.warn_size and retained >= self.warn_size:
+                _logger.warning(f"Slot {self.slot_name} keeps {retained / GB:.1f} GB WAL")
+
+    def abort(self, master: SqlConn, replica: SqlConn, reason: str) -> None:
+        _logger.critical(f"Aborting {self.database} setup, {reason}")
+        self.aborted.set()
+        self.throttle.clear()
+        terminate_commands()
+        for slot_name in self.run_slots:
+            _logger.warning(f"Dropping replication slot {slot_name}")
+            try:
+                master.drop_repl_slot(slot_name)
+            except Error as err:
+                _logger.error(f"Unable to drop replication slot {slot_name}: {err}")
+                master.sql_conn.rollback()
+        resume_replica(replica)
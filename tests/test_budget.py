@@ -0,0 +1,130 @@
+from threading import Event, Thread
+from time import monotonic, sleep
+from pg_logidater.budget import BudgetController, IoBudget, RateLimiter, WorkerGate, control_limits
+
+MB = 1024 * 1024
+
+
+def test_rate_limiter_unlimited():
+    limiter = RateLimiter()
+    started = monotonic()
+    limiter.consume(100 * MB)
+    assert monotonic() - started < 0.1
+    assert limiter.bytes == 100 * MB
+    assert limiter.waited == 0
+
+
+def test_rate_limiter_waits_for_tokens():
+    limiter = RateLimiter(MB)
+    started = monotonic()
+    limiter.consume(MB // 2)
+    limiter.consume(MB // 4)
+    elapsed = monotonic() - started
+    assert 0.6 < elapsed < 1.5
+    assert limiter.waited > 0.6
+
+
+def test_rate_limiter_abort_interrupts_wait():
+    limiter = RateLimiter(MB)
+    abort = Event()
+    abort.set()
+    started = monotonic()
+    limiter.consume(10 * MB, abort)
+    assert monotonic() - started < 0.5
+
+
+def test_worker_gate_limit():
+    gate = WorkerGate(1)
+    assert gate.acquire()
+    released = []
+
+    def release():
+        sleep(0.2)
+        released.append(True)
+        gate.release()
+
+    Thread(target=release).start()
+    assert gate.acquire()
+    assert released
+    gate.release()
+    assert gate.active == 0
+
+
+def test_worker_gate_abort():
+    gate = WorkerGate(1)
+    gate.acquire()
+    abort = Event()
+    abort.set()
+    assert not gate.acquire(abort)
+    assert gate.active == 1
+
+
+def test_worker_gate_raised_limit_wakes_waiter():
+    gate = WorkerGate(1)
+    gate.acquire()
+    acquired = []
+    waiter = Thread(target=lambda: acquired.append(gate.acquire()))
+    waiter.start()
+    sleep(0.1)
+    assert not acquired
+    gate.set_limit(2)
+    waiter.join(1)
+    assert acquired == [True]
+
+
+def test_consume_stream_charges_tighter_limit_once():
+    budget = IoBudget()
+    budget.configure(read_rate=4, write_rate=1)
+    started = monotonic()
+    budget.consume_stream(MB // 2)
+    budget.consume_stream(MB // 4)
+    assert monotonic() - started < 1.5
+    assert budget.read.bytes == budget.write.bytes == MB // 2 + MB // 4
+    assert budget.read.waited == 0
+
+
+def test_control_limits():
+    limits = {"read_rate": 10, "write_rate": -1, "adaptive": "yes", "jobs": 4, "read_workers": True}
+    assert control_limits("io.json", limits) == {"read_rate": 10}
+    assert control_limits("io.json", {"adaptive": False, "write_workers": 0}) == {
+        "adaptive": False, "write_workers": 0
+    }
+    assert control_limits("io.json", [1, 2]) == {}
+
+
+def test_rates_not_enforced_warns(caplog):
+    budget = IoBudget()
+    budget.rates_enforced = False
+    budget.configure(read_workers=2)
+    assert "not applied" not in caplog.text
+    budget.configure(read_rate=10)
+    assert "MB/s limits and adaptive mode are not applied" in caplog.text
+
+
+class SlowReplica():
+    """
+    Every query takes fixed network round trip, backlog query adds load
+    """
+    def __init__(self, rtt: float, load: float = 0.0):
+        self.rtt = rtt
+        self.load = load
+
+    def is_healthy(self, ping: bool = False) -> bool:
+        sleep(self.rtt)
+        return True
+
+    def get_replay_backlog(self) -> int:
+        sleep(self.rtt + self.load)
+        return 0
+
+
+def test_adaptive_latency_over_baseline_round_trip():
+    budget = IoBudget()
+    budget.configure(read_rate=100, adaptive=True)
+    controller = BudgetController(budget, "replica", "repl", max_latency=50)
+    replica = SlowReplica(0.08)
+    controller.adapt(replica)
+    assert budget.factor == 1
+    replica.load = 0.1
+    controller.adapt(replica)
+    assert budget.factor < 1
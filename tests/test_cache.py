@@ -0,0 +1,81 @@
+from pg_logidater import cache
+from pg_logidater.cache import MetadataCache, cached
+
+
+class FakeConn():
+    def __init__(self, signature: list, database: str = "db"):
+        self.key = ("replica", "5432", database, "repl")
+        self.signature = signature
+        self.sql_conn = self
+        self.loads = 0
+
+    def get_cache_signature(self) -> tuple:
+        if self.signature is None:
+            raise RuntimeError("function pg_control_system() does not exist")
+        return tuple(self.signature)
+
+    def rollback(self) -> None:
+        pass
+
+    @cached
+    def get_tables(self, schema: str = "public") -> list[str]:
+        self.loads += 1
+        return [f"{schema}.a", f"{schema}.b"]
+
+
+def reopen(path: str) -> MetadataCache:
+    metadata = MetadataCache()
+    metadata.open(path)
+    return metadata
+
+
+def test_cache_disabled_without_path(monkeypatch):
+    monkeypatch.setattr(cache, "metadata_cache", MetadataCache())
+    conn = FakeConn(["1", 2])
+    conn.get_tables()
+    conn.get_tables()
+    assert conn.loads == 2
+
+
+def test_cache_persists_between_runs(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.json")
+    monkeypatch.setattr(cache, "metadata_cache", reopen(path))
+    conn = FakeConn(["1", 2])
+    assert conn.get_tables() == ["public.a", "public.b"]
+    assert conn.get_tables() == ["public.a", "public.b"]
+    assert conn.get_tables("app") == ["app.a", "app.b"]
+    assert conn.loads == 2
+    cache.metadata_cache.save()
+    monkeypatch.setattr(cache, "metadata_cache", reopen(path))
+    conn = FakeConn(["1", 2])
+    conn.get_tables()
+    assert conn.loads == 0
+    assert cache.metadata_cache.hits == 1
+
+
+def test_cache_invalidated_on_signature_change(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.json")
+    monkeypatch.setattr(cache, "metadata_cache", reopen(path))
+    FakeConn(["1", 2, 10]).get_tables()
+    cache.metadata_cache.save()
+    monkeypatch.setattr(cache, "metadata_cache", reopen(path))
+    conn = FakeConn(["1", 2, 11])
+    conn.get_tables()
+    assert conn.loads == 1
+    other = FakeConn(["1", 2, 11], database="other")
+    other.get_tables()
+    assert other.loads == 1
+
+
+def test_cache_skipped_without_signature(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "metadata_cache", reopen(str(tmp_path / "cache.json")))
+    conn = FakeConn(None)
+    conn.get_tables()
+    conn.get_tables()
+    assert conn.loads == 2
+
+
+def test_broken_cache_file_ignored(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("{broken")
+    assert reopen(str(path)).entries == {}
@@ -0,0 +1,109 @@
+from contextlib import contextmanager
+from pg_logidater import tartget
+from pg_logidater.checkpoint import Checkpoint, NullCheckpoint
+from pg_logidater.progress import SyncProgress
+from pg_logidater.scheduler import CopyTask
+
+
+class FakeTarget():
+    def __init__(self):
+        self.truncated = []
+
+    def truncate_tables(self, tables: list[str]) -> None:
+        self.truncated.extend(tables)
+
+    def get_tables(self) -> list[str]:
+        return ["public.a", "public.b", "public.c"]
+
+
+class FakePool():
+    def __init__(self, conn: FakeTarget):
+        self.conn = conn
+
+    @contextmanager
+    def connection(self, host: str, db: str = None, user: str = None):
+        yield self.conn
+
+
+def test_journal_round_trip(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path), "db")
+    checkpoint.start(database="db", sync_mode="copy")
+    checkpoint.phase_done("pre-data")
+    checkpoint.table_done("public.a")
+    checkpoint.index_done("public.a_idx")
+    with open(checkpoint.path, "a") as journal:
+        journal.write('{"table": "public.b"')
+    resumed = Checkpoint(str(tmp_path), "db")
+    assert resumed.exists()
+    resumed.load()
+    assert resumed.resumed
+    assert resumed.meta == {"database": "db", "sync_mode": "copy"}
+    assert resumed.is_phase_done("pre-data")
+    assert not resumed.is_phase_done("copy")
+    assert resumed.tables == {"public.a"}
+    assert resumed.indexes == {"public.a_idx"}
+    resumed.remove()
+    assert not resumed.exists()
+
+
+def test_start_resets_journal(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path), "db")
+    checkpoint.start(database="db")
+    checkpoint.phase_done("copy")
+    checkpoint.start(database="db")
+    fresh = Checkpoint(str(tmp_path), "db")
+    fresh.load()
+    assert fresh.phases == set()
+
+
+def test_null_checkpoint_keeps_existing_journal(tmp_path):
+    journal = Checkpoint(str(tmp_path), "db")
+    journal.start(database="db")
+    journal.phase_done("pre-data")
+    checkpoint = NullCheckpoint("db")
+    checkpoint.start(database="db")
+    checkpoint.phase_done("copy")
+    assert checkpoint.is_phase_done("copy")
+    assert not checkpoint.exists()
+    journal.load()
+    assert journal.phases == {"pre-data"}
+
+
+def test_skip_copied_tables(tmp_path, monkeypatch):
+    target = FakeTarget()
+    monkeypatch.setattr(tartget, "sql_pool", FakePool(target))
+    checkpoint = Checkpoint(str(tmp_path), "db")
+    tasks = [CopyTask("public.a", 3), CopyTask("public.b", 2, "id < 5"), CopyTask("public.b", 2, "id >= 5"),
+             CopyTask("public.c", 1)]
+    assert tartget.skip_copied_tables(tasks, "db", checkpoint) == tasks
+    assert target.truncated == []
+    checkpoint.resumed = True
+    checkpoint.tables = {"public.a"}
+    assert tartget.skip_copied_tables(tasks, "db", checkpoint) == tasks[1:]
+    assert target.truncated == ["public.b", "public.c"]
+
+
+def test_resume_skips_finished_phases(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(tartget, "sql_pool", FakePool(FakeTarget()))
+    monkeypatch.setattr(tartget, "sync_schema_section", lambda *args: calls.append(f"schema {args[-1]}"))
+    monkeypatch.setattr(tartget, "sync_post_data_rest", lambda *args: calls.append("post-data"))
+    monkeypatch.setattr(tartget, "copy_tables", lambda **kwargs: calls.append(
+        f"copy {','.join(task.table for task in kwargs['tables'])}"))
+    monkeypatch.setattr(tartget, "sync_seq_values", lambda *args, **kwargs: calls.append("sequences"))
+    monkeypatch.setattr(tartget, "build_indexes", lambda **kwargs: calls.append("indexes"))
+    journal = Checkpoint(str(tmp_path), "db")
+    journal.start(database="db")
+    journal.phase_done("pre-data")
+    journal.table_done("public.a")
+    checkpoint = Checkpoint(str(tmp_path), "db")
+    checkpoint.load()
+    tartget.sync_database_copy("replica", "repl", "db", str(tmp_path), str(tmp_path), 2, 64, 2,
+                               progress=SyncProgress(database="db"), checkpoint=checkpoint)
+    assert calls == ["copy public.b,public.c", "sequences", "indexes", "post-data"]
+    calls.clear()
+    checkpoint = Checkpoint(str(tmp_path), "db")
+    checkpoint.load()
+    tartget.sync_database_copy("replica", "repl", "db", str(tmp_path), str(tmp_path), 2, 64, 2,
+                               progress=SyncProgress(database="db"), checkpoint=checkpoint)
+    assert calls == ["sequences"]
@@ -0,0 +1,108 @@
+import pytest
+from pg_logidater import copier
+from pg_logidater.copier import CopyJob, copy_loop, copy_table, copy_tables
+from pg_logidater.exceptions import SyncFailed
+from pg_logidater.scheduler import CopyTask
+
+ROW = b"1\tvalue\n"
+
+
+class BrokenConnection(Exception):
+    pass
+
+
+class FakeSqlConn():
+    def __init__(self, rows: int = 10, fail_copy: bool = False, fail_rollback: bool = False):
+        self.host = "fake"
+        self.sql_conn = self
+        self.cursor = self
+        self.rows = rows
+        self.fail_copy = fail_copy
+        self.fail_rollback = fail_rollback
+        self.rowcount = 0
+        self.received = b""
+
+    def copy_expert(self, statement: str, file, size: int = 8192) -> None:
+        if self.fail_copy:
+            raise BrokenConnection("server closed the connection unexpectedly")
+        if "TO STDOUT" in statement:
+            for _ in range(self.rows):
+                file.write(ROW)
+            return
+        for chunk in iter(lambda: file.read(size), b""):
+            self.received += chunk
+        self.rowcount = self.received.count(b"\n")
+
+    def query(self, query: str) -> None:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        if self.fail_rollback:
+            raise copier.Error("connection already closed")
+
+
+class FakePool():
+    def __init__(self, src: FakeSqlConn, dst: FakeSqlConn):
+        self.conns = {"/tmp": dst}
+        self.src = src
+        self.released = []
+
+    def acquire(self, host: str, db: str = None, user: str = None) -> FakeSqlConn:
+        return self.conns.get(host, self.src)
+
+    def release(self, conn: FakeSqlConn) -> None:
+        self.released.append(conn)
+
+
+class FailingCheckpoint():
+    def table_done(self, table: str) -> None:
+        raise OSError("No space left on device")
+
+
+def test_copy_table():
+    src, dst = FakeSqlConn(rows=100), FakeSqlConn()
+    rows, size, _ = copy_table(src, dst, CopyTask("public.t", 0), 64, 2)
+    assert rows == 100
+    assert size == len(ROW) * 100
+    assert dst.received == ROW * 100
+
+
+def test_copy_table_broken_connection_keeps_original_error():
+    src, dst = FakeSqlConn(), FakeSqlConn(fail_copy=True, fail_rollback=True)
+    with pytest.raises(SyncFailed, match="server closed the connection"):
+        copy_table(src, dst, CopyTask("public.t", 0), 64, 2)
+
+
+def test_copy_loop_unexpected_error_fails_job(monkeypatch):
+    def copy_table(*args, **kwargs):
+        raise BrokenConnection("connection lost")
+
+    monkeypatch.setattr(copier, "copy_table", copy_table)
+    job = CopyJob("replica", "repl", "db", [CopyTask("public.a", 2), CopyTask("public.b", 1)], 64, 2)
+    copy_loop(job, FakeSqlConn(), FakeSqlConn())
+    assert job.failed == ["public.a"]
+    assert job.stop.is_set()
+
+
+def test_copy_loop_checkpoint_error_fails_job():
+    job = CopyJob("replica", "repl", "db", [CopyTask("public.a", 2)], 64, 2, checkpoint=FailingCheckpoint())
+    copy_loop(job, FakeSqlConn(), FakeSqlConn())
+    assert job.failed == ["public.a"]
+
+
+def test_copy_tables_raises_on_worker_failure(monkeypatch):
+    pool = FakePool(FakeSqlConn(), FakeSqlConn(fail_copy=True, fail_rollback=True))
+    monkeypatch.setattr(copier, "sql_pool", pool)
+    with pytest.raises(SyncFailed, match="public.a"):
+        copy_tables("replica", "repl", "db", [CopyTask("public.a", 2)], 2, 64, 2)
+    assert len(pool.released) == 2
+
+
+def test_copy_tables(monkeypatch):
+    dst = FakeSqlConn()
+    monkeypatch.setattr(copier, "sql_pool", FakePool(FakeSqlConn(rows=5), dst))
+    copy_tables("replica", "repl", "db", [CopyTask("public.a", 2)], 2, 64, 2)
+    assert dst.received == ROW * 5
@@ -0,0 +1,125 @@
+import pytest
+from threading import Lock
+from time import sleep
+from pg_logidater import indexer
+from pg_logidater.exceptions import SyncFailed
+from pg_logidater.indexer import IndexTask, build_indexes, collect_post_data
+
+INDEXES = [
+    ("public.a", "a_value_idx", "CREATE INDEX a_value_idx ON public.a USING btree (value)", False, True, 10),
+    ("public.p", "p_value_idx", "CREATE INDEX p_value_idx ON ONLY public.p USING btree (value)", False, False, 30),
+]
+CONSTRAINTS = [
+    ("public.a", "a_pkey", "p", "PRIMARY KEY (id)", True, True, False, "a_pkey", 20, False),
+    ("public.b", "b_a_fkey", "f", "FOREIGN KEY (a_id) REFERENCES public.a(id)", True, False, False, None, 5, False),
+    ("public.p", "p_a_fkey", "f", "FOREIGN KEY (a_id) REFERENCES public.a(id)", True, False, False, None, 50, True),
+    ("public.c", "c_a_fkey", "f", "FOREIGN KEY (a_id) REFERENCES public.a(id)", False, False, False, None, 1, False),
+]
+
+
+class FakeSource():
+    def get_index_defs(self) -> list[tuple]:
+        return INDEXES
+
+    def get_constraint_defs(self) -> list[tuple]:
+        return CONSTRAINTS
+
+
+class FakeTarget():
+    def __init__(self, log: list, lock: Lock, fail: set):
+        self.log = log
+        self.lock = lock
+        self.fail = fail
+        self.sql_conn = self
+
+    def set_maintenance_settings(self, work_mem: str, parallel_workers: int) -> None:
+        pass
+
+    def query(self, statement: str) -> None:
+        name = statement.split()[2 if statement.startswith("CREATE") else 5]
+        if name in self.fail:
+            raise indexer.Error(f"could not create {name}")
+        sleep(0.01)
+        with self.lock:
+            self.log.append(statement)
+
+    def rollback(self) -> None:
+        pass
+
+
+class FakePool():
+    def __init__(self, fail: set = None):
+        self.log = []
+        self.lock = Lock()
+        self.fail = fail or set()
+
+    def acquire(self, host: str, user: str = None, db: str = None) -> FakeTarget:
+        return FakeTarget(self.log, self.lock, self.fail)
+
+    def release(self, conn: FakeTarget) -> None:
+        pass
+
+
+class FakeCheckpoint():
+    def __init__(self, indexes: set):
+        self.indexes = indexes
+
+    def index_done(self, index: str) -> None:
+        self.indexes.add(index)
+
+
+def test_collect_post_data():
+    keys, foreign_keys = collect_post_data(FakeSource())
+    assert [task.name for task in keys] == ["p_value_idx", "a_pkey", "a_value_idx"]
+    assert keys[0].statements == ["CREATE INDEX p_value_idx ON public.p USING btree (value)"]
+    assert keys[1].statements == [
+        "ALTER TABLE public.a ADD CONSTRAINT a_pkey PRIMARY KEY (id)",
+        "ALTER TABLE ONLY public.a REPLICA IDENTITY USING INDEX a_pkey",
+    ]
+    assert keys[2].statements[1] == "ALTER TABLE ONLY public.a CLUSTER ON a_value_idx"
+    assert [task.name for task in foreign_keys] == ["p_a_fkey", "b_a_fkey", "c_a_fkey"]
+
+
+def test_collect_post_data_not_valid_foreign_keys():
+    _, foreign_keys = collect_post_data(FakeSource())
+    partitioned, validated, not_validated = foreign_keys
+    assert partitioned.statements == [
+        "ALTER TABLE public.p ADD CONSTRAINT p_a_fkey FOREIGN KEY (a_id) REFERENCES public.a(id)"
+    ]
+    assert validated.statements == [
+        "ALTER TABLE public.b ADD CONSTRAINT b_a_fkey FOREIGN KEY (a_id) REFERENCES public.a(id) NOT VALID",
+        "ALTER TABLE public.b VALIDATE CONSTRAINT b_a_fkey",
+    ]
+    assert len(not_validated.statements) == 1
+
+
+def test_build_indexes_keys_before_foreign_keys(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(indexer, "sql_pool", pool)
+    checkpoint = FakeCheckpoint(set())
+    build_indexes(FakeSource(), "db", 3, "1GB", 2, checkpoint)
+    foreign_key_steps = [i for i, statement in enumerate(pool.log) if "_fkey" in statement]
+    key_steps = [i for i, statement in enumerate(pool.log) if "_fkey" not in statement]
+    assert len(key_steps) == 5
+    assert max(key_steps) < min(foreign_key_steps)
+    assert "public.b/b_a_fkey" in checkpoint.indexes
+    assert len(checkpoint.indexes) == 6
+
+
+def test_build_indexes_skips_built(monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(indexer, "sql_pool", pool)
+    built = {"public.p/p_value_idx", "public.a/a_pkey", "public.a/a_value_idx", "public.p/p_a_fkey"}
+    build_indexes(FakeSource(), "db", 2, "1GB", 2, FakeCheckpoint(built))
+    assert all("b_a_fkey" in statement or "c_a_fkey" in statement for statement in pool.log)
+    assert len(pool.log) == 3
+
+
+def test_build_indexes_reports_failures(monkeypatch):
+    monkeypatch.setattr(indexer, "sql_pool", FakePool(fail={"a_value_idx"}))
+    with pytest.raises(SyncFailed, match="a_value_idx"):
+        build_indexes(FakeSource(), "db", 2, "1GB", 2)
+
+
+def test_index_task_key():
+    assert IndexTask("public.a", "a_pkey", [], 1).key == "public.a/a_pkey"
@@ -0,0 +1,49 @@
+import os
+import json
+from threading import Thread
+from pg_logidater.progress import PIPE_BUF, ProgressStream, format_duration
+
+
+def test_format_duration():
+    assert format_duration(None) == "--:--:--"
+    assert format_duration(3725.9) == "01:02:05"
+
+
+def test_stream_to_file(tmp_path):
+    path = str(tmp_path / "progress.jsonl")
+    with ProgressStream(path) as stream:
+        stream.write({"database": "db", "bytes": 1})
+        stream.write({"database": "db", "bytes": 2})
+    with open(path) as progress:
+        assert [json.loads(line)["bytes"] for line in progress] == [1, 2]
+
+
+def test_fifo_drops_oversized_and_unread_records(tmp_path):
+    path = str(tmp_path / "progress.fifo")
+    os.mkfifo(path)
+    reader = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        stream = ProgressStream(path)
+        stream.write({"tables": "x" * PIPE_BUF})
+        assert stream.dropped == 1
+        for value in range(10000):
+            stream.write({"bytes": value})
+        assert stream.dropped > 1
+        stream.close()
+        received = b""
+        for chunk in iter(lambda: os.read(reader, 65536), b""):
+            received += chunk
+    finally:
+        os.close(reader)
+    lines = received.decode().splitlines()
+    assert len(lines) == 10001 - stream.dropped
+    assert [json.loads(line)["bytes"] for line in lines] == list(range(len(lines)))
+
+
+def test_fifo_without_reader_does_not_block(tmp_path):
+    path = str(tmp_path / "progress.fifo")
+    os.mkfifo(path)
+    opened = Thread(target=lambda: ProgressStream(path).write({"bytes": 1}), daemon=True)
+    opened.start()
+    opened.join(5)
+    assert not opened.is_alive()
@@ -0,0 +1,165 @@
+import re
+from pg_logidater.remote import (
+    ConfFile,
+    RemoteInspect,
+    conf_files,
+    conninfo_value,
+    unquote_conf,
+    inspect_replica,
+)
+
+
+class FakeChannel():
+    def recv_exit_status(self) -> int:
+        return 0
+
+
+class FakeOutput():
+    def __init__(self, lines: list[str]):
+        self.lines = lines
+        self.channel = FakeChannel()
+
+    def __iter__(self):
+        return iter(self.lines)
+
+
+class FakeError():
+    def read(self) -> bytes:
+        return b""
+
+
+class FakeSsh():
+    """
+    Answers probe scripts from in-memory files, directory listing is
+    taken from files under the directory
+    """
+    host = "replica"
+
+    def __init__(self, files: dict, free_space: int = 100, dir_size: int = 10):
+        self.files = files
+        self.free_space = free_space
+        self.dir_size = dir_size
+        self.commands = []
+
+    def exec_command(self, command: str, timeout: float = None) -> tuple:
+        self.commands.append(command)
+        marker = "@@pg_logidater@@"
+        lines = []
+        for probe in command.split("; echo "):
+            file_match = re.search(r"cat (\S+) 2>/dev/null", probe)
+            dir_match = re.search(r"ls (\S+)/\*\.conf", probe)
+            if dir_match:
+                path = dir_match.group(1)
+                lines.append(f"{marker} dir {path}\n")
+                for name in sorted(name for name in self.files if name.startswith(f"{path}/")):
+                    lines.append(f"{marker} file {name}\n")
+                    lines.extend(f"{line}\n" for line in self.files[name].splitlines())
+            elif file_match:
+                path = file_match.group(1)
+                lines.append(f"{marker} file {path}\n")
+                if path in self.files:
+                    lines.extend(f"{line}\n" for line in self.files[path].splitlines())
+            elif "free_space" in probe:
+                lines.extend([f"{marker} free_space\n", f"{self.free_space}\n"])
+            elif "dir_size" in probe:
+                lines.extend([f"{marker} dir_size\n", f"{self.dir_size}\n"])
+        return None, FakeOutput(lines), FakeError()
+
+
+def test_conf_files_include_recovery_conf_before_12():
+    assert conf_files(11, "/data", "/etc/pg.conf") == [
+        "/etc/pg.conf", "/data/postgresql.auto.conf", "/data/recovery.conf"
+    ]
+    assert conf_files(16, "/data", "/etc/pg.conf") == ["/etc/pg.conf", "/data/postgresql.auto.conf"]
+
+
+def test_unquote_conf():
+    assert unquote_conf("'value'") == "value"
+    assert unquote_conf("'it''s'") == "it's"
+    assert unquote_conf(r"'a\'b'") == "a'b"
+    assert unquote_conf("plain") == "plain"
+    assert unquote_conf("'") == "'"
+
+
+def test_conninfo_value_key_value():
+    conninfo = "host=master user=repl application_name=replica1 port=5432"
+    assert conninfo_value(conninfo, "application_name") == "replica1"
+    assert conninfo_value(conninfo, "sslmode") is None
+
+
+def test_conninfo_value_quoted():
+    conninfo = r"host=master application_name='my \'app\'' user=repl"
+    assert conninfo_value(conninfo, "application_name") == "my 'app'"
+    assert conninfo_value("application_name = spaced", "application_name") == "spaced"
+
+
+def test_conninfo_value_last_wins():
+    assert conninfo_value("application_name=a application_name=b", "application_name") == "b"
+
+
+def test_conninfo_value_uri():
+    conninfo = "postgresql://repl@master:5432/postgres?application_name=replica1&sslmode=require"
+    assert conninfo_value(conninfo, "application_name") == "replica1"
+    assert conninfo_value("postgres://master/db", "application_name") is None
+
+
+def test_conf_file_feed():
+    conf = ConfFile("/etc/postgresql/postgresql.conf")
+    for line in [
+        "# comment\n",
+        "\n",
+        "cluster_name = 'main'  # trailing comment\n",
+        "Max_Connections 100\n",
+        "primary_conninfo = 'host=master application_name=''rep'''\n",
+        "include 'extra.conf'\n",
+        "include_dir '/etc/postgresql/conf.d'\n",
+    ]:
+        conf.feed(line)
+    assert conf.exists
+    assert conf.entries == [
+        ("cluster_name", "main"),
+        ("max_connections", "100"),
+        ("primary_conninfo", "host=master application_name='rep'"),
+        ("include", "/etc/postgresql/extra.conf"),
+        ("include_dir", "/etc/postgresql/conf.d"),
+    ]
+
+
+def test_settings_resolves_includes_in_order():
+    ssh = FakeSsh({
+        "/etc/pg.conf": "cluster_name = 'main'\ninclude 'extra.conf'\ninclude_dir 'conf.d'\nport = 5432\n",
+        "/etc/extra.conf": "cluster_name = 'extra'\ninclude_if_exists 'missing.conf'\n",
+        "/etc/conf.d/01.conf": "port = 5433\n",
+        "/etc/conf.d/02.conf": "primary_slot_name = 'slot'\n",
+        "/data/postgresql.auto.conf": "primary_slot_name = 'auto_slot'\n",
+    })
+    inspect = RemoteInspect(ssh)
+    files = ["/etc/pg.conf", "/data/postgresql.auto.conf"]
+    inspect.run(files)
+    settings = inspect.settings(files)
+    assert settings == {"cluster_name": "extra", "port": "5432", "primary_slot_name": "auto_slot"}
+    assert len(ssh.commands) == 3
+
+
+def test_settings_stops_on_include_loop():
+    ssh = FakeSsh({"/etc/a.conf": "include 'b.conf'\nport = 1\n", "/etc/b.conf": "include 'a.conf'\n"})
+    inspect = RemoteInspect(ssh)
+    assert inspect.settings(["/etc/a.conf"]) == {"port": "1"}
+
+
+def test_inspect_replica_application_name():
+    ssh = FakeSsh({
+        "/etc/pg.conf": "cluster_name = 'main'\nprimary_conninfo = 'host=master application_name=rep1'\n",
+    }, free_space=1000, dir_size=20)
+    info = inspect_replica(ssh, 16, "/data", "/etc/pg.conf")
+    assert info.app_name == "rep1"
+    assert info.slot_name is None
+    assert info.free_space == 1000
+    assert info.wal_size == 20
+
+
+def test_inspect_replica_falls_back_to_cluster_name():
+    ssh = FakeSsh({"/etc/pg.conf": "cluster_name = 'main'\nprimary_conninfo = 'host=master'\n"})
+    assert inspect_replica(ssh, 16, "/data", "/etc/pg.conf").app_name == "main"
+    ssh = FakeSsh({})
+    assert inspect_replica(ssh, 16, "/data", "/etc/pg.conf").app_name == "walreceiver"
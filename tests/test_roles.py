@@ -0,0 +1,88 @@
+from pg_logidater import roles
+from pg_logidater.roles import apply_roles, roles_diff
+
+FLAGS = (False, True, False, False, True, False, False)
+
+
+class FakeConn():
+    def __init__(self, roles: list[tuple], memberships: list[tuple] = None, settings: list[tuple] = None):
+        self.roles = roles
+        self.memberships = memberships or []
+        self.settings = settings or []
+
+    def get_roles(self) -> list[tuple]:
+        return self.roles
+
+    def get_role_memberships(self) -> list[tuple]:
+        return self.memberships
+
+    def get_role_settings(self) -> list[tuple]:
+        return self.settings
+
+
+def role(name: str, flags: tuple = FLAGS, connlimit: int = -1, password: str = "md5abc", valid_until: str = None):
+    return (name,) + flags + (connlimit, password, valid_until)
+
+
+def test_missing_role_created():
+    statements = roles_diff(FakeConn([role("app")]), FakeConn([]))
+    assert statements == [(
+        "app",
+        "CREATE ROLE app WITH NOSUPERUSER INHERIT NOCREATEROLE NOCREATEDB LOGIN NOREPLICATION NOBYPASSRLS "
+        "CONNECTION LIMIT -1 PASSWORD %s VALID UNTIL %s",
+        ("md5abc", "infinity"),
+    )]
+
+
+def test_changed_role_altered_target_only_role_kept():
+    source = FakeConn([role("app", connlimit=10)])
+    target = FakeConn([role("app"), role("local")])
+    statements = roles_diff(source, target)
+    assert len(statements) == 1
+    assert statements[0][0] == "app"
+    assert statements[0][1].startswith("ALTER ROLE app WITH")
+    assert "CONNECTION LIMIT 10" in statements[0][1]
+
+
+def test_equal_roles_no_statements():
+    roles = [role("app")]
+    assert roles_diff(FakeConn(roles, [("grp", "app", False)]), FakeConn(roles, [("grp", "app", True)])) == []
+
+
+def test_memberships_granted():
+    source = FakeConn([], [("grp", "app", False), ("adm", "app", True)])
+    target = FakeConn([], [("adm", "app", False)])
+    assert roles_diff(source, target) == [
+        ("app", "GRANT grp TO app", ()),
+        ("app", "GRANT adm TO app WITH ADMIN OPTION", ()),
+    ]
+
+
+def test_settings_set():
+    source = FakeConn([], settings=[("app", "work_mem=64MB"), ("app", "search_path=app, public")])
+    target = FakeConn([], settings=[("app", "work_mem=64MB")])
+    assert roles_diff(source, target) == [("app", "ALTER ROLE app SET search_path TO app, public", ())]
+
+
+class FakeTarget():
+    def __init__(self, rejected: set):
+        self.rejected = rejected
+        self.executed = []
+
+    def execute_transaction(self, statements: list[tuple]) -> None:
+        for statement, params in statements:
+            if statement in self.rejected:
+                raise roles.Error("permission denied")
+            self.executed.append(statement)
+
+
+def test_apply_roles_skips_rest_of_failed_role():
+    statements = [
+        ("postgres", "ALTER ROLE postgres WITH SUPERUSER", ()),
+        ("app", "CREATE ROLE app", ()),
+        ("postgres", "ALTER ROLE postgres SET work_mem TO %s", ("64MB",)),
+        ("app", "GRANT grp TO app", ()),
+    ]
+    target = FakeTarget({"ALTER ROLE postgres WITH SUPERUSER"})
+    assert apply_roles(target, statements) == 1
+    assert target.executed == ["CREATE ROLE app", "GRANT grp TO app"]
@@ -0,0 +1,79 @@
+from pg_logidater.scheduler import CopyTask, assign_workers, ctid_ranges, pk_ranges, plan_copy
+
+
+def test_ctid_ranges_cover_all_pages():
+    assert ctid_ranges(10, 3) == [
+        "ctid < '(4,0)'::tid",
+        "ctid >= '(4,0)'::tid AND ctid < '(8,0)'::tid",
+        "ctid >= '(8,0)'::tid",
+    ]
+
+
+def test_ctid_ranges_single_chunk():
+    assert ctid_ranges(10, 1) == [""]
+
+
+def test_pk_ranges_cover_all_values():
+    assert pk_ranges("id", 1, 100, 4) == [
+        "id < 26",
+        "id >= 26 AND id < 51",
+        "id >= 51 AND id < 76",
+        "id >= 76",
+    ]
+
+
+def test_pk_ranges_more_chunks_than_values():
+    assert pk_ranges("id", 5, 6, 10) == ["id < 6", "id >= 6"]
+    assert pk_ranges("id", 7, 7, 3) == [""]
+
+
+def test_assign_workers_longest_first():
+    tasks = [CopyTask("a", 7), CopyTask("b", 5), CopyTask("c", 4), CopyTask("d", 3), CopyTask("e", 1)]
+    loads = assign_workers(tasks, 2)
+    assert sorted(loads) == [10, 10]
+    assert sum(loads) == 20
+
+
+def test_assign_workers_no_jobs():
+    assert assign_workers([CopyTask("a", 3), CopyTask("b", 2)], 0) == [5]
+    assert assign_workers([], 3) == [0, 0, 0]
+
+
+def test_copy_task_str():
+    assert str(CopyTask("public.t", 1)) == "public.t"
+    assert str(CopyTask("public.t", 1, "id < 5")) == "public.t [id < 5]"
+
+
+class FakeSqlConn():
+    def __init__(self, version: float):
+        self.version = version
+
+    def server_version(self) -> float:
+        return self.version
+
+    def get_table_sizes(self) -> list[tuple]:
+        return [("public.big", 1000, 100, None), ("public.keyed", 800, 80, "id"), ("public.small", 10, 1, "id")]
+
+    def get_pk_range(self, table: str, pk_column: str) -> tuple:
+        return 1, 800
+
+    def get_table_columns(self, table: str) -> str:
+        return "id, value"
+
+
+def test_plan_copy_splits_by_ctid():
+    tasks = plan_copy(FakeSqlConn(16.2), 2, split_size=400, split_method="ctid")
+    assert [task.table for task in tasks].count("public.big") == 3
+    assert [task.table for task in tasks].count("public.keyed") == 2
+    assert tasks[-1] == CopyTask("public.small", 10)
+
+
+def test_plan_copy_no_ctid_split_before_14():
+    tasks = plan_copy(FakeSqlConn(13.9), 2, split_size=400, split_method="ctid")
+    assert [task.table for task in tasks] == ["public.big", "public.keyed", "public.small"]
+
+
+def test_plan_copy_pk_split_before_14_skips_tables_without_key():
+    tasks = plan_copy(FakeSqlConn(13.9), 2, split_size=400, split_method="pk", exclude=["public.small"])
+    assert tasks[0] == CopyTask("public.big", 1000)
+    assert [task.where for task in tasks[1:]] == ["id < 401", "id >= 401"]
@@ -0,0 +1,135 @@
+import pytest
+from threading import Thread
+from pg_logidater import tartget
+from pg_logidater.exceptions import DiskSpaceTooLow, SyncFailed
+from pg_logidater.progress import SyncProgress
+
+CHUNK = b"x" * 65536
+
+
+class FakeChannel():
+    def __init__(self, chunks: int):
+        self.chunks = chunks
+        self.closed = False
+
+    def recv(self, size: int) -> bytes:
+        if self.closed or not self.chunks:
+            return b""
+        self.chunks -= 1
+        return CHUNK
+
+    def close(self) -> None:
+        self.closed = True
+
+    def recv_exit_status(self) -> int:
+        return -1 if self.closed else 0
+
+
+class FakeStream():
+    def __init__(self, channel: FakeChannel = None):
+        self.channel = channel
+
+    def read(self) -> bytes:
+        return b""
+
+
+class FakeServerConn():
+    channel = None
+
+    def __init__(self, host: str, user: str):
+        self.host = host
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+    def exec_command(self, command: str, bufsize: int = -1) -> tuple:
+        return None, FakeStream(self.channel), FakeStream()
+
+
+@pytest.fixture
+def ssh_stream(monkeypatch, tmp_path):
+    monkeypatch.setattr(tartget, "ServerConn", FakeServerConn)
+    monkeypatch.setattr(tartget, "SSH_COMPRESSION", {"cat": ("cat", "/bin/cat")})
+
+    def sync(chunks: int, restore: str) -> Thread:
+        FakeServerConn.channel = FakeChannel(chunks)
+        monkeypatch.setattr(tartget, "PSQL_SQL_PIPE_RESTORE", restore)
+        errors = []
+
+        def run() -> None:
+            try:
+                tartget.sync_database_ssh("replica", "postgres", "repl", "db", str(tmp_path), "cat", 3,
+                                          SyncProgress(database="db"))
+            except Exception as err:
+                errors.append(err)
+
+        thread = Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(30)
+        assert not thread.is_alive(), "ssh sync stream hung"
+        return errors
+
+    return sync
+
+
+def test_ssh_stream_success(ssh_stream):
+    assert ssh_stream(16, "/bin/cat") == []
+
+
+def test_ssh_stream_restore_failure(ssh_stream):
+    errors = ssh_stream(2, "/bin/false {db}")
+    assert len(errors) == 1
+    assert isinstance(errors[0], SyncFailed)
+    assert "psql: 1" in str(errors[0])
+
+
+def test_ssh_stream_restore_exit_does_not_hang(ssh_stream):
+    errors = ssh_stream(4096, "/bin/false {db}")
+    assert len(errors) == 1
+    assert isinstance(errors[0], SyncFailed)
+    assert FakeServerConn.channel.closed
+
+
+def test_schema_section_failure(monkeypatch, tmp_path):
+    monkeypatch.setattr(tartget, "run_local_cli", lambda **kwargs: 3)
+    with pytest.raises(SyncFailed, match="pre-data schema failed with exit code 3"):
+        tartget.sync_schema_section("replica", "repl", "db", str(tmp_path), "pre-data")
+
+
+def test_post_data_rest_stops_on_failed_step(monkeypatch, tmp_path):
+    commands = []
+
+    def run_local_cli(cli, std_log, err_log):
+        commands.append(cli)
+        if cli.startswith(tartget.PG_RESTORE_LIST.split()[0]) and " -l " in cli:
+            return 1
+        return 0
+
+    monkeypatch.setattr(tartget, "run_local_cli", run_local_cli)
+    with pytest.raises(SyncFailed, match="pg_restore -l"):
+        tartget.sync_post_data_rest("replica", "repl", "db", str(tmp_path), str(tmp_path))
+    assert len(commands) == 2
+
+
+class Usage():
+    def __init__(self, free: int):
+        self.free = free
+
+
+def test_dump_space(monkeypatch, tmp_path):
+    monkeypatch.setattr(tartget, "disk_usage", lambda path: Usage(1000))
+    tartget.check_dump_space(str(tmp_path), 900)
+    with pytest.raises(DiskSpaceTooLow):
+        tartget.check_dump_space(str(tmp_path), 901)
+
+
+def test_dump_space_shared_with_target_data(monkeypatch, tmp_path):
+    monkeypatch.setattr(tartget, "disk_usage", lambda path: Usage(1000))
+    data = tmp_path / "data"
+    data.mkdir()
+    tartget.check_dump_space(str(tmp_path), 450, str(data))
+    with pytest.raises(DiskSpaceTooLow, match="required: 1000"):
+        tartget.check_dump_space(str(tmp_path), 500, str(data))
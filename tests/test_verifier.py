@@ -0,0 +1,107 @@
+import pytest
+from pg_logidater import verifier
+from pg_logidater.exceptions import VerificationFailed
+from pg_logidater.verifier import VerifyJob, VerifyTask, verify_database, verify_loop, verify_tasks
+
+
+class FakeSqlConn():
+    def __init__(self, tables: dict, checksums: dict = None, fail: set = None):
+        self.host = "fake"
+        self.sql_conn = self
+        self.tables = tables
+        self.checksums = checksums or {}
+        self.fail = fail or set()
+        self.settings = 0
+
+    def get_table_sizes(self) -> list[tuple]:
+        return [(table, size, 1, pk) for table, (size, pk, _) in self.tables.items()]
+
+    def get_pk_range(self, table: str, pk_column: str) -> tuple:
+        return self.tables[table][2]
+
+    def get_chunk_checksum(self, table: str, where: str, checksum: bool = False) -> tuple:
+        if table in self.fail:
+            raise verifier.Error(f"relation {table} does not exist")
+        return self.checksums.get((table, where), (10, 1, 2) if checksum else (10, None))
+
+    def set_text_output(self) -> None:
+        self.settings += 1
+
+    def reset_session(self) -> None:
+        self.settings -= 1
+
+    def rollback(self) -> None:
+        pass
+
+
+class FakePool():
+    def __init__(self, src: FakeSqlConn, dst: FakeSqlConn):
+        self.src = src
+        self.dst = dst
+        self.released = []
+
+    def acquire(self, host: str, db: str = None, user: str = None) -> FakeSqlConn:
+        return self.dst if host == "/tmp" else self.src
+
+    def release(self, conn: FakeSqlConn) -> None:
+        self.released.append(conn)
+
+    def connection(self, host: str, db: str = None, user: str = None):
+        pool = self
+
+        class Connection():
+            def __enter__(self):
+                return pool.acquire(host)
+
+            def __exit__(self, type, value, traceback):
+                pass
+
+        return Connection()
+
+
+TABLES = {
+    "public.big": (1000, "id", (1, 100)),
+    "public.small": (10, "id", (1, 5)),
+    "public.nopk": (5000, None, None),
+    "public.empty": (500, "id", (None, None)),
+}
+
+
+def test_verify_tasks_split_by_primary_key():
+    tasks = verify_tasks(FakeSqlConn(TABLES), 400, True, exclude=["public.small"])
+    assert [task.table for task in tasks] == ["public.nopk", "public.empty"] + ["public.big"] * 3
+    assert tasks[0] == VerifyTask("public.nopk", 5000, checksum=True)
+    assert [task.where for task in tasks[2:]] == ["id < 35", "id >= 35 AND id < 69", "id >= 69"]
+    assert all(task.checksum for task in tasks)
+
+
+def test_verify_tasks_count_mode_without_chunks():
+    tasks = verify_tasks(FakeSqlConn(TABLES), 0, False)
+    assert len(tasks) == 4
+    assert not any(task.checksum for task in tasks)
+
+
+def test_verify_loop_reports_mismatch_and_error():
+    tasks = [VerifyTask("public.a", 1, checksum=True), VerifyTask("public.b", 1), VerifyTask("public.c", 1)]
+    src = FakeSqlConn({}, fail={"public.c"})
+    dst = FakeSqlConn({}, checksums={("public.a", "true"): (10, 1, 3)})
+    job = VerifyJob("replica", "repl", "db", tasks)
+    verify_loop(job, src, dst)
+    assert job.mismatches == [("public.a", (10, 1, 2), (10, 1, 3))]
+    assert job.errors == ["public.c"]
+
+
+def test_verify_database(monkeypatch):
+    src, dst = FakeSqlConn(TABLES), FakeSqlConn(TABLES)
+    pool = FakePool(src, dst)
+    monkeypatch.setattr(verifier, "sql_pool", pool)
+    verify_database("replica", "repl", "db", 2, "hash", 400)
+    assert src.settings == 0 and dst.settings == 0
+    assert pool.released.count(src) == pool.released.count(dst) == 2
+
+
+def test_verify_database_mismatch(monkeypatch):
+    dst = FakeSqlConn(TABLES, checksums={("public.nopk", "true"): (9, 1, 2)})
+    monkeypatch.setattr(verifier, "sql_pool", FakePool(FakeSqlConn(TABLES), dst))
+    with pytest.raises(VerificationFailed, match="1 mismatching chunks"):
+        verify_database("replica", "repl", "db", 2, "hash", 400)
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+from threading import Event
+from pg_logidater import watchdog
+from pg_logidater.watchdog import GB, WalWatchdog
+
+
+class FakeMaster():
+    def __init__(self, retained: int):
+        self.retained = retained
+        self.dropped = []
+
+    def get_slot_retained_wal(self, slot_name: str) -> int:
+        return self.retained
+
+    def get_datadirectory(self) -> str:
+        return "/data"
+
+    def drop_repl_slot(self, slot_name: str) -> None:
+        self.dropped.append(slot_name)
+
+
+class FakePool():
+    """
+    First connection attempt fails, later ones return the same master
+    """
+    def __init__(self, master: FakeMaster):
+        self.master = master
+        self.attempts = 0
+
+    @contextmanager
+    def connection(self, host: str, user: str = None, db: str = None):
+        self.attempts += 1
+        if self.attempts == 1:
+            raise ConnectionError("connection refused")
+        yield self.master
+
+
+class UnreachableSsh():
+    def __init__(self, host: str, user: str):
+        pass
+
+    def connect(self, hostname: str, username: str) -> None:
+        raise OSError("no route to host")
+
+    def close(self) -> None:
+        pass
+
+
+def make_watchdog(**kwargs) -> WalWatchdog:
+    limits = dict(warn_size=1 * GB, throttle_size=2 * GB, abort_size=4 * GB, min_free=1 * GB, interval=0.01)
+    limits.update(kwargs)
+    return WalWatchdog("master", "replica", "repl", "postgres", "db", "slot_db", **limits)
+
+
+def test_check_throttles_and_resumes():
+    guard = make_watchdog()
+    guard.check(FakeMaster(3 * GB), None, 10 * GB, 10 * GB)
+    assert guard.throttle.is_set()
+    guard.check(FakeMaster(0), None, 10 * GB, 10 * GB)
+    assert not guard.throttle.is_set()
+
+
+def test_check_without_throttling_only_warns(caplog):
+    guard = make_watchdog(throttling=False)
+    for _ in range(3):
+        guard.check(FakeMaster(3 * GB), None, 10 * GB, 10 * GB)
+    assert not guard.throttle.is_set()
+    assert len([record for record in caplog.records if "throttle size" in record.getMessage()]) == 1
+
+
+def test_check_unknown_free_space_skips_disk_limit(monkeypatch):
+    aborted = []
+    guard = make_watchdog()
+    monkeypatch.setattr(guard, "abort", lambda master, replica, reason: aborted.append(reason))
+    guard.check(FakeMaster(0), None, None, None)
+    guard.check(FakeMaster(0), None, None, GB // 2)
+    assert len(aborted) == 1
+    assert "replica: 0.5 GB" in aborted[0]
+
+
+def test_run_retries_failed_check(monkeypatch):
+    master = FakeMaster(5 * GB)
+    monkeypatch.setattr(watchdog, "sql_pool", FakePool(master))
+    monkeypatch.setattr(watchdog, "ServerConn", UnreachableSsh)
+    monkeypatch.setattr(watchdog, "terminate_commands", lambda: None)
+    monkeypatch.setattr(watchdog, "resume_replica", lambda replica: None)
+    guard = make_watchdog(abort=Event(), run_slots=["slot_db", "slot_other"])
+    guard.start()
+    guard.join(5)
+    assert not guard.is_alive()
+    assert guard.aborted.is_set()
+    assert master.dropped == ["slot_db", "slot_other"]